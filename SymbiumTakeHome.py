@@ -1,61 +1,552 @@
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import make_dsn
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+import argparse
+import array
+import collections
+import contextlib
+import functools
+import gzip
+import hashlib
+import io
+import itertools
 import json
+import math
 import re
+import requests
 from esridump.dumper import EsriDumper
+from esridump.errors import EsriDownloadError
+from urllib.parse import urlsplit
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 import time
 import logging
+import mmap
+import multiprocessing
 import os
-
-# Database connection details (user input)
-DB_HOST = input("Enter the database host (default: 'localhost'): ") or 'localhost'
-DB_PORT = input("Enter the database port (default: '5432'): ") or '5432'
-DB_NAME = input("Enter the database name (default: 'el_dorado_county'): ") or 'el_dorado_county'
-DB_USER = input("Enter the database username: ")
-DB_PASSWORD = input("Enter the database password: ")
-
-# Connect to the default database to create the new database if it doesn't exist
-default_conn = psycopg2.connect(
-    host=DB_HOST,
-    port=DB_PORT,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    database='postgres'  # Connect to the default 'postgres' database
-)
-default_conn.autocommit = True
-default_cursor = default_conn.cursor()
-
-# Check if the database exists, and create it if it doesn't
-default_cursor.execute(f"SELECT 1 FROM pg_database WHERE datname = '{DB_NAME}'")
-database_exists = default_cursor.fetchone()
-
-if not database_exists:
-    default_cursor.execute(f"CREATE DATABASE {DB_NAME}")
-    print(f"Database '{DB_NAME}' created successfully.")
-else:
-    print(f"Database '{DB_NAME}' already exists.")
-
-default_cursor.close()
-default_conn.close()
-
-DB_CONNECTION_STRING = f"dbname='{DB_NAME}' user='{DB_USER}' host='{DB_HOST}' password='{DB_PASSWORD}' port='{DB_PORT}'"
+import queue
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+
+try:
+    import ijson
+except ImportError:  # Without ijson, plain GeoJSON files are parsed in one piece
+    ijson = None
+
+try:
+    import resource
+except ImportError:  # Peak memory is only reported where the resource module exists (Unix)
+    resource = None
+
+try:
+    from shapely.geometry import MultiPolygon, mapping, shape
+    from shapely.validation import make_valid
+except ImportError:  # Only needed for client-side geometry repair
+    shape = None
 
 # ESRI layer URLs
 PARCEL_LAYER_URL = "https://see-eldorado.edcgov.us/arcgis/rest/services/Symbium/SymbiumServices/MapServer/1"
 ADDRESS_LAYER_URL = "https://see-eldorado.edcgov.us/arcgis/rest/services/Symbium/SymbiumServices/MapServer/0"
 
-# Output file paths (user input)
-OUTPUT_DIR = input("Enter the output directory (default: 'output'): ") or 'output'
-PARCEL_GEOJSON_FILE = os.path.join(OUTPUT_DIR, "apns_geojson_using_pyesridump.geojson")
-ADDRESS_GEOJSON_FILE = os.path.join(OUTPUT_DIR, "addresses_geojson_using_pyesridump.geojson")
-CLEANED_ADDRESS_GEOJSON_FILE = os.path.join(OUTPUT_DIR, "cleaned_addresses_geojson1.geojson")
-STANDARDIZED_PARCEL_GEOJSON_FILE = os.path.join(OUTPUT_DIR, "standardized_apns_geojson.geojson")
+# The counties the pipeline loads, each into its own partition of the tables. A county
+# names its two layers, maps the layers' field names onto the ones the pipeline uses
+# (PRCL_ID, ADDR_NBR, ...) where they differ, and can add rules for its APNs. Other
+# counties are added with a JSON list of definitions (counties_file).
+COUNTY_DEFAULTS = {
+    'name': None,  # Lowercase SQL identifier, used in partition names
+    'parcel_layer_url': None,
+    'address_layer_url': None,
+    'parcel_fields': {},  # {pipeline field: layer field}
+    'address_fields': {},
+    'apn_strip': None,  # Regex removed from raw APNs before they are cleaned
+    'apn_pattern': None,  # Regex a cleaned APN must match; other parcels are dropped, other addresses lose their APN
+}
+DEFAULT_COUNTY = 'el_dorado'
+COUNTIES = [dict(COUNTY_DEFAULTS, name=DEFAULT_COUNTY, parcel_layer_url=PARCEL_LAYER_URL,
+                 address_layer_url=ADDRESS_LAYER_URL)]
+COUNTY_NAME_PATTERN = re.compile(r'[a-z][a-z0-9_]{0,23}')  # Short enough for the longest shadow index name
+COUNTY_WORKERS = 0  # Counties run at once, each in its own process; 0 runs them all, up to one per CPU
+
+# Output file names, created in the county's directory under the configured output directory
+PARCEL_GEOJSON_FILENAME = "apns_geojson_using_pyesridump.geojsonl"
+ADDRESS_GEOJSON_FILENAME = "addresses_geojson_using_pyesridump.geojsonl"
+CLEANED_ADDRESS_GEOJSON_FILENAME = "cleaned_addresses_geojson1.geojson"
+STANDARDIZED_PARCEL_GEOJSON_FILENAME = "standardized_apns_geojson.geojson"
+CLEANED_ADDRESS_ARTIFACT_FILENAME = "cleaned_addresses.geobin"
+STANDARDIZED_PARCEL_ARTIFACT_FILENAME = "standardized_apns.geobin"
+CLEANED_ADDRESS_SPOOL_FILENAME = "cleaned_addresses.spool.geojsonl"  # Cleaned addresses awaiting the parcel load
+STAGE_CACHE_DIRNAME = ".stage_cache"
+
+# Sharded download settings: OIDs per shard and concurrent shard downloads
+DOWNLOAD_SHARD_SIZE = 4000
+DOWNLOAD_WORKERS = 4
+
+# Record-and-replay cache of the ESRI REST queries. 'off' always asks the server. 'record'
+# answers from the cache when it can and records whatever it has to fetch. 'refresh' does
+# the same but revalidates entries older than HTTP_CACHE_MAX_AGE_HOURS. 'offline' never
+# contacts the server, and a query that was never recorded fails.
+HTTP_CACHE_MODE = 'off'
+HTTP_CACHE_DIRNAME = ".http_cache"  # Under the output directory, shared by every county
+HTTP_CACHE_MAX_AGE_HOURS = 24
+
+# 'full' reloads everything; 'incremental' applies only the changes since the previous run
+SYNC_MODE = 'full'
+
+# Repair parcel geometries in a local process pool before upload (requires shapely)
+REPAIR_GEOMETRIES_LOCALLY = False
+REPAIR_WORKERS = None  # None uses one worker per CPU
+
+# Parcel coordinates are snapped to a grid of this many degrees as they are loaded
+# (1e-7 degrees is about 1 cm); 0 keeps the full source precision. Every parcel also
+# gets geom_simplified, simplified to SIMPLIFY_TOLERANCE_DEGREES (about 1 m), for
+# overview maps and coarse prefilters. The tolerance is fixed when the column is added.
+PRECISION_GRID_DEGREES = 1e-7
+SIMPLIFY_TOLERANCE_DEGREES = 1e-5
+
+# In 'full' sync mode, the loads commit every LOAD_BATCH_SIZE rows and record each commit in
+# the load_journal table, so a load that is interrupted resumes after its last committed batch
+LOAD_BATCH_SIZE = 50000
+
+# In 'shadow' sync mode, fresh copies of the tables are loaded on LOAD_WRITERS parallel
+# connections, indexed and validated, then swapped in for the live tables in one transaction
+LOAD_WRITERS = 4
+SHADOW_TABLE_SUFFIX = '_shadow'
+SHADOW_TABLES = ['parcel', 'parcel_apn', 'parcel_address']  # Referenced tables first
+
+# Worker processes are spawned rather than forked: stages run on threads, and forking a
+# threaded process can copy locks held by other threads into the child
+WORKER_PROCESS_CONTEXT = multiprocessing.get_context('spawn')
+
+# Cleaning workers: 1 cleans in-process, more shard batches of features across a process pool
+CLEAN_WORKERS = 1
+CLEAN_BATCH_SIZE = 2000
+
+# Size of the LRU cache of canonicalized address components
+ADDRESS_COMPONENT_CACHE_SIZE = 65536
+
+# Address points with the same canonical address closer than this (meters) are duplicates
+ADDRESS_DEDUP_TOLERANCE_METERS = 0.5
+
+# Index parcel geometries in memory to place address points in parcels: addresses with a
+# missing or unknown APN are recovered by location, and APN/location disagreements reported
+ASSIGN_ADDRESSES_SPATIALLY = True
+PARCEL_INDEX_NODE_CAPACITY = 16
+
+# Address points may lie this far (meters) outside their parcel before validation flags them
+ADDRESS_PARCEL_BUFFER_METERS = 0.5
+
+# Also write the cleaned layers to disk as they stream to the database (for debugging),
+# either as GeoJSON ('geojson') or in the compact columnar format ('binary')
+WRITE_DEBUG_ARTIFACTS = False
+ARTIFACT_FORMAT = 'binary'
+
+# File extensions treated as newline-delimited GeoJSON (one Feature per line)
+NDJSON_EXTENSIONS = ('.geojsonl', '.geojsons', '.ndjson')
+
+# Columnar artifact format: attribute columns plus a WKB geometry column, each
+# stored as a uint64 offset array followed by the concatenated values, and an
+# APN-sorted row index. A JSON footer locates the sections.
+ARTIFACT_EXTENSION = '.geobin'
+ARTIFACT_MAGIC = b'SYMBART1'
+ARTIFACT_EXTRA_COLUMN = '_extra'  # Properties without a column of their own, as a JSON object
+PARCEL_ARTIFACT_COLUMNS = ['PRCL_ID']
+ADDRESS_ARTIFACT_COLUMNS = ['PRCL_ID', 'ADDR_NBR', 'ADDR_STR_NBR', 'PREFIX', 'NAME_ROOT', 'SUFFIX',
+                            'ADDR_UNIT_TYPE', 'ADDR_UNIT_NBR', 'ADDR_FLOOR']
+
+# Run settings and their defaults. Each can be set in a JSON config file (--config or
+# SYMBIUM_CONFIG), by a SYMBIUM_<NAME> environment variable, or by a --<name> flag;
+# later sources win. The password is not accepted as a flag, so it never shows up in ps.
+DEFAULT_CONFIG = {
+    'db_host': 'localhost',
+    'db_port': '5432',
+    'db_name': 'el_dorado_county',
+    'db_user': None,
+    'db_password': None,
+    'output_dir': 'output',
+    'counties_file': None,
+    'counties': '',  # Comma-separated names of the counties to refresh; empty refreshes them all
+    'county_workers': COUNTY_WORKERS,
+    'sync_mode': SYNC_MODE,
+    'download_workers': DOWNLOAD_WORKERS,
+    'http_cache': HTTP_CACHE_MODE,
+    'http_cache_dir': None,  # Defaults to HTTP_CACHE_DIRNAME in the output directory
+    'http_cache_max_age_hours': HTTP_CACHE_MAX_AGE_HOURS,
+    'clean_workers': CLEAN_WORKERS,
+    'repair_geometries_locally': REPAIR_GEOMETRIES_LOCALLY,
+    'precision_grid_degrees': PRECISION_GRID_DEGREES,
+    'assign_addresses_spatially': ASSIGN_ADDRESSES_SPATIALLY,
+    'write_debug_artifacts': WRITE_DEBUG_ARTIFACTS,
+    'artifact_format': ARTIFACT_FORMAT,
+    'load_writers': LOAD_WRITERS,
+    'load_batch_size': LOAD_BATCH_SIZE,
+    'metrics_file': None,
+    'metrics_format': 'json',
+    'explain_queries': False,
+    'stage_cache': True,
+    'stage_cache_max_age_days': 30,
+    'stage_cache_max_mb': 2048,
+}
+CONFIG_CHOICES = {'sync_mode': ('incremental', 'full', 'shadow'), 'artifact_format': ('binary', 'geojson'),
+                  'metrics_format': ('json', 'prometheus'), 'http_cache': ('off', 'record', 'refresh', 'offline')}
+CONFIG_ENV_PREFIX = 'SYMBIUM_'
+SECRET_CONFIG_KEYS = {'db_password'}
+
+# Connections per process and database kept by the shared connection pool
+DB_POOL_MAX_CONNECTIONS = 8
 
-# Logging configuration
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def create_tables():
-    commands = [
+def parse_config_value(value, default):
+    """Convert a setting given as text to the type of its default."""
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+def load_config(argv=None):
+    """Resolve the run settings from defaults, a config file, the environment and CLI flags."""
+    parser = argparse.ArgumentParser(
+        description="Download, clean and load county parcel and address layers into PostGIS.")
+    parser.add_argument('--config', help="JSON file of settings")
+    for name, default in DEFAULT_CONFIG.items():
+        if name in SECRET_CONFIG_KEYS:
+            continue
+        flag = '--' + name.replace('_', '-')
+        if isinstance(default, bool):
+            parser.add_argument(flag, dest=name, action=argparse.BooleanOptionalAction, default=None)
+        else:
+            parser.add_argument(flag, dest=name, type=type(default) if isinstance(default, (int, float)) else str,
+                                default=None, choices=CONFIG_CHOICES.get(name))
+    args = parser.parse_args(argv)
+
+    config = dict(DEFAULT_CONFIG)
+    config_file = args.config or os.environ.get(CONFIG_ENV_PREFIX + 'CONFIG')
+    if config_file:
+        with open(config_file, 'r') as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Unknown settings in {config_file}: {', '.join(sorted(unknown))}")
+        config.update(file_config)
+
+    for name, default in DEFAULT_CONFIG.items():
+        value = os.environ.get(CONFIG_ENV_PREFIX + name.upper())
+        if value is not None:
+            config[name] = parse_config_value(value, default)
+
+    for name in DEFAULT_CONFIG:
+        value = getattr(args, name, None)
+        if value is not None:
+            config[name] = value
+
+    for name, choices in CONFIG_CHOICES.items():
+        if config[name] not in choices:
+            raise ValueError(f"{name} must be one of {', '.join(choices)}, not {config[name]!r}")
+    return config
+
+def load_counties(config):
+    """The county definitions to run: COUNTIES or counties_file, narrowed to the counties setting."""
+    definitions = COUNTIES
+    if config['counties_file']:
+        with open(config['counties_file'], 'r') as f:
+            definitions = json.load(f)
+
+    counties = []
+    for definition in definitions:
+        unknown = set(definition) - set(COUNTY_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown county settings: {', '.join(sorted(unknown))}")
+        county = dict(COUNTY_DEFAULTS, **definition)
+        if not COUNTY_NAME_PATTERN.fullmatch(county['name'] or ''):
+            raise ValueError(f"County name {county['name']!r} must be a lowercase identifier of at most 24 characters")
+        if not county['parcel_layer_url'] or not county['address_layer_url']:
+            raise ValueError(f"County {county['name']} needs a parcel_layer_url and an address_layer_url")
+        for rule in ('apn_strip', 'apn_pattern'):
+            try:
+                re.compile(county[rule] or '')
+            except re.error as error:
+                raise ValueError(f"County {county['name']} has an invalid {rule}: {error}") from None
+        counties.append(county)
+
+    selected = [name.strip() for name in config['counties'].split(',') if name.strip()]
+    unknown = set(selected) - {county['name'] for county in counties}
+    if unknown:
+        raise ValueError(f"Unknown counties: {', '.join(sorted(unknown))}")
+    return [county for county in counties if not selected or county['name'] in selected]
+
+def connection_string(config, dbname=None):
+    """Build a libpq connection string for the configured database (or another one on the same server)."""
+    return make_dsn(host=config['db_host'], port=config['db_port'], dbname=dbname or config['db_name'],
+                    user=config['db_user'] or None, password=config['db_password'] or None)
+
+def ensure_database(config):
+    """Create the configured database if it doesn't exist yet."""
+    conn = psycopg2.connect(connection_string(config, dbname='postgres'))
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (config['db_name'],))
+    if cursor.fetchone() is None:
+        cursor.execute(sql.SQL("CREATE DATABASE {};").format(sql.Identifier(config['db_name'])))
+        print(f"Database '{config['db_name']}' created successfully.")
+    else:
+        print(f"Database '{config['db_name']}' already exists.")
+
+    cursor.close()
+    conn.close()
+
+# Connection pools by (process id, connection string). A forked worker sees its
+# parent's pools under the parent's pid and opens its own instead of sharing sockets.
+_connection_pools = {}
+_pooled_connections = {}  # id(connection) -> the pool it was borrowed from
+_connection_pools_lock = threading.Lock()
+
+class KeepAliveConnectionPool(ThreadedConnectionPool):
+    """A ThreadedConnectionPool that opens connections on demand and keeps every one it opens.
+
+    psycopg2 opens minconn connections up front and closes any connection
+    returned while minconn are already idle, so the stock pool with minconn=0
+    reconnects on every borrow. This one starts empty and keeps up to maxconn.
+    """
+
+    def __init__(self, maxconn, *args, **kwargs):
+        super().__init__(0, maxconn, *args, **kwargs)
+        self.minconn = maxconn  # Only consulted when a connection is returned
+
+def get_connection(db_connection_string):
+    """Borrow a connection from the shared pool, opening the pool lazily on first use."""
+    key = (os.getpid(), db_connection_string)
+    with _connection_pools_lock:
+        pool = _connection_pools.get(key)
+        if pool is None:
+            cursor_factory = CountingCursor if pipeline_metrics.enabled else None
+            pool = _connection_pools[key] = KeepAliveConnectionPool(DB_POOL_MAX_CONNECTIONS, db_connection_string,
+                                                                    cursor_factory=cursor_factory)
+    conn = pool.getconn()
+    _pooled_connections[id(conn)] = pool
+    return conn
+
+def release_connection(conn):
+    """Return a borrowed connection to its pool, rolling back anything uncommitted."""
+    pool = _pooled_connections.pop(id(conn))
+    if not conn.closed and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    if not conn.closed and conn.autocommit:
+        conn.autocommit = False
+    pool.putconn(conn)
+
+def close_connection_pools():
+    """Close every pooled connection this process opened."""
+    with _connection_pools_lock:
+        for (pid, dsn), pool in list(_connection_pools.items()):
+            if pid == os.getpid():
+                pool.closeall()
+                del _connection_pools[(pid, dsn)]
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Cursor that counts the statements it sends per thread, for the SQL round-trip metric."""
+    _local = threading.local()
+
+    @classmethod
+    def round_trips(cls):
+        return getattr(cls._local, 'count', 0)
+
+    @classmethod
+    def _count(cls):
+        cls._local.count = getattr(cls._local, 'count', 0) + 1
+
+    def execute(self, query, vars=None):
+        self._count()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        self._count()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        self._count()
+        return super().copy_expert(sql, file, size)
+
+def peak_rss_bytes(who=None):
+    """Peak resident set size of this process (or of its reaped children), or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # ru_maxrss is in KiB on Linux
+
+class PipelineMetrics:
+    """Per-stage timings, row counts, peak memory, SQL round trips and optional query plans.
+
+    When disabled (the default) every hook returns immediately: stage() yields
+    None, counted() hands back its iterable unchanged and explain() does
+    nothing, so instrumented code costs nothing extra. The current stage is
+    tracked per thread, so stages may run concurrently; SQL round trips are
+    counted per thread too, so a stage only sees its own statements. Worker
+    threads a stage starts count toward it through stage_thread(). Memory is
+    ru_maxrss, the process's peak so far, so a stage's figure is the running
+    peak at its end rather than its own peak.
+    """
+
+    def __init__(self, enabled=False, explain=False):
+        self.configure(enabled, explain)
+
+    def configure(self, enabled=False, explain=False):
+        self.enabled = enabled
+        self.explain_queries = enabled and explain
+        self.stages = []
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time a block as one stage; the yielded record takes extra fields such as 'rows'."""
+        if not self.enabled:
+            yield None
+            return
+
+        record = {'stage': name, 'rows': None}
+        parent = getattr(self._local, 'current', None)
+        self._local.current = record
+        round_trips = CountingCursor.round_trips()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            record['seconds'] = round(seconds, 4)
+            record['rows_per_second'] = round(record['rows'] / seconds, 1) if record['rows'] and seconds else None
+            record['sql_round_trips'] = (CountingCursor.round_trips() - round_trips
+                                         + record.pop('worker_sql_round_trips', 0))
+            record['running_peak_rss_bytes'] = peak_rss_bytes()
+            self.stages.append(record)
+            self._local.current = parent
+
+    def current_stage(self):
+        """The record of the stage running on this thread, to hand to the worker threads it starts."""
+        return getattr(self._local, 'current', None) if self.enabled else None
+
+    @contextlib.contextmanager
+    def stage_thread(self, record):
+        """Count the rows and SQL round trips of a worker thread toward record, the stage that started it."""
+        if record is None:
+            yield
+            return
+
+        parent = getattr(self._local, 'current', None)
+        self._local.current = record
+        round_trips = CountingCursor.round_trips()
+        try:
+            yield
+        finally:
+            with self._lock:
+                record['worker_sql_round_trips'] = (record.get('worker_sql_round_trips', 0)
+                                                    + CountingCursor.round_trips() - round_trips)
+            self._local.current = parent
+
+    def counted(self, iterable):
+        """Count the items of iterable as rows of the stage that consumes it."""
+        if not self.enabled:
+            return iterable
+        return self._count(iterable)
+
+    def _count(self, iterable):
+        for item in iterable:
+            record = getattr(self._local, 'current', None)
+            if record is not None:
+                record['rows'] = (record['rows'] or 0) + 1
+            yield item
+
+    def explain(self, cursor, query, params=None):
+        """Record EXPLAIN (ANALYZE, BUFFERS) for a query under the current stage.
+
+        The query really runs, so it is wrapped in a savepoint that is rolled
+        back afterwards; only the plan is kept.
+        """
+        record = getattr(self._local, 'current', None) if self.explain_queries else None
+        if record is None:
+            return
+        cursor.execute("SAVEPOINT explain_query;")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+            record.setdefault('plans', []).append(cursor.fetchone()[0])
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_query;")
+
+    def document(self):
+        """The run's metrics as one JSON-serializable document."""
+        return {
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started_at)),
+            'total_seconds': round(time.time() - self.started_at, 4),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'peak_worker_rss_bytes': peak_rss_bytes(resource.RUSAGE_CHILDREN) if resource else None,
+            'sql_round_trips': sum(stage['sql_round_trips'] for stage in self.stages),
+            'stages': self.stages,
+        }
+
+    def write(self, path, metrics_format='json'):
+        """Write the metrics document as JSON or as a Prometheus textfile, replacing path atomically."""
+        document = self.document()
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w') as f:
+            if metrics_format == 'prometheus':
+                f.write(prometheus_metrics(document))
+            else:
+                json.dump(document, f, indent=2)
+        os.replace(temporary_path, path)
+        logger.info(f"Run metrics written to {path}")
+
+def execute_explained(cursor, query, params=None):
+    """Execute a query, first capturing its plan when query plans are being recorded."""
+    pipeline_metrics.explain(cursor, query, params)
+    cursor.execute(query, params)
+
+# Per-stage metrics exported to Prometheus, as (document key, metric name, help text)
+PROMETHEUS_STAGE_METRICS = [
+    ('seconds', 'symbium_stage_seconds', "Wall time of a pipeline stage."),
+    ('rows', 'symbium_stage_rows', "Rows processed by a pipeline stage."),
+    ('rows_per_second', 'symbium_stage_rows_per_second', "Throughput of a pipeline stage."),
+    ('sql_round_trips', 'symbium_stage_sql_round_trips', "SQL statements sent by a pipeline stage."),
+    ('running_peak_rss_bytes', 'symbium_stage_running_peak_rss_bytes',
+     "Peak resident memory of the process so far, at the end of a pipeline stage."),
+]
+
+def prometheus_metrics(document):
+    """Render a metrics document in the Prometheus text exposition format."""
+    lines = []
+    for key, metric, help_text in PROMETHEUS_STAGE_METRICS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for stage in document['stages']:
+            if stage.get(key) is not None:
+                lines.append(f'{metric}{{stage="{stage["stage"]}"}} {stage[key]}')
+    for key, metric, help_text in [('total_seconds', 'symbium_run_seconds', "Wall time of the whole run."),
+                                   ('peak_rss_bytes', 'symbium_peak_rss_bytes', "Peak resident memory of the run."),
+                                   ('sql_round_trips', 'symbium_sql_round_trips', "SQL statements sent by the run.")]:
+        if document.get(key) is not None:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge", f"{metric} {document[key]}"]
+    return "\n".join(lines) + "\n"
+
+# Shared by every stage; main() enables it when a metrics file is configured
+pipeline_metrics = PipelineMetrics()
+
+# Versioned schema migrations as (version, phase, description, statements).
+# 'pre_load' migrations run before any data is loaded. 'post_load' migrations
+# (indexes) run after the bulk load, so rows are indexed in one pass instead
+# of one at a time during the load. Each migration runs in one transaction,
+# and the table and index statements are idempotent, so databases created
+# before migrations existed are upgraded in place.
+SIMPLIFIED_GEOMETRY_COLUMN = f"""geom_simplified GEOMETRY(MultiPolygon, 4326)
+            GENERATED ALWAYS AS (ST_Multi(ST_SimplifyPreserveTopology(geom, {SIMPLIFY_TOLERANCE_DEGREES!r}))) STORED"""
+SCHEMA_MIGRATIONS = [
+    (1, 'pre_load', "Create parcel, parcel_apn and parcel_address", [
         "CREATE EXTENSION IF NOT EXISTS postgis;",
         """CREATE TABLE IF NOT EXISTS parcel (
             id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -79,27 +570,403 @@ def create_tables():
                 FOREIGN KEY(parcel_id) 
                 REFERENCES parcel(id)
                 ON DELETE CASCADE
-        );"""
-    ]
-    conn = None
+        );""",
+    ]),
+    (2, 'pre_load', "Track per-feature content hashes for incremental sync", [
+        """CREATE TABLE IF NOT EXISTS feature_hash (
+            layer TEXT NOT NULL,
+            feature_key TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            PRIMARY KEY (layer, feature_key)
+        );""",
+    ]),
+    (3, 'post_load', "Add spatial and lookup indexes", [
+        "CREATE INDEX IF NOT EXISTS parcel_geom_gist ON parcel USING GIST (geom);",
+        "CREATE INDEX IF NOT EXISTS parcel_address_geom_gist ON parcel_address USING GIST (geom);",
+        "CREATE INDEX IF NOT EXISTS parcel_apn_apn_idx ON parcel_apn (apn);",
+        "CREATE INDEX IF NOT EXISTS parcel_apn_parcel_id_idx ON parcel_apn (parcel_id);",
+        "CREATE INDEX IF NOT EXISTS parcel_address_parcel_id_idx ON parcel_address (parcel_id);",
+        "CREATE INDEX IF NOT EXISTS parcel_address_address_idx ON parcel_address (address);",
+    ]),
+    (4, 'pre_load', "Add a simplified companion geometry to parcel", [
+        f"ALTER TABLE parcel ADD COLUMN IF NOT EXISTS {SIMPLIFIED_GEOMETRY_COLUMN};",
+    ]),
+    (5, 'post_load', "Index the simplified parcel geometry", [
+        "CREATE INDEX IF NOT EXISTS parcel_geom_simplified_gist ON parcel USING GIST (geom_simplified);",
+    ]),
+    # Keys now lead with the county, as partitioned tables require. Existing rows
+    # belong to DEFAULT_COUNTY. The addresses keep their ids and sequence.
+    (6, 'pre_load', "Partition parcel, parcel_apn and parcel_address by county", [
+        "ALTER TABLE parcel_address RENAME TO parcel_address_unpartitioned;",
+        "ALTER TABLE parcel_apn RENAME TO parcel_apn_unpartitioned;",
+        "ALTER TABLE parcel RENAME TO parcel_unpartitioned;",
+        "ALTER SEQUENCE parcel_address_id_seq OWNED BY NONE;",
+        f"""CREATE TABLE parcel (
+            county TEXT NOT NULL,
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            geom GEOMETRY(MultiPolygon, 4326),
+            apn VARCHAR(255),
+            {SIMPLIFIED_GEOMETRY_COLUMN},
+            CONSTRAINT parcel_county_pkey PRIMARY KEY (county, id),
+            CONSTRAINT parcel_county_apn_key UNIQUE (county, apn)
+        ) PARTITION BY LIST (county);""",
+        """CREATE TABLE parcel_apn (
+            county TEXT NOT NULL,
+            parcel_id UUID NOT NULL,
+            apn VARCHAR(255) NOT NULL,
+            CONSTRAINT fk_parcel
+                FOREIGN KEY(county, parcel_id)
+                REFERENCES parcel(county, id)
+                ON DELETE CASCADE
+        ) PARTITION BY LIST (county);""",
+        """CREATE TABLE parcel_address (
+            county TEXT NOT NULL,
+            id INTEGER NOT NULL DEFAULT nextval('parcel_address_id_seq'),
+            parcel_id UUID NOT NULL,
+            address TEXT NOT NULL,
+            geom GEOMETRY(Point, 4326),
+            CONSTRAINT parcel_address_county_pkey PRIMARY KEY (county, id),
+            CONSTRAINT fk_parcel_address
+                FOREIGN KEY(county, parcel_id)
+                REFERENCES parcel(county, id)
+                ON DELETE CASCADE
+        ) PARTITION BY LIST (county);""",
+        "ALTER SEQUENCE parcel_address_id_seq OWNED BY parcel_address.id;",
+        *(f"CREATE TABLE {table}_in_{DEFAULT_COUNTY} PARTITION OF {table} FOR VALUES IN ('{DEFAULT_COUNTY}');"
+          for table in ('parcel', 'parcel_apn', 'parcel_address')),
+        f"""INSERT INTO parcel (county, id, geom, apn)
+            SELECT '{DEFAULT_COUNTY}', id, geom, apn FROM parcel_unpartitioned;""",
+        f"""INSERT INTO parcel_apn (county, parcel_id, apn)
+            SELECT '{DEFAULT_COUNTY}', parcel_id, apn FROM parcel_apn_unpartitioned;""",
+        f"""INSERT INTO parcel_address (county, id, parcel_id, address, geom)
+            SELECT '{DEFAULT_COUNTY}', id, parcel_id, address, geom FROM parcel_address_unpartitioned;""",
+        "DROP TABLE parcel_address_unpartitioned, parcel_apn_unpartitioned, parcel_unpartitioned;",
+        f"UPDATE feature_hash SET layer = '{DEFAULT_COUNTY}/' || layer;",
+    ]),
+]
+# The partitioned tables of migration 6 start without indexes, so build them all again after the load
+SCHEMA_MIGRATIONS.append((7, 'post_load', "Index the county-partitioned tables", [
+    statement for _, phase, _, statements in SCHEMA_MIGRATIONS if phase == 'post_load' for statement in statements]))
+SCHEMA_MIGRATIONS.append((8, 'pre_load', "Journal the committed batches of each load", [
+    """CREATE TABLE IF NOT EXISTS load_journal (
+        county TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        source TEXT NOT NULL,
+        source_digest TEXT NOT NULL,
+        last_seq BIGINT NOT NULL,
+        batches INTEGER NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (county, stage, source)
+    );""",
+]))
+
+# Arbitrary key for the advisory lock that serializes concurrent migrations
+MIGRATION_LOCK_ID = 7246001
+
+def apply_migrations(db_connection_string, phase):
+    """Apply the pending migrations for a phase and return the resulting schema version."""
+    conn = get_connection(db_connection_string)
+    cur = conn.cursor()
     try:
-        conn = psycopg2.connect(DB_CONNECTION_STRING)
-        cur = conn.cursor()
-        for command in commands:
-            cur.execute(command)
-        cur.close()
+        cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_ID,))
+        cur.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );""")
+        cur.execute("SELECT version FROM schema_migrations;")
+        applied = {row[0] for row in cur.fetchall()}
         conn.commit()
+
+        for version, migration_phase, description, statements in SCHEMA_MIGRATIONS:
+            if version in applied or migration_phase != phase:
+                continue
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                        (version, description))
+            conn.commit()
+            applied.add(version)
+            logger.info(f"Applied schema migration {version}: {description}")
+
+        return max(applied, default=0)
     except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
         print(error)
+        raise
     finally:
-        if conn is not None:
-            conn.close()
+        cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_ID,))
+        cur.close()
+        release_connection(conn)
 
-def download_and_save_layer_as_geojson(url, output_filename, max_retries=3):
+def county_partition(table, county):
+    """Name of a county's partition of one of the tables."""
+    return f"{table}_in_{county}"
+
+def create_county_partitions(db_connection_string, county):
+    """Create the county's partition of each table if it doesn't exist yet."""
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    for table in SHADOW_TABLES:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {county_partition(table, county)} PARTITION OF {table} "
+                       "FOR VALUES IN (%s);", (county,))
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+
+def create_tables(db_connection_string, county=DEFAULT_COUNTY):
+    version = apply_migrations(db_connection_string, 'pre_load')
+    create_county_partitions(db_connection_string, county)
+    print(f"Schema ready for loading {county} (version {version}).")
+
+# Channel on which a run announces that it finished loading, so readers can drop cached results
+LOAD_NOTIFY_CHANNEL = 'symbium_load_finished'
+
+def notify_load_finished(db_connection_string, sync_mode=SYNC_MODE):
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_notify(%s, %s);", (LOAD_NOTIFY_CHANNEL, sync_mode))
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+
+# An index migration statement: the index and the table it is on
+INDEX_STATEMENT_PATTERN = re.compile(r"CREATE INDEX IF NOT EXISTS (\w+) ON (\w+)")
+
+def post_load_indexes():
+    """(index, table, statement) of each index the post-load migrations create on the partitioned tables."""
+    indexes = {}
+    for _, phase, _, statements in SCHEMA_MIGRATIONS:
+        if phase != 'post_load':
+            continue
+        for statement in statements:
+            match = INDEX_STATEMENT_PATTERN.match(statement)
+            if match and match[2] in SHADOW_TABLES:
+                # Migration 7 repeats the earlier index migrations
+                indexes.setdefault(match[1], (match[1], match[2], statement))
+    return list(indexes.values())
+
+def rewrite_index_statement(index, table, statement, new_index, new_table):
+    """An index migration statement rewritten to build new_index on new_table."""
+    return statement.replace(f"CREATE INDEX IF NOT EXISTS {index} ON {table}",
+                             f"CREATE INDEX IF NOT EXISTS {new_index} ON {new_table}", 1)
+
+def create_parent_indexes(db_connection_string):
+    """Create the post-load indexes on the partitioned tables only, then record the post-load migrations.
+
+    ON ONLY leaves every partition unindexed, so this is a catalog change
+    that can run before the loads; each parent index becomes valid once
+    every partition has attached its own (see create_partition_indexes).
+    Returns the schema version.
+    """
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    for index, table, statement in post_load_indexes():
+        cursor.execute("SELECT to_regclass(%s);", (index,))
+        if cursor.fetchone()[0] is None:
+            cursor.execute(rewrite_index_statement(index, table, statement, index, f"ONLY {table}"))
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+    return apply_migrations(db_connection_string, 'post_load')
+
+def create_partition_indexes(db_connection_string, county):
+    """Build the post-load indexes on a county's partitions and attach them to the parent indexes.
+
+    Partitions that already have an index attached to a parent index are skipped.
+    """
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    for index, table, statement in post_load_indexes():
+        partition = county_partition(table, county)
+        cursor.execute("""
+            SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid
+            WHERE i.inhparent = %s::regclass AND x.indrelid = %s::regclass;
+        """, (index, partition))
+        if cursor.fetchone() is not None:
+            continue
+        partition_index = county_partition(index, county)
+        cursor.execute(rewrite_index_statement(index, table, statement, partition_index, partition))
+        cursor.execute(f"ALTER INDEX {index} ATTACH PARTITION {partition_index};")
+        conn.commit()
+    cursor.close()
+    release_connection(conn)
+
+def create_indexes(db_connection_string, county=DEFAULT_COUNTY):
+    """Build the post-load indexes and refresh planner statistics for a county's partitions.
+
+    Only the county's partitions are indexed and analyzed, after its load,
+    so a county finishing early doesn't touch the ones still being loaded;
+    see analyze_tables.
+    """
+    version = create_parent_indexes(db_connection_string)
+    create_partition_indexes(db_connection_string, county)
+
+    conn = get_connection(db_connection_string)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"ANALYZE {', '.join(county_partition(table, county) for table in SHADOW_TABLES)};")
+    cur.close()
+    release_connection(conn)
+    print(f"Indexes built and statistics refreshed for {county} (schema version {version}).")
+
+def analyze_tables(db_connection_string):
+    """Refresh the partitioned tables' own statistics, which autovacuum never does."""
+    conn = get_connection(db_connection_string)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"ANALYZE {', '.join(SHADOW_TABLES)};")
+    cur.close()
+    release_connection(conn)
+
+def esri_request_key(method, url, args):
+    """Cache key of an ESRI REST request: its method, host, path and arguments, without the scheme.
+
+    The host keeps counties whose servers use the same layer paths apart in
+    the shared cache. Query string and form arguments count alike and their
+    order doesn't matter. A stand-in server (esri_replay_server.py) finds a
+    recorded query again by putting the recorded host back into the URL.
+    """
+    split = urlsplit(url)
+    normalized = sorted((str(name), '' if value is None else str(value)) for name, value in (args or {}).items())
+    return content_hash(method.upper(), split.netloc.lower(), split.path.rstrip('/'), normalized)
+
+class EsriHttpCache:
+    """On-disk record of ESRI REST responses, keyed by esri_request_key.
+
+    Each successful JSON response is stored gzipped in its own file, written
+    atomically, so download threads and county processes can share a cache.
+    Responses carrying an ESRI error are never recorded. See HTTP_CACHE_MODE
+    for the modes. Stale entries are revalidated with If-None-Match or
+    If-Modified-Since when the server sent an ETag or Last-Modified, and if
+    the server can't be reached the stale entry is used.
+    """
+
+    def __init__(self, directory, mode='record', max_age_hours=HTTP_CACHE_MAX_AGE_HOURS):
+        self.directory = directory
+        self.mode = mode
+        self.max_age_seconds = max_age_hours * 3600
+        self.hits = 0
+        self.fetches = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def lookup(self, key):
+        """The recorded entry for a key, or None."""
+        try:
+            with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _record(self, key, entry):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(temporary_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(temporary_path, path)
+
+    def request(self, method, url, params=None, data=None, headers=None, timeout=None, **kwargs):
+        """Answer a request from the cache or the server, as a requests.Response."""
+        args = dict(params or {}, **(data or {}))
+        key = esri_request_key(method, url, args)
+        entry = self.lookup(key)
+        stale = entry is not None and time.time() - entry['fetched_at'] > self.max_age_seconds
+        if entry is not None and (self.mode != 'refresh' or not stale):
+            return self._replay(entry, method, url, params)
+        if self.mode == 'offline':
+            # Raised as the dumper's own error, so it handles a miss as it would a failed request
+            raise EsriDownloadError(f"{method} {url} {args} is not in the HTTP cache and the cache is offline")
+
+        headers = dict(headers or {})
+        if entry is not None:
+            if entry['headers'].get('etag'):
+                headers['If-None-Match'] = entry['headers']['etag']
+            if entry['headers'].get('last-modified'):
+                headers['If-Modified-Since'] = entry['headers']['last-modified']
+        try:
+            response = requests.request(method, url, params=params, data=data, headers=headers, timeout=timeout, **kwargs)
+        except requests.RequestException as error:
+            if entry is None:
+                raise
+            logger.warning(f"Could not revalidate {url} ({error}); using the cached response.")
+            return self._replay(entry, method, url, params)
+        with self._lock:
+            self.fetches += 1
+
+        if response.status_code == 304 and entry is not None:
+            entry['fetched_at'] = time.time()
+            self._record(key, entry)
+            return self._replay(entry, method, url, params, count_hit=False)
+        if response.status_code == 200 and self._recordable(response):
+            self._record(key, {
+                'method': method.upper(), 'host': urlsplit(url).netloc.lower(), 'path': urlsplit(url).path,
+                'args': args, 'fetched_at': time.time(),
+                'headers': {name: response.headers[name] for name in ('content-type', 'etag', 'last-modified')
+                            if name in response.headers},
+                'body': response.text,
+            })
+        return response
+
+    @staticmethod
+    def _recordable(response):
+        try:
+            data = response.json()
+        except ValueError:
+            return False
+        return not (isinstance(data, dict) and 'error' in data)
+
+    def _replay(self, entry, method, url, params, count_hit=True):
+        if count_hit:
+            with self._lock:
+                self.hits += 1
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers.update(entry['headers'])
+        response.encoding = 'utf-8'
+        response._content = entry['body'].encode('utf-8')
+        response.request = requests.Request(method, url, params=params).prepare()
+        response.url = response.request.url
+        return response
+
+class CachingEsriDumper(EsriDumper):
+    """An EsriDumper whose requests go through an EsriHttpCache."""
+
+    def __init__(self, url, http_cache, **kwargs):
+        super().__init__(url, **kwargs)
+        self._http_cache = http_cache
+        if http_cache.mode == 'offline':
+            # Nothing to be polite to, and a missing page won't appear by retrying
+            self._pause_seconds = 0
+            self._num_of_retry = 1
+
+    def _request(self, method, url, **kwargs):
+        return self._http_cache.request(method, url, timeout=self._http_timeout, **kwargs)
+
+def esri_dumper(url, http_cache=None, **kwargs):
+    """An EsriDumper for the layer, reading through http_cache if one is given."""
+    if http_cache is None or http_cache.mode == 'off':
+        return EsriDumper(url, **kwargs)
+    return CachingEsriDumper(url, http_cache, **kwargs)
+
+def download_attempts(max_retries, http_cache=None):
+    """How many times to try a download: once when offline, since retrying can't fill a cache miss."""
+    return 1 if http_cache is not None and http_cache.mode == 'offline' else max_retries
+
+def download_and_save_layer_as_geojson(url, output_filename, max_retries=3, stream=False, http_cache=None):
+    if stream:
+        return stream_layer_as_ndjson(url, output_filename, max_retries, http_cache)
+
+    max_retries = download_attempts(max_retries, http_cache)
     attempt = 0
     while attempt < max_retries:
         try:
-            dumper = EsriDumper(url, timeout=1500)
+            dumper = esri_dumper(url, http_cache, timeout=1500)
             features = []
             for feature in dumper:
                 features.append(feature)
@@ -116,19 +983,592 @@ def download_and_save_layer_as_geojson(url, output_filename, max_retries=3):
         except Exception as e:
             logger.error(f"Attempt {attempt + 1} failed with error: {e}")
             attempt += 1
-            time.sleep(5)  # Wait for 5 seconds before retrying
-    
-    logger.error(f"Failed to download data after {max_retries} attempts.")
+            if attempt < max_retries:
+                time.sleep(5)  # Wait for 5 seconds before retrying
+
+    raise RuntimeError(f"Failed to download {url} after {max_retries} attempts.")
+
+def find_oid_field_name(metadata):
+    """Return the name of the layer's object ID field, or None if it has none."""
+    oid_field_name = metadata.get('objectIdField')
+    if not oid_field_name:
+        for field in metadata.get('fields') or []:
+            if field.get('type') == 'esriFieldTypeOID':
+                return field['name']
+    return oid_field_name
+
+def stream_layer_as_ndjson(url, output_filename, max_retries=3, http_cache=None):
+    """Write an ESRI layer to newline-delimited GeoJSON one feature at a time.
+
+    Memory stays flat regardless of layer size. A failed attempt keeps the
+    features already written and the next attempt appends after them. When the
+    layer has an object ID field, features are requested in OID order and a
+    retry only asks for the OIDs above the last one written; otherwise the
+    retry skips as many features as are already on disk. The features go to a
+    .part file that only replaces output_filename once the whole layer is in,
+    so a failed download never leaves a truncated layer behind.
+    """
+    part_path = output_filename + '.part'
+    last_oid = None
+    written = 0
+    max_retries = download_attempts(max_retries, http_cache)
+    attempt = 0
+
+    # Start from an empty file; only attempts within this call resume from it
+    open(part_path, 'w').close()
+
+    while attempt < max_retries:
+        try:
+            dumper = esri_dumper(url, http_cache, timeout=1500)
+            oid_field = find_oid_field_name(dumper.get_metadata())
+            to_skip = 0 if oid_field else written
+            if oid_field:
+                query_args = {'orderByFields': f"{oid_field} ASC"}
+                if last_oid is not None:
+                    query_args['where'] = f"{oid_field} > {last_oid}"
+                dumper = esri_dumper(url, http_cache, timeout=1500, extra_query_args=query_args)
+
+            with open(part_path, 'a') as f:
+                for feature in dumper:
+                    if oid_field:
+                        oid = feature['properties'].get(oid_field)
+                        if last_oid is not None and oid <= last_oid:
+                            continue
+                        last_oid = oid
+                    elif to_skip:
+                        to_skip -= 1
+                        continue
+                    f.write(json.dumps(feature) + '\n')
+                    written += 1
+
+            os.replace(part_path, output_filename)
+            logger.info(f"Streamed {written} features to {output_filename}")
+            return
+        except Exception as e:
+            logger.error(f"Attempt {attempt + 1} failed after {written} features with error: {e}")
+            attempt += 1
+            if attempt < max_retries:
+                time.sleep(5)  # Wait for 5 seconds before retrying
+
+    os.remove(part_path)
+    raise RuntimeError(f"Failed to download {url} after {max_retries} attempts.")
+
+def get_layer_oid_range(url, oid_field_name, timeout=1500, http_cache=None):
+    """Return the (min, max) object IDs of an ESRI layer using a statistics query, or None if it is empty."""
+    request = requests.request if http_cache is None or http_cache.mode == 'off' else http_cache.request
+    response = request('GET', url + '/query', params={
+        'where': '1=1',
+        'outFields': '',
+        'outStatistics': json.dumps([
+            {'statisticType': 'min', 'onStatisticField': oid_field_name, 'outStatisticFieldName': 'OID_MIN'},
+            {'statisticType': 'max', 'onStatisticField': oid_field_name, 'outStatisticFieldName': 'OID_MAX'},
+        ]),
+        'f': 'json',
+    }, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if 'error' in data:
+        raise RuntimeError(f"Could not retrieve OID range for {url}: {data['error'].get('message')}")
+    # Some servers ignore outStatisticFieldName, so don't rely on the attribute names
+    attributes = data['features'][0]['attributes'] if data.get('features') else {}
+    values = [value for value in attributes.values() if value is not None]
+    if not values:
+        return None
+    return int(min(values)), int(max(values))
+
+def shard_file_name(shard):
+    return f"shard_{shard[0]}_{shard[1]}.geojsonl"
+
+def load_shard_checkpoint(checkpoint_path, url, shard_size):
+    """Load the set of completed shard files, discarding checkpoints for another layer or shard size."""
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('url') == url and checkpoint.get('shard_size') == shard_size:
+            return set(checkpoint['completed'])
+    return set()
+
+def save_shard_checkpoint(checkpoint_path, url, shard_size, completed):
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'url': url, 'shard_size': shard_size, 'completed': sorted(completed)}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def download_oid_shard(url, oid_field_name, shard, shard_path, max_retries=3, http_cache=None):
+    """Download the features with OIDs in the inclusive shard range to shard_path."""
+    where = f"{oid_field_name} >= {shard[0]} AND {oid_field_name} <= {shard[1]}"
+    part_path = shard_path + '.part'
+    max_retries = download_attempts(max_retries, http_cache)
+    attempt = 0
+    while True:
+        try:
+            dumper = esri_dumper(url, http_cache, timeout=1500, extra_query_args={'where': where})
+            count = 0
+            with open(part_path, 'w') as f:
+                for feature in dumper:
+                    f.write(json.dumps(feature) + '\n')
+                    count += 1
+            # Only whole shards ever appear under their final name
+            os.replace(part_path, shard_path)
+            return count
+        except Exception as e:
+            attempt += 1
+            if attempt >= max_retries:
+                raise
+            logger.warning(f"Shard {shard} attempt {attempt} failed with error: {e}")
+            time.sleep(5)
+
+def download_layer_sharded(url, output_filename, shard_size=DOWNLOAD_SHARD_SIZE,
+                           max_workers=DOWNLOAD_WORKERS, max_retries=3, http_cache=None):
+    """Download an ESRI layer as OBJECTID-range shards fetched concurrently.
+
+    Completed shards are recorded in a checkpoint next to the output file, so
+    an interrupted run only re-fetches the shards that are missing. Once every
+    shard is present they are concatenated in OID order into output_filename
+    (newline-delimited GeoJSON) and the shard directory is removed. If any
+    shard still fails after its retries, RuntimeError is raised and
+    output_filename is left untouched. With an http_cache, every query goes
+    through it.
+    """
+    shard_dir = output_filename + '.shards'
+    checkpoint_path = os.path.join(shard_dir, 'checkpoint.json')
+    os.makedirs(shard_dir, exist_ok=True)
+
+    oid_field = find_oid_field_name(esri_dumper(url, http_cache, timeout=1500).get_metadata())
+    if not oid_field:
+        logger.info(f"{url} has no object ID field; downloading it as a single stream.")
+        return stream_layer_as_ndjson(url, output_filename, max_retries, http_cache)
+
+    oid_range = get_layer_oid_range(url, oid_field, http_cache=http_cache)
+    if oid_range is None:
+        open(output_filename, 'w').close()
+        shutil.rmtree(shard_dir)
+        logger.info(f"{url} has no features; wrote an empty {output_filename}")
+        return
+    oid_min, oid_max = oid_range
+    shards = [(lo, min(lo + shard_size - 1, oid_max)) for lo in range(oid_min, oid_max + 1, shard_size)]
+
+    completed = load_shard_checkpoint(checkpoint_path, url, shard_size)
+    pending = [
+        shard for shard in shards
+        if shard_file_name(shard) not in completed
+        or not os.path.exists(os.path.join(shard_dir, shard_file_name(shard)))
+    ]
+    logger.info(f"{len(shards) - len(pending)} of {len(shards)} shards already downloaded for {url}")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(download_oid_shard, url, oid_field, shard,
+                            os.path.join(shard_dir, shard_file_name(shard)), max_retries, http_cache): shard
+            for shard in pending
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                logger.error(f"Shard {shard} failed with error: {e}")
+                failed.append(shard)
+                continue
+            completed.add(shard_file_name(shard))
+            save_shard_checkpoint(checkpoint_path, url, shard_size, completed)
+            logger.info(f"Downloaded shard {shard} ({count} features)")
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} shards failed for {url}; rerun to fetch only the missing shards.")
+
+    total = 0
+    part_path = output_filename + '.part'
+    with open(part_path, 'w') as out:
+        for shard in shards:
+            with open(os.path.join(shard_dir, shard_file_name(shard))) as f:
+                for line in f:
+                    out.write(line)
+                    total += 1
+    os.replace(part_path, output_filename)
+
+    # The next run must fetch a fresh copy of the layer, not resume this one
+    shutil.rmtree(shard_dir)
+    logger.info(f"Downloaded and saved {total} features to {output_filename}")
+
+def iter_features(geojson_file_path):
+    """Yield the features of a GeoJSON or newline-delimited GeoJSON file one at a time.
+
+    Newline-delimited files are read line by line. FeatureCollections are
+    parsed incrementally with ijson when it is installed.
+    """
+    if geojson_file_path.endswith(NDJSON_EXTENSIONS):
+        with open(geojson_file_path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif geojson_file_path.endswith(ARTIFACT_EXTENSION):
+        with ArtifactReader(geojson_file_path) as reader:
+            yield from reader
+    elif ijson is not None:
+        with open(geojson_file_path, 'rb') as f:
+            yield from ijson.items(f, 'features.item', use_float=True)
+    else:
+        with open(geojson_file_path) as f:
+            yield from json.load(f)['features']
+
+def write_geojson(features, output_file_path):
+    """Write features as a FeatureCollection one feature at a time."""
+    for _ in tee_geojson(features, output_file_path):
+        pass
+
+def write_ndjson(features, output_file_path):
+    """Write features as newline-delimited GeoJSON, one feature per line."""
+    with open(output_file_path, 'w') as f:
+        for feature in features:
+            f.write(json.dumps(feature))
+            f.write('\n')
+
+def tee_geojson(features, output_file_path):
+    """Pass features through unchanged while writing them to a FeatureCollection file."""
+    with open(output_file_path, 'w') as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for index, feature in enumerate(features):
+            if index:
+                f.write(',\n')
+            f.write(json.dumps(feature))
+            yield feature
+        f.write('\n]}\n')
+
+def iter_batches(iterable, size):
+    """Yield lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+WKB_TYPES = {
+    'Point': 1, 'LineString': 2, 'Polygon': 3, 'MultiPoint': 4,
+    'MultiLineString': 5, 'MultiPolygon': 6, 'GeometryCollection': 7,
+}
+WKB_TYPE_NAMES = {code: name for name, code in WKB_TYPES.items()}
+
+def geometry_to_wkb(geometry):
+    """Encode a GeoJSON geometry as little-endian ISO WKB (XY, or XYZ when positions have a Z)."""
+    if not geometry:
+        return b''
+    out = bytearray()
+    _write_wkb(out, geometry)
+    return bytes(out)
+
+def _first_position(coordinates):
+    while coordinates and isinstance(coordinates[0], (list, tuple)):
+        coordinates = coordinates[0]
+    return coordinates or ()
+
+def _write_positions(out, positions, dims):
+    out += struct.pack('<I', len(positions))
+    flat = [float(p[i]) if i < len(p) else 0.0 for p in positions for i in range(dims)]
+    out += struct.pack(f'<{len(flat)}d', *flat)
+
+def _write_wkb(out, geometry):
+    geometry_type = geometry['type']
+    if geometry_type == 'GeometryCollection':
+        out += struct.pack('<BII', 1, WKB_TYPES[geometry_type], len(geometry['geometries']))
+        for member in geometry['geometries']:
+            _write_wkb(out, member)
+        return
+
+    coordinates = geometry['coordinates']
+    dims = 3 if len(_first_position(coordinates)) > 2 else 2
+    out += struct.pack('<BI', 1, WKB_TYPES[geometry_type] + (1000 if dims == 3 else 0))
+    if geometry_type == 'Point':
+        position = [float(value) for value in coordinates[:dims]] or [float('nan')] * dims
+        out += struct.pack(f'<{dims}d', *position)
+    elif geometry_type == 'LineString':
+        _write_positions(out, coordinates, dims)
+    elif geometry_type == 'Polygon':
+        out += struct.pack('<I', len(coordinates))
+        for ring in coordinates:
+            _write_positions(out, ring, dims)
+    else:
+        out += struct.pack('<I', len(coordinates))
+        for part in coordinates:
+            _write_wkb(out, {'type': geometry_type[len('Multi'):], 'coordinates': part})
+
+def wkb_to_geometry(data):
+    """Decode ISO WKB or PostGIS EWKB into a GeoJSON geometry."""
+    if not data:
+        return None
+    geometry, _ = _read_wkb(data, 0)
+    return geometry
+
+def _read_positions(data, offset, fmt, dims):
+    (count,) = struct.unpack_from(fmt + 'I', data, offset)
+    values = struct.unpack_from(f'{fmt}{count * dims}d', data, offset + 4)
+    positions = [list(values[i:i + dims]) for i in range(0, len(values), dims)]
+    return positions, offset + 4 + 8 * count * dims
+
+def _read_wkb(data, offset):
+    fmt = '<' if data[offset] == 1 else '>'
+    (code,) = struct.unpack_from(fmt + 'I', data, offset + 1)
+    offset += 5
+    if code & 0x20000000:  # EWKB with an embedded SRID
+        offset += 4
+    base = code & 0x0FFFFFFF
+    dims = 2 + (base // 1000 > 0) + (base // 1000 == 3) + bool(code & 0x80000000) + bool(code & 0x40000000)
+    geometry_type = WKB_TYPE_NAMES[base % 1000]
+
+    if geometry_type == 'Point':
+        position = list(struct.unpack_from(f'{fmt}{dims}d', data, offset))
+        offset += 8 * dims
+        coordinates = [] if position[0] != position[0] else position  # NaN marks an empty point
+    elif geometry_type == 'LineString':
+        coordinates, offset = _read_positions(data, offset, fmt, dims)
+    elif geometry_type == 'Polygon':
+        (count,) = struct.unpack_from(fmt + 'I', data, offset)
+        offset += 4
+        coordinates = []
+        for _ in range(count):
+            ring, offset = _read_positions(data, offset, fmt, dims)
+            coordinates.append(ring)
+    else:
+        (count,) = struct.unpack_from(fmt + 'I', data, offset)
+        offset += 4
+        members = []
+        for _ in range(count):
+            member, offset = _read_wkb(data, offset)
+            members.append(member)
+        if geometry_type == 'GeometryCollection':
+            return {'type': geometry_type, 'geometries': members}, offset
+        coordinates = [member['coordinates'] for member in members]
+
+    return {'type': geometry_type, 'coordinates': coordinates}, offset
+
+class ArtifactWriter:
+    """Stream features into a columnar artifact file.
+
+    Each column is spooled to temporary files while writing, so memory only
+    grows with the APN index (one entry per row). close() assembles the file.
+    """
+
+    def __init__(self, path, columns, index_column='PRCL_ID'):
+        self.path = path
+        self.columns = list(columns)
+        self.index_column = index_column
+        self._sections = self.columns + [ARTIFACT_EXTRA_COLUMN, 'geometry']
+        self._spools = {}
+        for name in self._sections:
+            offsets, values = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+            offsets.write(struct.pack('<Q', 0))
+            self._spools[name] = [offsets, values, 0]
+        self._index = []
+        self._count = 0
+
+    def _append(self, name, value):
+        spool = self._spools[name]
+        spool[1].write(value)
+        spool[2] += len(value)
+        spool[0].write(struct.pack('<Q', spool[2]))
+
+    def write(self, feature):
+        properties = feature.get('properties') or {}
+        for column in self.columns:
+            # An empty value means the property is absent; null is stored as JSON null
+            self._append(column, json.dumps(properties[column]).encode() if column in properties else b'')
+        extra = {key: value for key, value in properties.items() if key not in self.columns}
+        self._append(ARTIFACT_EXTRA_COLUMN, json.dumps(extra).encode() if extra else b'')
+        self._append('geometry', geometry_to_wkb(feature.get('geometry')))
+        if self.index_column:
+            self._index.append((str(properties.get(self.index_column) or ''), self._count))
+        self._count += 1
+
+    def close(self):
+        sections = {}
+        with open(self.path, 'wb') as out:
+            out.write(ARTIFACT_MAGIC)
+            for name in self._sections:
+                offsets, values, _ = self._spools[name]
+                for suffix, spool in (('.offsets', offsets), ('.data', values)):
+                    spool.seek(0)
+                    start = out.tell()
+                    shutil.copyfileobj(spool, out)
+                    sections[name + suffix] = [start, out.tell() - start]
+                    spool.close()
+
+            self._index.sort()
+            start = out.tell()
+            out.write(struct.pack(f'<{len(self._index)}I', *(row for _, row in self._index)))
+            sections['index'] = [start, out.tell() - start]
+
+            footer = json.dumps({
+                'version': 1,
+                'count': self._count,
+                'columns': self.columns,
+                'index_column': self.index_column,
+                'sections': sections,
+            }).encode()
+            out.write(footer)
+            out.write(struct.pack('<Q', len(footer)))
+            out.write(ARTIFACT_MAGIC)
+
+class ArtifactReader:
+    """Memory-mapped reader for columnar artifacts with random access by row and by APN."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mmap)
+        if self._mmap[:8] != ARTIFACT_MAGIC or self._mmap[size - 8:] != ARTIFACT_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a columnar artifact file")
+        (footer_length,) = struct.unpack_from('<Q', self._mmap, size - 16)
+        footer = json.loads(self._mmap[size - 16 - footer_length:size - 16])
+        self.columns = footer['columns']
+        self.index_column = footer['index_column']
+        self._count = footer['count']
+        self._sections = footer['sections']
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def _raw(self, name, row):
+        offsets_start = self._sections[name + '.offsets'][0]
+        start, end = struct.unpack_from('<QQ', self._mmap, offsets_start + 8 * row)
+        data_start = self._sections[name + '.data'][0]
+        return self._mmap[data_start + start:data_start + end]
+
+    def value(self, column, row, default=None):
+        raw = self._raw(column, row)
+        return json.loads(raw) if raw else default
+
+    def geometry(self, row):
+        return wkb_to_geometry(self._raw('geometry', row))
+
+    def feature(self, row):
+        properties = {}
+        for column in self.columns:
+            raw = self._raw(column, row)
+            if raw:
+                properties[column] = json.loads(raw)
+        properties.update(self.value(ARTIFACT_EXTRA_COLUMN, row, {}))
+        return {'type': 'Feature', 'properties': properties, 'geometry': self.geometry(row)}
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self.feature(row)
+
+    def _index_key(self, position):
+        index_start = self._sections['index'][0]
+        (row,) = struct.unpack_from('<I', self._mmap, index_start + 4 * position)
+        return str(self.value(self.index_column, row) or ''), row
+
+    def find_by_apn(self, apn):
+        """Return the features whose indexed APN equals apn, by binary search over the index."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._index_key(middle)[0] < apn:
+                low = middle + 1
+            else:
+                high = middle
+        features = []
+        while low < self._count:
+            key, row = self._index_key(low)
+            if key != apn:
+                break
+            features.append(self.feature(row))
+            low += 1
+        return features
+
+def tee_artifact(features, output_file_path, columns):
+    """Pass features through unchanged while writing them to a columnar artifact file."""
+    writer = ArtifactWriter(output_file_path, columns)
+    for feature in features:
+        writer.write(feature)
+        yield feature
+    writer.close()
+
+def export_artifact_geojson(artifact_path, geojson_file_path):
+    """Convert a columnar artifact back to a GeoJSON FeatureCollection."""
+    write_geojson(iter_features(artifact_path), geojson_file_path)
 
 def clean_apn(apn):
     """Remove non-alphanumeric characters from APN."""
     return re.sub(r'\W+', '', str(apn))
 
-def standardize_address_component(component):
+# Components that make up the full address, in order
+ADDRESS_FIELDS = ['ADDR_NBR', 'ADDR_STR_NBR', 'PREFIX', 'NAME_ROOT', 'SUFFIX', 'ADDR_UNIT_NBR']
+
+# Components address cleaning rewrites in canonical form
+CANONICAL_COMPONENTS = ['ADDR_NBR', 'PREFIX', 'NAME_ROOT', 'SUFFIX', 'ADDR_UNIT_TYPE', 'ADDR_UNIT_NBR', 'ADDR_FLOOR']
+
+# Every property address cleaning reads; only these are sent to cleaning workers
+ADDRESS_CLEAN_FIELDS = ['PRCL_ID', 'ADDR_STR_NBR'] + CANONICAL_COMPONENTS
+
+# Street type abbreviations (USPS Publication 28) expanded in the SUFFIX component
+STREET_SUFFIXES = {
+    'ALY': 'Alley', 'AVE': 'Avenue', 'AV': 'Avenue', 'BND': 'Bend', 'BLVD': 'Boulevard',
+    'BR': 'Branch', 'BRG': 'Bridge', 'CYN': 'Canyon', 'CTR': 'Center', 'CIR': 'Circle',
+    'CT': 'Court', 'CV': 'Cove', 'CRK': 'Creek', 'CRES': 'Crescent', 'XING': 'Crossing',
+    'DL': 'Dale', 'DR': 'Drive', 'EST': 'Estate', 'ESTS': 'Estates', 'EXPY': 'Expressway',
+    'EXT': 'Extension', 'FLS': 'Falls', 'FLD': 'Field', 'FLDS': 'Fields', 'FLT': 'Flat',
+    'FLTS': 'Flats', 'FRK': 'Fork', 'FWY': 'Freeway', 'GDNS': 'Gardens', 'GLN': 'Glen',
+    'GRN': 'Green', 'GRV': 'Grove', 'HTS': 'Heights', 'HWY': 'Highway', 'HL': 'Hill',
+    'HLS': 'Hills', 'HOLW': 'Hollow', 'KNL': 'Knoll', 'LK': 'Lake', 'LNDG': 'Landing',
+    'LN': 'Lane', 'MNR': 'Manor', 'MDW': 'Meadow', 'MDWS': 'Meadows', 'MTN': 'Mountain',
+    'PKWY': 'Parkway', 'PL': 'Place', 'PLZ': 'Plaza', 'PT': 'Point', 'RDG': 'Ridge',
+    'RD': 'Road', 'SPG': 'Spring', 'SPGS': 'Springs', 'SQ': 'Square', 'STA': 'Station',
+    'ST': 'Street', 'TER': 'Terrace', 'TRCE': 'Trace', 'TRL': 'Trail', 'TPKE': 'Turnpike',
+    'VLY': 'Valley', 'VW': 'View', 'VIS': 'Vista',
+}
+
+# Directional abbreviations expanded in the PREFIX component
+DIRECTIONALS = {
+    'N': 'North', 'S': 'South', 'E': 'East', 'W': 'West',
+    'NE': 'Northeast', 'NW': 'Northwest', 'SE': 'Southeast', 'SW': 'Southwest',
+}
+
+# Lookup table used to expand each component, by field name
+COMPONENT_EXPANSIONS = {'SUFFIX': STREET_SUFFIXES, 'PREFIX': DIRECTIONALS}
+
+@functools.lru_cache(maxsize=ADDRESS_COMPONENT_CACHE_SIZE, typed=True)
+def canonical_component(component, field=None):
+    """Canonical form of one address component.
+
+    Whitespace is collapsed, the text is title-cased and, for the SUFFIX and
+    PREFIX fields, abbreviations are expanded. Missing values become ''.
+    Results are memoized and interned, since the same street tokens repeat
+    across the whole county.
+    """
+    if component is None:
+        return ''
+    text = ' '.join(str(component).split()).title()
+    expansions = COMPONENT_EXPANSIONS.get(field)
+    if expansions:
+        text = expansions.get(text.upper(), text)
+    return sys.intern(text)
+
+def standardize_address_component(component, field=None):
     """Convert to string, trim spaces, and capitalize address components."""
-    if not isinstance(component, str):
-        component = str(component)  # Convert to string if not already
-    return ' '.join(filter(None, component.split())).title()
+    return canonical_component(component, field)
+
+def canonical_address(properties):
+    """Build the canonical full address of a record.
+
+    This is the address stored in parcel_address, and the address part of
+    the dedup key, so the two always agree.
+    """
+    return ' '.join(filter(None, (canonical_component(properties.get(field), field) for field in ADDRESS_FIELDS)))
 
 def is_address_complete(properties):
     """Check if essential address components are present and non-empty."""
@@ -138,111 +1578,484 @@ def is_address_complete(properties):
             return False  # Incomplete if any essential component is missing or empty
     return True  # Complete if all essential components are present and non-empty
 
-def unique_address_key(properties, geometry):
-    """Generate a unique key for the address based on its components and geometry."""
-    address_components = [
-        str(properties.get(field, '')).strip().title() for field in [
-            'ADDR_NBR', 'ADDR_STR_NBR', 'PREFIX', 'NAME_ROOT', 'SUFFIX', 'ADDR_UNIT_NBR'
-        ]
-    ]
-    full_address = ' '.join(filter(None, address_components)).upper()
-    geo_data = str(geometry['coordinates']) if geometry.get('coordinates') else 'NO_COORDINATES'
-    return f"{full_address}_{geo_data}"
-
-def clean_address_dataset(geojson_file_path, output_file_path):
-    with open(geojson_file_path) as f:
-        data = json.load(f)
+METERS_PER_DEGREE = 111320.0
+DEDUP_CELL_RESOLUTION = 4096  # Positions are kept in 1/4096ths of the dedup tolerance
+DEDUP_CELL_TOLERANCES = 32  # Width of a dedup grid cell, in tolerances (a power of two)
+DEDUP_CELL_SHIFT = (DEDUP_CELL_TOLERANCES * DEDUP_CELL_RESOLUTION).bit_length() - 1  # Quantized position to cell
+DEDUP_CELL_EDGE = (DEDUP_CELL_TOLERANCES - 1) * DEDUP_CELL_RESOLUTION  # Offsets within a tolerance of the far edge
+DEDUP_INITIAL_SLOTS = 1024  # Doubled whenever the dedup index's slot table would be over half full
+
+def address_digest(address):
+    """40-bit blake2b digest of a canonical address, its fixed-size key in the dedup index."""
+    return int.from_bytes(hashlib.blake2b(address.encode('utf-8'), digest_size=5).digest(), 'big')
+
+def point_coordinates(geometry):
+    """First position of a geometry, or None if it has no coordinates."""
+    position = _first_position(geometry.get('coordinates')) if geometry else ()
+    return position if len(position) >= 2 else None
+
+class AddressDedupIndex:
+    """Hash-grid index of address points for tolerance-based duplicate detection.
+
+    Points are projected to meters (equirectangular, scaled at the latitude of
+    the first indexed point, which is accurate to about 1% across a county) and
+    bucketed into square cells DEDUP_CELL_TOLERANCES tolerances wide. A
+    duplicate sits in the point's own cell unless the point is within a
+    tolerance of an edge, so most lookups probe one cell and the rest two or
+    four. Each indexed point is its address digest and quantized position in
+    flat arrays, found through an open-addressing slot table keyed by (digest,
+    cell), so no per-point Python objects are retained.
+    """
 
-    cleaned_features = []
-    seen_addresses = set()
+    def __init__(self, tolerance_meters=ADDRESS_DEDUP_TOLERANCE_METERS):
+        self.tolerance_meters = tolerance_meters
+        self._digests = array.array('Q')
+        self._positions = array.array('q')  # Quantized x and y of each point, interleaved
+        self._slots = array.array('i', [-1]) * DEDUP_INITIAL_SLOTS  # Point number, or -1 for an empty slot
+        self._unlocated = set()  # Digests of addresses without coordinates
+        self._x_scale = None
+        self._y_scale = METERS_PER_DEGREE / tolerance_meters
+
+    def __len__(self):
+        return len(self._digests) + len(self._unlocated)
+
+    def _grid_position(self, coordinates):
+        """Position in tolerances: two points are duplicates when these are at most 1 apart."""
+        lon, lat = float(coordinates[0]), float(coordinates[1])
+        if self._x_scale is None:
+            self._x_scale = self._y_scale * math.cos(math.radians(lat))
+        return lon * self._x_scale, lat * self._y_scale
+
+    def _insert(self, point, key):
+        mask = len(self._slots) - 1
+        slot = hash(key) & mask
+        while self._slots[slot] != -1:
+            slot = (slot + 1) & mask
+        self._slots[slot] = point
+
+    def _grow(self):
+        self._slots = array.array('i', [-1]) * (2 * len(self._slots))
+        positions = self._positions
+        for point, digest in enumerate(self._digests):
+            self._insert(point, (digest, positions[2 * point] >> DEDUP_CELL_SHIFT,
+                                 positions[2 * point + 1] >> DEDUP_CELL_SHIFT))
+
+    def _has_duplicate(self, key, quantized_x, quantized_y):
+        """Whether a point indexed under key lies within one tolerance of the quantized position."""
+        slots, digests, positions = self._slots, self._digests, self._positions
+        mask = len(slots) - 1
+        digest = key[0]
+        slot = hash(key) & mask
+        point = slots[slot]
+        while point != -1:
+            if digests[point] == digest:
+                dx = positions[2 * point] - quantized_x
+                dy = positions[2 * point + 1] - quantized_y
+                if dx * dx + dy * dy <= DEDUP_CELL_RESOLUTION * DEDUP_CELL_RESOLUTION:
+                    return True
+            slot = (slot + 1) & mask
+            point = slots[slot]
+        return False
+
+    def add(self, address, coordinates, digest=None):
+        """Index an address point; return False, without indexing it, if it duplicates an indexed point.
+
+        digest, if given, is address_digest(address), already computed by a cleaning worker.
+        """
+        if digest is None:
+            digest = address_digest(address)
+        if coordinates is None:
+            if digest in self._unlocated:
+                return False
+            self._unlocated.add(digest)
+            return True
+
+        x, y = self._grid_position(coordinates)
+        quantized_x, quantized_y = math.floor(x * DEDUP_CELL_RESOLUTION), math.floor(y * DEDUP_CELL_RESOLUTION)
+        cell_x, cell_y = quantized_x >> DEDUP_CELL_SHIFT, quantized_y >> DEDUP_CELL_SHIFT
+        key = (digest, cell_x, cell_y)
+        if self._has_duplicate(key, quantized_x, quantized_y):
+            return False
+
+        # A neighbouring cell can only hold a duplicate if the point is within a tolerance of their shared edge
+        offset_x = quantized_x - (cell_x << DEDUP_CELL_SHIFT)
+        offset_y = quantized_y - (cell_y << DEDUP_CELL_SHIFT)
+        side_x = -1 if offset_x < DEDUP_CELL_RESOLUTION else 1 if offset_x >= DEDUP_CELL_EDGE else 0
+        side_y = -1 if offset_y < DEDUP_CELL_RESOLUTION else 1 if offset_y >= DEDUP_CELL_EDGE else 0
+        if side_x and self._has_duplicate((digest, cell_x + side_x, cell_y), quantized_x, quantized_y):
+            return False
+        if side_y and (self._has_duplicate((digest, cell_x, cell_y + side_y), quantized_x, quantized_y)
+                       or side_x and self._has_duplicate((digest, cell_x + side_x, cell_y + side_y),
+                                                         quantized_x, quantized_y)):
+            return False
+
+        point = len(self._digests)
+        self._digests.append(digest)
+        self._positions.extend((quantized_x, quantized_y))
+        if 2 * (point + 1) > len(self._slots):
+            self._grow()
+        else:
+            self._insert(point, key)
+        return True
+
+def _ring_contains(ring, x, y):
+    """Even-odd ray casting test of a point against one ring, stored as a flat x, y array."""
+    inside = False
+    x1, y1 = ring[-2], ring[-1]
+    for i in range(0, len(ring), 2):
+        x2, y2 = ring[i], ring[i + 1]
+        if (y2 > y) != (y1 > y) and x < (x1 - x2) * (y - y2) / (y1 - y2) + x2:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+def _str_pack(entries, capacity):
+    """Group one level of (minx, miny, maxx, maxy, payload) entries into parent nodes (Sort-Tile-Recursive)."""
+    leaf_count = math.ceil(len(entries) / capacity)
+    slice_size = math.ceil(math.sqrt(leaf_count)) * capacity
+    entries = sorted(entries, key=lambda e: e[0] + e[2])
+    parents = []
+    for start in range(0, len(entries), slice_size):
+        vertical_slice = sorted(entries[start:start + slice_size], key=lambda e: e[1] + e[3])
+        for group_start in range(0, len(vertical_slice), capacity):
+            group = vertical_slice[group_start:group_start + capacity]
+            parents.append((min(e[0] for e in group), min(e[1] for e in group),
+                            max(e[2] for e in group), max(e[3] for e in group), group))
+    return parents
+
+class ParcelIndex:
+    """In-memory spatial index of parcel polygons for point-in-parcel lookups.
+
+    Parcels are added as they stream past, and an STR-packed R-tree over their
+    bounding boxes is built on the first lookup. Candidates from the tree are
+    confirmed with an exact point-in-polygon test. Rings are kept as flat
+    double arrays.
+    """
 
-    for feature in data['features']:
+    def __init__(self, node_capacity=PARCEL_INDEX_NODE_CAPACITY):
+        self.node_capacity = node_capacity
+        self._apns = []
+        self._rings = []
+        self._boxes = []
+        self._known_apns = set()
+        self._root = None
+
+    def __len__(self):
+        return len(self._apns)
+
+    def __contains__(self, apn):
+        return apn in self._known_apns
+
+    def add(self, apn, geometry):
+        """Index one parcel polygon or multipolygon under its APN."""
+        if not apn or not geometry or geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            return
+        polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+        rings = [array.array('d', (float(c) for position in ring for c in position[:2]))
+                 for polygon in polygons for ring in polygon if len(ring) >= 3]
+        if not rings:
+            return
+
+        xs = [value for ring in rings for value in ring[0::2]]
+        ys = [value for ring in rings for value in ring[1::2]]
+        self._boxes.append((min(xs), min(ys), max(xs), max(ys), len(self._apns)))
+        self._apns.append(apn)
+        self._rings.append(rings)
+        self._known_apns.add(apn)
+        self._root = None
+
+    def _build(self):
+        level = self._boxes
+        while len(level) > self.node_capacity:
+            level = _str_pack(level, self.node_capacity)
+        self._root = level
+
+    def locate(self, coordinates):
+        """Return the APN of the first parcel containing a point, or None."""
+        if coordinates is None or not self._boxes:
+            return None
+        if self._root is None:
+            self._build()
+
+        x, y = float(coordinates[0]), float(coordinates[1])
+        stack = [self._root]
+        while stack:
+            for minx, miny, maxx, maxy, payload in stack.pop():
+                if x < minx or x > maxx or y < miny or y > maxy:
+                    continue
+                if not isinstance(payload, int):
+                    stack.append(payload)
+                    continue
+                inside = False
+                for ring in self._rings[payload]:
+                    if _ring_contains(ring, x, y):
+                        inside = not inside
+                if inside:
+                    return self._apns[payload]
+        return None
+
+def county_features(features, county, layer):
+    """Rename a county's layer fields to the pipeline's and apply its APN rules, as features stream past.
+
+    layer is 'parcel' or 'address'. Parcels whose APN fails the county's
+    apn_pattern are dropped; addresses keep their point but lose the APN, so
+    they can still be placed in a parcel by location.
+    """
+    fields = county[f"{layer}_fields"]
+    apn_strip = re.compile(county['apn_strip']) if county['apn_strip'] else None
+    apn_pattern = re.compile(county['apn_pattern']) if county['apn_pattern'] else None
+    if not fields and apn_strip is None and apn_pattern is None:
+        return features
+    return _county_features(features, county['name'], layer, fields, apn_strip, apn_pattern)
+
+def _county_features(features, county_name, layer, fields, apn_strip, apn_pattern):
+    dropped = 0
+    for feature in features:
         properties = feature['properties']
-        geometry = feature['geometry']
-        
-        if not properties.get('PRCL_ID', '').strip():
-            continue
+        for field, source_field in fields.items():
+            if source_field in properties:
+                properties[field] = properties.pop(source_field)
+
+        apn = properties.get('PRCL_ID')
+        if apn is not None and apn_strip is not None:
+            apn = properties['PRCL_ID'] = apn_strip.sub('', str(apn))
+        if apn and apn_pattern is not None and not apn_pattern.fullmatch(clean_apn(apn)):
+            if layer == 'parcel':
+                dropped += 1
+                continue
+            properties['PRCL_ID'] = None
+        yield feature
+
+    if dropped:
+        print(f"Dropped {dropped} {county_name} parcels whose APN does not match the county's apn_pattern.")
+
+def index_parcel_features(features, parcel_index):
+    """Add each parcel to parcel_index as it streams past, yielding it unchanged."""
+    for feature in features:
+        parcel_index.add(feature['properties'].get('PRCL_ID'), feature['geometry'])
+        yield feature
+
+def assign_address_parcel(feature, parcel_index):
+    """Check an address's APN against the parcel that contains its point.
+
+    Returns 'matched', 'recovered' (the APN was missing or unknown and is
+    replaced by the containing parcel's), 'disagrees' (the point lies in a
+    different known parcel; the APN is left as is), 'outside' (the APN is
+    known but the point lies in no parcel), or 'unlocated' (there is no
+    point, or neither the APN nor the point places the address).
+    """
+    properties = feature['properties']
+    apn = properties.get('PRCL_ID')
+    coordinates = point_coordinates(feature['geometry'])
+    located_apn = parcel_index.locate(coordinates)
+    if located_apn is None:
+        return 'outside' if coordinates is not None and apn in parcel_index else 'unlocated'
+    if apn == located_apn:
+        return 'matched'
+    if apn not in parcel_index:
+        properties['PRCL_ID'] = located_apn
+        return 'recovered'
+    return 'disagrees'
+
+def clean_address_feature(feature, keep_orphans=False):
+    """Clean one address feature; return (feature, canonical address), or None if it is filtered out.
+
+    With keep_orphans, features without an APN are kept (with an empty
+    PRCL_ID) so they can be placed in a parcel by location.
+    """
+    properties = feature['properties']
 
-        if not is_address_complete(properties):
-            continue
-        
-        properties['PRCL_ID'] = clean_apn(properties['PRCL_ID'])
+    if not str(properties.get('PRCL_ID') or '').strip():
+        if not keep_orphans:
+            return None
+        properties['PRCL_ID'] = ''
 
-        for component in ['ADDR_NBR', 'PREFIX', 'NAME_ROOT', 'SUFFIX', 'ADDR_UNIT_TYPE', 'ADDR_UNIT_NBR', 'ADDR_FLOOR']:
-            if component in properties:
-                properties[component] = standardize_address_component(properties.get(component, ''))
+    if not is_address_complete(properties):
+        return None
 
-        address_key = unique_address_key(properties, geometry)
-        if address_key not in seen_addresses:
-            seen_addresses.add(address_key)
-            cleaned_features.append(feature)
+    properties['PRCL_ID'] = clean_apn(properties['PRCL_ID'])
 
-    data['features'] = cleaned_features
-    
-    with open(output_file_path, 'w') as f:
-        json.dump(data, f, indent=4)
+    for component in CANONICAL_COMPONENTS:
+        if component in properties:
+            properties[component] = canonical_component(properties[component], component)
 
-def clean_apn_dataset(geojson_file_path, output_file_path):
-    with open(geojson_file_path) as f:
-        data = json.load(f)
+    return feature, canonical_address(properties)
 
-    cleaned_features = []
+def clean_address_batch(batch, keep_orphans=False):
+    """Clean a batch of address properties in place.
 
-    for feature in data['features']:
-        properties = feature['properties']
-        
+    Returns (properties, canonical address, address digest) for each, or
+    None where the address is filtered out.
+    """
+    results = []
+    for properties in batch:
+        result = clean_address_feature({'properties': properties}, keep_orphans)
+        results.append(result and (properties, result[1], address_digest(result[1])))
+    return results
+
+def clean_apn_batch(batch):
+    for properties in batch:
         # Clean and standardize APN
         if 'PRCL_ID' in properties:
             properties['PRCL_ID'] = clean_apn(properties['PRCL_ID'])
-        
-        cleaned_features.append(feature)
+    return batch
 
-    # Update the data with cleaned features
-    data['features'] = cleaned_features
-    
-    # Save the cleaned data to a new GeoJSON file
-    with open(output_file_path, 'w') as f:
-        json.dump(data, f, indent=4)
+def map_batches(func, features, workers=1, batch_size=CLEAN_BATCH_SIZE, fields=None):
+    """Apply func to the properties of batches of features and yield (batch, result) pairs in input order.
 
-def verify_cleaned_data(geojson_file_path):
-    with open(geojson_file_path) as f:
-        data = json.load(f)
+    With more than one worker the batches run in a process pool, and only a
+    few batches per worker are in flight at a time, so the input is still
+    consumed as a stream. Workers are sent only the given property fields
+    (all of them by default), never the geometry, so the pickling stays
+    small; func's result should be just as compact.
+    """
+    batches = iter_batches(features, batch_size)
+    if workers <= 1:
+        for batch in batches:
+            yield batch, func([feature['properties'] for feature in batch])
+        return
+
+    def pack(batch):
+        if fields is None:
+            return [feature['properties'] for feature in batch]
+        return [{field: feature['properties'][field] for field in fields if field in feature['properties']}
+                for feature in batch]
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_PROCESS_CONTEXT) as executor:
+        pending = collections.deque()
+        for batch in batches:
+            pending.append((batch, executor.submit(func, pack(batch))))
+            if len(pending) >= workers * 2:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+def clean_address_features(features, workers=CLEAN_WORKERS, batch_size=CLEAN_BATCH_SIZE,
+                           tolerance_meters=ADDRESS_DEDUP_TOLERANCE_METERS, parcel_index=None, keep_orphans=None):
+    """Clean, deduplicate and verify address features in a single streaming pass.
+
+    Per-feature cleaning can be sharded across worker processes. Deduplication
+    and verification are merged serially in input order, so the survivors and
+    their order are the same as with one worker. Yields the surviving features
+    and prints the same verification summary as verify_cleaned_data once the
+    input is exhausted.
+
+    With a parcel_index (fully populated before the first address is pulled),
+    the survivors also go through assign_address_parcels. keep_orphans keeps
+    addresses without an APN for a later assignment; it defaults to whether
+    a parcel_index is given.
+    """
+    if keep_orphans is None:
+        keep_orphans = parcel_index is not None
+    cleaned = _clean_address_stream(features, workers, batch_size, tolerance_meters, keep_orphans)
+    return cleaned if parcel_index is None else assign_address_parcels(cleaned, parcel_index)
 
+def _clean_address_stream(features, workers, batch_size, tolerance_meters, keep_orphans):
+    dedup_index = AddressDedupIndex(tolerance_meters)
     total_features = 0
     issues_found = 0
-    address_counter = {}  # Track occurrences of addresses with their geo data
 
-    for feature in data['features']:
+    clean_batch = functools.partial(clean_address_batch, keep_orphans=keep_orphans)
+    for batch, results in map_batches(clean_batch, features, workers, batch_size, ADDRESS_CLEAN_FIELDS):
+        for feature, result in zip(batch, results):
+            if result is None:
+                continue
+            cleaned_fields, full_address, digest = result
+            feature['properties'].update(cleaned_fields)
+            if not dedup_index.add(full_address, point_coordinates(feature['geometry']), digest):
+                continue
+
+            # Survivors are unique by construction, so only completeness is left to verify
+            total_features += 1
+            if not full_address:
+                print(f"Issue found in feature {total_features}: Incomplete address")
+                issues_found += 1
+
+            yield feature
+
+    print(f"Verification completed. Total features checked: {total_features}, Issues found: {issues_found}")
+
+def assign_address_parcels(features, parcel_index):
+    """Place each cleaned address in a parcel by location, as it streams past.
+
+    Addresses with a missing or unknown APN take the containing parcel's APN,
+    orphans that lie in no parcel are dropped, and APN/location disagreements
+    and known APNs whose point lies in no parcel are reported. parcel_index must be fully populated before the first
+    address is pulled.
+    """
+    assignments = collections.Counter()
+    for feature in features:
+        assignment = assign_address_parcel(feature, parcel_index)
+        assignments[assignment] += 1
+        if assignment == 'unlocated' and not feature['properties']['PRCL_ID']:
+            continue
+        if assignment == 'outside':
+            print(f"Issue found in address '{canonical_address(feature['properties'])}': "
+                  f"APN '{feature['properties']['PRCL_ID']}' but its point lies outside every parcel")
+        if assignment == 'disagrees':
+            print(f"Issue found in address '{canonical_address(feature['properties'])}': "
+                  f"APN '{feature['properties']['PRCL_ID']}' but its point lies in parcel "
+                  f"'{parcel_index.locate(point_coordinates(feature['geometry']))}'")
+        yield feature
+
+    print(f"Spatial assignment: {assignments['matched']} matched, {assignments['recovered']} recovered by location, "
+          f"{assignments['disagrees']} APN/location disagreements, "
+          f"{assignments['outside']} with a known APN but outside every parcel, {assignments['unlocated']} unlocated")
+
+def clean_apn_features(features, workers=CLEAN_WORKERS, batch_size=CLEAN_BATCH_SIZE):
+    """Clean and verify parcel APNs in a single streaming pass.
+
+    Yields every feature with its APN standardized, in input order, and
+    prints the same verification summary as verify_cleaned_apns once the
+    input is exhausted.
+    """
+    total_features = 0
+    issues_found = 0
+
+    for batch, results in map_batches(clean_apn_batch, features, workers, batch_size, ['PRCL_ID']):
+        for feature, cleaned_fields in zip(batch, results):
+            feature['properties'].update(cleaned_fields)
+            total_features += 1
+            apn = feature['properties'].get('PRCL_ID', '')
+            if not re.match(r'^[a-zA-Z0-9]*$', apn):
+                print(f"Issue found in feature {total_features}: Non-standard APN '{apn}'")
+                issues_found += 1
+
+            yield feature
+
+    print(f"Verification completed. Total features checked: {total_features}, Issues found: {issues_found}")
+
+def clean_address_dataset(geojson_file_path, output_file_path, workers=CLEAN_WORKERS):
+    write_geojson(clean_address_features(iter_features(geojson_file_path), workers), output_file_path)
+
+def clean_apn_dataset(geojson_file_path, output_file_path, workers=CLEAN_WORKERS):
+    write_geojson(clean_apn_features(iter_features(geojson_file_path), workers), output_file_path)
+
+def verify_cleaned_data(geojson_file_path):
+    total_features = 0
+    issues_found = 0
+    dedup_index = AddressDedupIndex()
+    duplicate_addresses = {}  # Occurrences of each address that has a duplicate point
+
+    for feature in iter_features(geojson_file_path):
         properties = feature['properties']
         geometry = feature['geometry']
         total_features += 1
         
-        # Construct the full address from components, ensuring all parts are treated as strings
-        address_components = [
-            str(properties.get(field, '')).strip().title() for field in [
-                'ADDR_NBR', 'ADDR_STR_NBR', 'PREFIX', 'NAME_ROOT', 'SUFFIX', 'ADDR_UNIT_NBR'
-            ]
-        ]
-        # Filter out empty components and join to form a full address
-        full_address = ' '.join(filter(None, address_components)).upper()
-
-        # Include the geo coordinates as part of the unique identifier for each address
-        # Assuming the coordinates are a list of [longitude, latitude]
-        geo_data = str(geometry['coordinates']) if geometry['coordinates'] else 'NO_COORDINATES'
-
-        # Use both address and geo_data as key
-        unique_key = f"{full_address}_{geo_data}"
+        # Same canonical address and dedup index as the cleaning step
+        full_address = canonical_address(properties)
 
         if not full_address:
             print(f"Issue found in feature {total_features}: Incomplete address")
             issues_found += 1
-        else:
-            address_counter[unique_key] = address_counter.get(unique_key, 0) + 1
+        elif not dedup_index.add(full_address, point_coordinates(geometry)):
+            duplicate_addresses[full_address] = duplicate_addresses.get(full_address, 1) + 1
 
-    # Check for duplicate addresses (considering geo data)
-    duplicate_addresses = {key.split('_')[0]: count for key, count in address_counter.items() if count > 1}
+    # Check for duplicate addresses (points within the dedup tolerance)
     if duplicate_addresses:
-        print("Duplicate addresses with identical geo data found:")
+        print(f"Duplicate addresses within {dedup_index.tolerance_meters} m found:")
         for address, count in duplicate_addresses.items():
             print(f"Address '{address}' occurs {count} times")
         issues_found += len(duplicate_addresses)
@@ -250,13 +2063,10 @@ def verify_cleaned_data(geojson_file_path):
     print(f"Verification completed. Total features checked: {total_features}, Issues found: {issues_found}")
 
 def verify_cleaned_apns(geojson_file_path):
-    with open(geojson_file_path) as f:
-        data = json.load(f)
-
     total_features = 0
     issues_found = 0
 
-    for feature in data['features']:
+    for feature in iter_features(geojson_file_path):
         total_features += 1
         properties = feature['properties']
         
@@ -268,70 +2078,281 @@ def verify_cleaned_apns(geojson_file_path):
 
     print(f"Verification completed. Total features checked: {total_features}, Issues found: {issues_found}")
 
-def upload_for_parcel(geojson_file_path, db_connection_string):
-    with open(geojson_file_path, 'r') as file:
-        data = json.load(file)
-    
-    conn = psycopg2.connect(db_connection_string)
-    cursor = conn.cursor()
-    
-    insert_query = """
-    INSERT INTO parcel (geom, apn) 
-    VALUES (ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s)
-    ON CONFLICT (apn) DO NOTHING;
+class IteratorFile(io.TextIOBase):
+    """Read-only text file over an iterator of lines, so COPY can stream rows as they are produced."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ''
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            chunk, self._buffer = self._buffer, ''
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+def copy_text(value):
+    """Encode a value for COPY's text format."""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def copy_rows(cursor, table, columns, rows):
+    """Stream rows into table with a single COPY ... FROM STDIN."""
+    lines = ('\t'.join(copy_text(value) for value in row) + '\n' for row in rows)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", IteratorFile(lines))
+
+def create_staging_table(cursor, table, column_definitions):
+    """Create (or empty) a staging table; it skips WAL and is truncated after each load.
+
+    Staging tables are temporary, so each connection has its own and county
+    pipelines running at the same time cannot see each other's rows.
     """
-    
-    for feature in data['features']:
-        geom = json.dumps(feature['geometry'])
-        apn = feature['properties']['PRCL_ID']
-        cursor.execute(insert_query, (geom, apn))
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("Uploaded parcel data to the database.")
+    cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {table} ({column_definitions});")
+    cursor.execute(f"TRUNCATE {table};")
 
-def correct_or_drop_invalid_geometries(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
-    cursor = conn.cursor()
-    
-    # Identify parcels with invalid geometries
-    cursor.execute("SELECT id FROM parcel WHERE NOT ST_IsValid(geom);")
-    invalid_parcel_ids = cursor.fetchall()
+def parcel_geometry_sql(geojson, precision_grid=PRECISION_GRID_DEGREES):
+    """SQL turning GeoJSON text into a parcel MultiPolygon, snapped to the precision grid if one is set.
 
-    for parcel_id_tuple in invalid_parcel_ids:
-        parcel_id = parcel_id_tuple[0]
-        # Try to correct invalid geometries to MultiPolygon
-        cursor.execute("""
-            WITH corrected AS (
-                SELECT ST_CollectionExtract(ST_MakeValid(geom), 3) AS geom
-                FROM parcel WHERE id = %s
-            ), multi AS (
-                SELECT ST_Multi(geom) AS geom FROM corrected WHERE geom IS NOT NULL
-            )
-            UPDATE parcel
-            SET geom = (SELECT geom FROM multi)
-            WHERE id = %s AND (SELECT geom FROM multi) IS NOT NULL;
-        """, (parcel_id, parcel_id))
-
-        # If geometry cannot be corrected to MultiPolygon, drop the parcel
+    Snapping can leave a polygon invalid or collapse it, so the geometry
+    repair stage re-checks every parcel after the load.
+    """
+    geometry = f"ST_SetSRID(ST_GeomFromGeoJSON({geojson}), 4326)"
+    if precision_grid:
+        geometry = f"ST_SnapToGrid({geometry}, {float(precision_grid)!r})"
+    return f"ST_Multi({geometry})"
+
+def load_source_digest(paths, *settings):
+    """Identify a load's input, so a journal entry is only resumed by a load of the same data."""
+    return content_hash(code_version(), [file_digest(path) for path in paths], *settings)
+
+def load_in_batches(conn, rows, load_batch, county, stage, source=None, source_digest=None,
+                    batch_size=LOAD_BATCH_SIZE):
+    """Load (seq, ...) rows with load_batch(cursor, rows), committing every batch_size rows.
+
+    Each batch is handed to load_batch as an iterator, which it must consume
+    (COPY does), so a batch is streamed rather than held in memory. With a
+    source, each commit also records the last seq it loaded in load_journal,
+    in the same transaction. A later load of the same source and digest
+    skips the rows up to that seq, so it carries on where an interrupted
+    load stopped; a different digest starts over. The rows are
+    in seq order and each batch applies the same first-wins rules against
+    what the earlier batches committed, so a resumed load ends with the same
+    rows as an uninterrupted one. The journal entry is removed once the
+    load completes. Returns the total of load_batch's results.
+    """
+    cursor = conn.cursor()
+    resume_after, batches = -1, 0
+    if source is not None:
         cursor.execute("""
-            DELETE FROM parcel
-            WHERE id = %s AND (NOT ST_IsValid(geom) OR geom IS NULL);
-        """, (parcel_id,))
-        
+            SELECT source_digest, last_seq, batches FROM load_journal
+            WHERE county = %s AND stage = %s AND source = %s;
+        """, (county, stage, source))
+        entry = cursor.fetchone()
+        if entry is not None and entry[0] == source_digest:
+            resume_after, batches = entry[1], entry[2]
+            print(f"Resuming {stage} for {county} after {batches} committed batches (row {resume_after}).")
+        elif entry is not None:
+            print(f"The input of {stage} for {county} changed since the interrupted load; starting over.")
+        conn.commit()
+
+    def batch(first_row):
+        nonlocal last_seq
+        for row in itertools.chain([first_row], itertools.islice(pending, batch_size - 1)):
+            last_seq = row[0]
+            yield row
+
+    pending = (row for row in rows if row[0] > resume_after)
+    loaded = 0
+    last_seq = resume_after
+    for first_row in pending:
+        loaded += load_batch(cursor, batch(first_row))
+        batches += 1
+        if source is not None:
+            cursor.execute("""
+                INSERT INTO load_journal (county, stage, source, source_digest, last_seq, batches)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (county, stage, source) DO UPDATE
+                SET source_digest = EXCLUDED.source_digest, last_seq = EXCLUDED.last_seq,
+                    batches = EXCLUDED.batches, updated_at = now();
+            """, (county, stage, source, source_digest, last_seq, batches))
         conn.commit()
 
+    if source is not None:
+        cursor.execute("DELETE FROM load_journal WHERE county = %s AND stage = %s AND source = %s;",
+                       (county, stage, source))
+        conn.commit()
     cursor.close()
-    conn.close()
-    print("Finished processing invalid geometries.")
+    return loaded
+
+def upload_for_parcel(geojson_file_path, db_connection_string, repair_locally=False,
+                      precision_grid=PRECISION_GRID_DEGREES, county=DEFAULT_COUNTY, batch_size=LOAD_BATCH_SIZE):
+    load_parcel_features(iter_features(geojson_file_path), db_connection_string, repair_locally, precision_grid, county,
+                         batch_size, geojson_file_path,
+                         load_source_digest([geojson_file_path], repair_locally, precision_grid))
+
+def insert_parcel_batch(cursor, rows, county=DEFAULT_COUNTY, precision_grid=PRECISION_GRID_DEGREES):
+    """COPY a batch of (seq, apn, geometry JSON) rows into staging and insert the winners into parcel."""
+    create_staging_table(cursor, 'parcel_stage', 'seq BIGINT, apn TEXT, geom TEXT')
+    copy_rows(cursor, 'parcel_stage', ('seq', 'apn', 'geom'), rows)
+
+    # One set-based insert; the first feature for an APN wins, as with per-row ON CONFLICT DO NOTHING.
+    # Parcels committed by earlier batches win through the conflict clause.
+    cursor.execute(f"""
+        INSERT INTO parcel (county, geom, apn)
+        SELECT %s, {parcel_geometry_sql('s.geom', precision_grid)}, s.apn
+        FROM (
+            SELECT seq, apn, geom, row_number() OVER (PARTITION BY apn ORDER BY seq) AS rn
+            FROM parcel_stage
+        ) s
+        WHERE s.rn = 1 OR s.apn IS NULL
+        ORDER BY s.seq
+        ON CONFLICT (county, apn) DO NOTHING;
+    """, (county,))
+    inserted = cursor.rowcount
+    cursor.execute("TRUNCATE parcel_stage;")
+    return inserted
+
+def load_parcel_features(features, db_connection_string, repair_locally=False, precision_grid=PRECISION_GRID_DEGREES,
+                         county=DEFAULT_COUNTY, batch_size=LOAD_BATCH_SIZE, source=None, source_digest=None):
+    """Load parcel features from any iterable; COPY consumes it lazily, so it is never held in memory.
+
+    The load commits every batch_size features. With a source, it resumes
+    an interrupted load of that source (see load_in_batches).
+    """
+    if repair_locally:
+        features = repair_parcel_features(features)
+
+    # Stream the features into staging with COPY, geometry as GeoJSON text
+    rows = ((seq, feature['properties'].get('PRCL_ID'), json.dumps(feature['geometry']))
+            for seq, feature in enumerate(features)
+            if feature.get('geometry'))
+
+    conn = get_connection(db_connection_string)
+    inserted = load_in_batches(conn, rows,
+                               functools.partial(insert_parcel_batch, county=county, precision_grid=precision_grid),
+                               county, 'load_parcels', source, source_digest, batch_size)
+    release_connection(conn)
+    print(f"Uploaded {inserted} parcels to the database.")
+
+def correct_or_drop_invalid_geometries(db_connection_string, table_suffix='', county=DEFAULT_COUNTY):
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+
+    # Correct every invalid geometry to a MultiPolygon in one statement
+    cursor.execute(f"""
+        UPDATE parcel{table_suffix}
+        SET geom = ST_Multi(ST_CollectionExtract(ST_MakeValid(geom), 3))
+        WHERE county = %s AND NOT ST_IsValid(geom)
+        RETURNING id;
+    """, (county,))
+    corrected_ids = [row[0] for row in cursor.fetchall()]
+
+    # Drop the parcels whose geometry could not be corrected to a MultiPolygon
+    dropped_count = 0
+    if corrected_ids:
+        cursor.execute(f"""
+            DELETE FROM parcel{table_suffix}
+            WHERE county = %s AND id = ANY(%s::uuid[])
+              AND (geom IS NULL OR ST_IsEmpty(geom) OR NOT ST_IsValid(geom));
+        """, (county, corrected_ids))
+        dropped_count = cursor.rowcount
+
+    # Drop the parcels that collapsed when they were snapped to the precision grid
+    cursor.execute(f"DELETE FROM parcel{table_suffix} WHERE county = %s AND (geom IS NULL OR ST_IsEmpty(geom));",
+                   (county,))
+    collapsed_count = cursor.rowcount
 
-def check_geometry_issues(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+
+    report_geometry_repair(len(corrected_ids) - dropped_count, dropped_count + collapsed_count)
+
+def report_geometry_repair(repaired_count, dropped_count):
+    if repaired_count == 0:
+        print("No invalid geometries repaired.")
+    else:
+        print(f"Repaired {repaired_count} invalid geometries.")
+    if dropped_count == 0:
+        print("No unrepairable geometries dropped.")
+    else:
+        print(f"Dropped {dropped_count} parcels with unrepairable geometries.")
+
+def repair_geometry(geometry):
+    """Validate a GeoJSON parcel geometry and return (status, geometry).
+
+    status is 'valid' when the geometry is returned unchanged, 'repaired'
+    when it was made valid, and 'dropped' (with geometry None) when nothing
+    polygonal survives the repair. Repaired geometries are MultiPolygons,
+    matching correct_or_drop_invalid_geometries.
+    """
+    if not geometry:
+        return 'dropped', None
+    geom = shape(geometry)
+    if geom.is_valid and not geom.is_empty:
+        return 'valid', geometry
+
+    geom = make_valid(geom)
+    parts = geom.geoms if hasattr(geom, 'geoms') else [geom]
+    polygons = []
+    for part in parts:
+        if part.geom_type == 'Polygon':
+            polygons.append(part)
+        elif part.geom_type == 'MultiPolygon':
+            polygons.extend(part.geoms)
+    polygons = [polygon for polygon in polygons if not polygon.is_empty]
+    if not polygons:
+        return 'dropped', None
+
+    repaired = MultiPolygon(polygons)
+    if not repaired.is_valid:
+        repaired = make_valid(repaired)
+        if repaired.geom_type != 'MultiPolygon':
+            return 'dropped', None
+    return 'repaired', mapping(repaired)
+
+def repair_parcel_features(features, workers=REPAIR_WORKERS, batch_size=10000):
+    """Repair parcel geometries in a process pool before upload and drop those that can't be fixed.
+
+    Features are consumed and yielded in batches, so only one batch is in
+    memory at a time.
+    """
+    if shape is None:
+        raise RuntimeError("Client-side geometry repair requires the shapely library.")
+
+    repaired_count = 0
+    dropped_count = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_PROCESS_CONTEXT) as executor:
+        for batch in iter_batches(features, batch_size):
+            results = executor.map(repair_geometry, [feature.get('geometry') for feature in batch], chunksize=256)
+            for feature, (status, geometry) in zip(batch, results):
+                if status == 'dropped':
+                    dropped_count += 1
+                    continue
+                if status == 'repaired':
+                    repaired_count += 1
+                    feature['geometry'] = geometry
+                yield feature
+
+    report_geometry_repair(repaired_count, dropped_count)
+
+def check_geometry_issues(db_connection_string, table_suffix='', county=DEFAULT_COUNTY):
+    conn = get_connection(db_connection_string)
     cursor = conn.cursor()
     
     # Check for any remaining invalid geometries
-    cursor.execute("SELECT COUNT(*) FROM parcel WHERE NOT ST_IsValid(geom);")
+    cursor.execute(f"SELECT COUNT(*) FROM parcel{table_suffix} WHERE county = %s AND NOT ST_IsValid(geom);", (county,))
     invalid_geom_count = cursor.fetchone()[0]
     if invalid_geom_count == 0:
         print("No invalid geometries found.")
@@ -339,7 +2360,8 @@ def check_geometry_issues(db_connection_string):
         print(f"Found {invalid_geom_count} invalid geometries.")
     
     # Check for any GeometryCollection types
-    cursor.execute("SELECT COUNT(*) FROM parcel WHERE GeometryType(geom) = 'GEOMETRYCOLLECTION';")
+    cursor.execute(f"SELECT COUNT(*) FROM parcel{table_suffix} WHERE county = %s AND GeometryType(geom) = 'GEOMETRYCOLLECTION';",
+                   (county,))
     geometry_collection_count = cursor.fetchone()[0]
     if geometry_collection_count == 0:
         print("No GeometryCollection types found.")
@@ -347,318 +2369,1184 @@ def check_geometry_issues(db_connection_string):
         print(f"Found {geometry_collection_count} GeometryCollection types.")
     
     cursor.close()
-    conn.close()
+    release_connection(conn)
 
-def upload_for_parcel_apn(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
+def upload_for_parcel_apn(db_connection_string, table_suffix='', county=DEFAULT_COUNTY):
+    conn = get_connection(db_connection_string)
     cursor = conn.cursor()
 
-    cursor.execute("""
-        INSERT INTO parcel_apn (parcel_id, apn)
-        SELECT id, apn FROM parcel;
-    """)
+    # Parcels kept from an earlier or interrupted load already have their row
+    cursor.execute(f"""
+        INSERT INTO parcel_apn{table_suffix} (county, parcel_id, apn)
+        SELECT p.county, p.id, p.apn FROM parcel{table_suffix} p
+        WHERE p.county = %s
+          AND NOT EXISTS (SELECT 1 FROM parcel_apn{table_suffix} papn
+                          WHERE papn.county = p.county AND papn.parcel_id = p.id);
+    """, (county,))
 
     conn.commit()
     cursor.close()
-    conn.close()
+    release_connection(conn)
 
     print("Parcel APN table populated successfully.")
 
-def upload_for_parcel_address(db_connection_string, addresses_geojson_path):
-    with open(addresses_geojson_path, 'r') as file:
-        addresses_data = json.load(file)
-
-    conn = psycopg2.connect(db_connection_string)
-    cursor = conn.cursor()
-
-    for feature in addresses_data['features']:
-        address_components = [standardize_address_component(feature['properties'].get(field)) for field in ['ADDR_NBR', 'ADDR_STR_NBR', 'PREFIX', 'NAME_ROOT', 'SUFFIX', 'ADDR_UNIT_NBR']]
-        address = ' '.join(filter(None, address_components)).strip()
+def address_rows(features):
+    """Yield (seq, address, apn, geometry JSON) for each feature that can be tied to a parcel."""
+    for seq, feature in enumerate(features):
+        if not feature.get('geometry'):
+            continue
+        address = canonical_address(feature['properties'])
         prcl_id = feature['properties'].get('PRCL_ID')
-        geom_json = json.dumps(feature['geometry'])
+        if address and prcl_id:
+            yield seq, address, prcl_id, json.dumps(feature['geometry'])
 
-        if not prcl_id or not address:
-            continue
+def first_wins_addresses(rows, known_apns, existing_addresses=frozenset()):
+    """Apply the address association rules in Python, yielding the winning rows in order.
 
-        # Pre-insertion check for duplicate addresses
-        cursor.execute("""
-            SELECT EXISTS(
-                SELECT 1
-                FROM parcel_address
-                WHERE address = %s
-            );
-        """, (address,))
-        exists = cursor.fetchone()[0]
-
-        if exists:
+    An address that is already loaded is skipped. Otherwise the earliest row
+    for the address whose APN is in parcel_apn wins; rows with an unknown APN
+    never block a later row for the same address. associate_staged_addresses
+    applies exactly these rules in SQL.
+    """
+    seen = set()
+    for seq, address, apn, geom in rows:
+        if address in seen or address in existing_addresses or apn not in known_apns:
             continue
+        seen.add(address)
+        yield seq, address, apn, geom
 
-        cursor.execute("""
-            INSERT INTO parcel_address (parcel_id, address, geom)
-            SELECT papn.parcel_id, %s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326)
-            FROM parcel_apn papn
-            WHERE papn.apn = %s
-            ON CONFLICT DO NOTHING;
-        """, (address, geom_json, prcl_id))
+def stage_addresses(cursor, rows, stage_table='parcel_address_stage'):
+    create_staging_table(cursor, stage_table, 'seq BIGINT, address TEXT, apn TEXT, geom TEXT')
+    copy_rows(cursor, stage_table, ('seq', 'address', 'apn', 'geom'), rows)
+    cursor.execute(f"ANALYZE {stage_table};")
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+def associate_staged_addresses(cursor, stage_table='parcel_address_stage', table_suffix='', county=DEFAULT_COUNTY):
+    """Insert the winning staged addresses into parcel_address with one set-based statement.
 
-    print("Addresses uploaded and associated with parcels by APN.")
+    The semi- and anti-joins plan as hash joins over the whole stage, so no
+    per-row lookups against parcel_apn or parcel_address are needed. Geometry
+    is only parsed for the rows that are inserted. Returns the number of rows
+    inserted.
+    """
+    query = f"""
+        INSERT INTO parcel_address{table_suffix} (county, parcel_id, address, geom)
+        SELECT papn.county, papn.parcel_id, w.address, ST_SetSRID(ST_GeomFromGeoJSON(w.geom), 4326)
+        FROM (
+            SELECT DISTINCT ON (s.address) s.seq, s.address, s.apn, s.geom
+            FROM {stage_table} s
+            WHERE EXISTS (SELECT 1 FROM parcel_apn{table_suffix} papn
+                          WHERE papn.county = %(county)s AND papn.apn = s.apn)
+              AND NOT EXISTS (SELECT 1 FROM parcel_address{table_suffix} pa
+                              WHERE pa.county = %(county)s AND pa.address = s.address)
+            ORDER BY s.address, s.seq
+        ) w
+        JOIN parcel_apn{table_suffix} papn ON papn.county = %(county)s AND papn.apn = w.apn
+        ORDER BY w.seq;
+    """
+    execute_explained(cursor, query, {'county': county})
+    inserted = cursor.rowcount
+    cursor.execute(f"TRUNCATE {stage_table};")
+    return inserted
+
+def upload_for_parcel_address(db_connection_string, addresses_geojson_path, county=DEFAULT_COUNTY,
+                              batch_size=LOAD_BATCH_SIZE):
+    load_address_features(iter_features(addresses_geojson_path), db_connection_string, county, batch_size,
+                          addresses_geojson_path, load_source_digest([addresses_geojson_path]))
+
+def insert_address_batch(cursor, rows, county=DEFAULT_COUNTY):
+    """Stage a batch of address rows and associate the winners; addresses committed by earlier batches win."""
+    stage_addresses(cursor, rows)
+    return associate_staged_addresses(cursor, county=county)
+
+def load_address_features(features, db_connection_string, county=DEFAULT_COUNTY, batch_size=LOAD_BATCH_SIZE,
+                          source=None, source_digest=None):
+    """Load address features from any iterable and associate them with parcels by APN.
+
+    The load commits every batch_size features. With a source, it resumes
+    an interrupted load of that source (see load_in_batches).
+    """
+    conn = get_connection(db_connection_string)
+    inserted = load_in_batches(conn, address_rows(features), functools.partial(insert_address_batch, county=county),
+                               county, 'load_addresses', source, source_digest, batch_size)
+    release_connection(conn)
+
+    print(f"{inserted} addresses uploaded and associated with parcels by APN.")
+
+def content_hash(*parts):
+    """Stable digest of JSON-serializable parts, used to detect features that changed between runs."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, separators=(',', ':')).encode())
+    return digest.hexdigest()
+
+def diff_feature_hashes(previous, current):
+    """Compare {key: hash} maps and return the (inserted, changed, deleted) key sets."""
+    inserted = current.keys() - previous.keys()
+    deleted = previous.keys() - current.keys()
+    changed = {key for key in current.keys() & previous.keys() if current[key] != previous[key]}
+    return inserted, changed, deleted
+
+def load_feature_hashes(cursor, layer):
+    cursor.execute("SELECT feature_key, content_hash FROM feature_hash WHERE layer = %s;", (layer,))
+    return dict(cursor.fetchall())
+
+def save_feature_hashes(cursor, layer, upserted, deleted):
+    if deleted:
+        cursor.execute("DELETE FROM feature_hash WHERE layer = %s AND feature_key = ANY(%s);", (layer, list(deleted)))
+    execute_values(cursor, """
+        INSERT INTO feature_hash (layer, feature_key, content_hash) VALUES %s
+        ON CONFLICT (layer, feature_key) DO UPDATE SET content_hash = EXCLUDED.content_hash;
+    """, [(layer, key, value) for key, value in upserted.items()], page_size=1000)
+
+def sync_parcels_incremental(features, db_connection_string, repair_locally=False,
+                             precision_grid=PRECISION_GRID_DEGREES, county=DEFAULT_COUNTY):
+    """Apply only the parcels inserted, changed or deleted since the last sync.
+
+    Parcels are keyed by APN with the first feature for an APN winning, as in
+    upload_for_parcel. Features without an APN cannot be tracked and are skipped.
+    Only the geometries that changed are kept in memory. The precision grid is
+    part of each hash, so changing it reloads every parcel. Hashes are kept
+    per county, and only the county's own parcels are touched.
+    """
+    if repair_locally:
+        features = repair_parcel_features(features)
 
-def test_parcel_upload(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
+    conn = get_connection(db_connection_string)
     cursor = conn.cursor()
 
-    try:
-        # Check if the parcel table exists
-        cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'parcel');")
-        table_exists = cursor.fetchone()[0]
-        assert table_exists, "Parcel table does not exist"
-
-        # Check if the parcel table has records
-        cursor.execute("SELECT COUNT(*) FROM parcel;")
-        record_count = cursor.fetchone()[0]
-        assert record_count > 0, "No records found in the parcel table"
-
-        # Check if the geometries are valid
-        cursor.execute("SELECT COUNT(*) FROM parcel WHERE ST_IsValid(geom);")
-        valid_geom_count = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM parcel;")
-        total_count = cursor.fetchone()[0]
-        assert valid_geom_count == total_count, "Invalid geometries found in the parcel table"
-
-        print("Parcel upload test passed!")
-
-    except AssertionError as e:
-        print(f"Test failed: {str(e)}")
-
-    finally:
-        cursor.close()
-        conn.close()
+    layer = f"{county}/parcel"
+    previous = load_feature_hashes(cursor, layer)
+    conn.commit()
 
-def test_parcel_apn_relationships(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
-    cursor = conn.cursor()
+    current = {}
+    upsert_rows = []
+    for feature in features:
+        apn = feature['properties'].get('PRCL_ID')
+        if not apn or apn in current or not feature.get('geometry'):
+            continue
+        current[apn] = content_hash(apn, feature['geometry'], precision_grid)
+        if previous.get(apn) != current[apn]:
+            upsert_rows.append((county, json.dumps(feature['geometry']), apn))
 
-    try:
-        # Check if the parcel_apn table exists
-        cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'parcel_apn');")
-        table_exists = cursor.fetchone()[0]
-        assert table_exists, "parcel_apn table does not exist"
+    inserted, changed, deleted = diff_feature_hashes(previous, current)
+    upserts = inserted | changed
 
-        # Check if the parcel_apn table has records
-        cursor.execute("SELECT COUNT(*) FROM parcel_apn;")
-        record_count = cursor.fetchone()[0]
-        assert record_count > 0, "No records found in the parcel_apn table"
+    # parcel_apn and parcel_address rows go with their parcel (ON DELETE CASCADE)
+    if deleted:
+        cursor.execute("DELETE FROM parcel WHERE county = %s AND apn = ANY(%s);", (county, list(deleted)))
 
-        # Check if all parcel_id values in parcel_apn exist in the parcel table
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM parcel_apn pa
-            LEFT JOIN parcel p ON pa.parcel_id = p.id
-            WHERE p.id IS NULL;
-        """)
-        missing_parcel_count = cursor.fetchone()[0]
-        assert missing_parcel_count == 0, "parcel_apn table contains parcel_id values that do not exist in the parcel table"
-
-        # Check if all APNs in parcel_apn match the corresponding APNs in the parcel table
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM parcel_apn pa
-            JOIN parcel p ON pa.parcel_id = p.id
-            WHERE pa.apn <> p.apn;
-        """)
-        mismatched_apn_count = cursor.fetchone()[0]
-        assert mismatched_apn_count == 0, "APNs in parcel_apn table do not match the corresponding APNs in the parcel table"
+    execute_values(cursor, """
+        INSERT INTO parcel (county, geom, apn) VALUES %s
+        ON CONFLICT (county, apn) DO UPDATE SET geom = EXCLUDED.geom;
+    """, upsert_rows, template=f"(%s, {parcel_geometry_sql('%s', precision_grid)}, %s)", page_size=1000)
 
-        print("Parcel APN relationship test passed!")
+    cursor.execute("""
+        INSERT INTO parcel_apn (county, parcel_id, apn)
+        SELECT p.county, p.id, p.apn
+        FROM parcel p
+        WHERE p.county = %s AND p.apn = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM parcel_apn papn WHERE papn.county = p.county AND papn.parcel_id = p.id);
+    """, (county, list(upserts)))
 
-    except AssertionError as e:
-        print(f"Test failed: {str(e)}")
+    save_feature_hashes(cursor, layer, {apn: current[apn] for apn in upserts}, deleted)
 
-    finally:
-        cursor.close()
-        conn.close()
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+    print(f"Parcel sync: {len(inserted)} inserted, {len(changed)} changed, {len(deleted)} deleted.")
 
-def test_address_upload(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
+def forget_dropped_parcel_hashes(db_connection_string, county=DEFAULT_COUNTY):
+    """Drop hashes of parcels that are no longer in the table so the next sync retries them."""
+    conn = get_connection(db_connection_string)
     cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM feature_hash h
+        WHERE h.layer = %s || '/parcel'
+          AND NOT EXISTS (SELECT 1 FROM parcel p WHERE p.county = %s AND p.apn = h.feature_key);
+    """, (county, county))
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
 
-    try:
-        # Check if the parcel_address table exists
-        cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'parcel_address');")
-        table_exists = cursor.fetchone()[0]
-        assert table_exists, "parcel_address table does not exist"
-
-        # Check if the parcel_address table has records
-        cursor.execute("SELECT COUNT(*) FROM parcel_address;")
-        record_count = cursor.fetchone()[0]
-        assert record_count > 0, "No records found in the parcel_address table"
-
-        # Check if all parcel_id values in parcel_address exist in the parcel table
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM parcel_address pa
-            LEFT JOIN parcel p ON pa.parcel_id = p.id
-            WHERE p.id IS NULL;
-        """)
-        missing_parcel_count = cursor.fetchone()[0]
-        assert missing_parcel_count == 0, "parcel_address table contains parcel_id values that do not exist in the parcel table"
-
-        # Check if all parcel_id values in parcel_address are associated with valid APNs in the parcel_apn table
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM parcel_address pa
-            LEFT JOIN parcel_apn papn ON pa.parcel_id = papn.parcel_id
-            WHERE papn.parcel_id IS NULL;
-        """)
-        missing_apn_count = cursor.fetchone()[0]
-        assert missing_apn_count == 0, "parcel_address table contains parcel_id values that do not have associated APNs in the parcel_apn table"
-
-        # Check for addresses associated with multiple parcels
-        cursor.execute("""
-            SELECT address, COUNT(DISTINCT parcel_id) AS parcel_count
-            FROM parcel_address
-            GROUP BY address
-            HAVING COUNT(DISTINCT parcel_id) > 1;
-        """)
-        multi_parcel_addresses = cursor.fetchall()
-
-        if len(multi_parcel_addresses) > 0:
-            print("Addresses associated with multiple parcels:")
-            for address, parcel_count in multi_parcel_addresses:
-                print(f"Address: {address}, Parcel Count: {parcel_count}")
-            raise AssertionError("Addresses found associated with multiple parcels")
-
-        # Check if there are any duplicate addresses within the same parcel
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM (
-                SELECT address, parcel_id, COUNT(*)
-                FROM parcel_address
-                GROUP BY address, parcel_id
-                HAVING COUNT(*) > 1
-            ) AS duplicates;
-        """)
-        duplicate_count = cursor.fetchone()[0]
-        assert duplicate_count == 0, "Duplicate addresses found within the same parcel"
-
-        print("Address upload test passed!")
-
-    except AssertionError as e:
-        print(f"Test failed: {str(e)}")
-
-    finally:
-        cursor.close()
-        conn.close()
+def sync_addresses_incremental(features, db_connection_string, county=DEFAULT_COUNTY):
+    """Apply only the addresses inserted, changed or deleted since the last sync.
 
-def run_general_tests(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
+    Addresses are keyed by their stored address text. As in
+    upload_for_parcel_address, the first feature for an address whose APN
+    matches a loaded parcel wins. Only the changed rows are kept in memory.
+    """
+    conn = get_connection(db_connection_string)
     cursor = conn.cursor()
 
-    # Test APN format (alphanumeric) and uniqueness
-    cursor.execute("SELECT COUNT(*) FROM parcel WHERE NOT apn ~* '^[a-z0-9]+$';")
-    invalid_apn_format_count = cursor.fetchone()[0]
-    assert invalid_apn_format_count == 0, "APNs with invalid format found"
+    cursor.execute("SELECT DISTINCT apn FROM parcel_apn WHERE county = %s;", (county,))
+    known_apns = {row[0] for row in cursor.fetchall()}
+    layer = f"{county}/parcel_address"
+    previous = load_feature_hashes(cursor, layer)
+    conn.commit()
 
-    cursor.execute("SELECT apn, COUNT(*) FROM parcel GROUP BY apn HAVING COUNT(*) > 1;")
-    duplicate_apns = cursor.fetchall()
-    assert len(duplicate_apns) == 0, "Duplicate APNs found"
+    current = {}
+    upsert_rows = []
+    for seq, address, apn, geom in first_wins_addresses(address_rows(features), known_apns):
+        current[address] = content_hash(apn, geom)
+        if previous.get(address) != current[address]:
+            upsert_rows.append((seq, address, apn, geom))
 
-    # Test for completeness of the address field
-    cursor.execute("SELECT COUNT(*) FROM parcel_address WHERE trim(address) = '';")
-    incomplete_address_count = cursor.fetchone()[0]
-    assert incomplete_address_count == 0, "Incomplete addresses found"
+    inserted, changed, deleted = diff_feature_hashes(previous, current)
+    upserts = inserted | changed
 
-    # Test that address point geometries lie within a 0.5 meter buffer of their associated parcel geometries
-    cursor.execute("""
-        SELECT COUNT(pa.*)
-        FROM parcel_address pa
-        JOIN parcel p ON pa.parcel_id = p.id
-        WHERE NOT ST_Within(pa.geom, ST_Buffer(p.geom, 0.5)); 
-    """)
-    outside_geom_count = cursor.fetchone()[0]
-    assert outside_geom_count == 0, "Address geometries found outside of their associated parcels (within a 0.5 meter buffer)"
+    # Replace rather than update so rows loaded before the first sync are not duplicated
+    stale = list(deleted | upserts)
+    if stale:
+        cursor.execute("DELETE FROM parcel_address WHERE county = %s AND address = ANY(%s);", (county, stale))
+
+    stage_addresses(cursor, upsert_rows)
+    associate_staged_addresses(cursor, county=county)
 
-    # Test for addresses without a parcel
-    cursor.execute("SELECT COUNT(*) FROM parcel_address WHERE parcel_id NOT IN (SELECT id FROM parcel);")
-    orphan_addresses_count = cursor.fetchone()[0]
-    assert orphan_addresses_count == 0, "Orphan addresses found without an associated parcel"
+    save_feature_hashes(cursor, layer, {address: current[address] for address in upserts}, deleted)
 
+    conn.commit()
     cursor.close()
-    conn.close()
-    print("General tests passed!")
+    release_connection(conn)
+    print(f"Address sync: {len(inserted)} inserted, {len(changed)} changed, {len(deleted)} deleted.")
+
+def incremental_sync(parcel_features, address_features, db_connection_string, repair_locally=False,
+                     county=DEFAULT_COUNTY):
+    """Bring a county's parcel, parcel_apn and parcel_address rows up to date by applying only the delta."""
+    with pipeline_metrics.stage('sync_parcels'):
+        sync_parcels_incremental(parcel_features, db_connection_string, repair_locally, county=county)
+    with pipeline_metrics.stage('repair_geometries'):
+        correct_or_drop_invalid_geometries(db_connection_string, county=county)
+        check_geometry_issues(db_connection_string, county=county)
+        forget_dropped_parcel_hashes(db_connection_string, county)
+    with pipeline_metrics.stage('sync_addresses'):
+        sync_addresses_incremental(address_features, db_connection_string, county)
+
+def validation_check(report, group, name, passed, value, message):
+    report['checks'].append({'group': group, 'name': name, 'passed': bool(passed), 'value': value,
+                             'message': None if passed else message})
+
+def validate_database(db_connection_string, buffer_meters=ADDRESS_PARCEL_BUFFER_METERS, table_suffix=''):
+    """Run every post-load check on one connection and return a structured report.
+
+    The checks are grouped into one aggregate pass per table, plus one
+    grouped pass over addresses. The address-in-parcel check measures
+    geography distance in meters (ST_DWithin), so a 0.5 m buffer means
+    0.5 meters. The report holds one entry per check under 'checks', any
+    offending addresses under 'multi_parcel_addresses', and an overall
+    'passed' flag. With a table_suffix, the checks run against those copies
+    of the tables instead: a county's partitions (see county_partition) or
+    its shadow tables. APNs and addresses are unique within a county.
+    """
+    report = {'checks': [], 'multi_parcel_addresses': []}
+    parcel_table, apn_table, address_table = (f"{table}{table_suffix}" for table in SHADOW_TABLES)
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_name = ANY(%s);",
+                       ([parcel_table, apn_table, address_table],))
+        tables = {row[0] for row in cursor.fetchall()}
+
+        validation_check(report, 'parcel_upload', 'parcel_table_exists', parcel_table in tables, None,
+                         "Parcel table does not exist")
+        if parcel_table in tables:
+            execute_explained(cursor, f"""
+                SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE ST_IsValid(geom) IS NOT TRUE),
+                       COUNT(*) FILTER (WHERE NOT apn ~* '^[a-z0-9]+$'),
+                       COUNT(apn) - COUNT(DISTINCT county || '/' || apn)
+                FROM {parcel_table};
+            """)
+            total, invalid_geometries, invalid_apns, duplicate_apns = cursor.fetchone()
+            validation_check(report, 'parcel_upload', 'parcel_records', total > 0, total,
+                             "No records found in the parcel table")
+            validation_check(report, 'parcel_upload', 'parcel_valid_geometries',
+                             invalid_geometries == 0, invalid_geometries,
+                             "Invalid geometries found in the parcel table")
+            validation_check(report, 'general', 'apn_format', invalid_apns == 0, invalid_apns,
+                             "APNs with invalid format found")
+            validation_check(report, 'general', 'apn_unique', duplicate_apns == 0, duplicate_apns,
+                             "Duplicate APNs found")
+
+        validation_check(report, 'parcel_apn_relationships', 'parcel_apn_table_exists',
+                         apn_table in tables, None,
+                         "parcel_apn table does not exist")
+        if apn_table in tables:
+            execute_explained(cursor, f"""
+                SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE p.id IS NULL),
+                       COUNT(*) FILTER (WHERE pa.apn <> p.apn)
+                FROM {apn_table} pa
+                LEFT JOIN {parcel_table} p ON pa.county = p.county AND pa.parcel_id = p.id;
+            """)
+            total, missing_parcels, mismatched_apns = cursor.fetchone()
+            validation_check(report, 'parcel_apn_relationships', 'parcel_apn_records', total > 0, total,
+                             "No records found in the parcel_apn table")
+            validation_check(report, 'parcel_apn_relationships', 'parcel_apn_parcel_exists',
+                             missing_parcels == 0, missing_parcels,
+                             "parcel_apn table contains parcel_id values that do not exist "
+                             "in the parcel table")
+            validation_check(report, 'parcel_apn_relationships', 'parcel_apn_matches_parcel',
+                             mismatched_apns == 0, mismatched_apns,
+                             "APNs in parcel_apn table do not match the corresponding APNs "
+                             "in the parcel table")
+
+        validation_check(report, 'address_upload', 'parcel_address_table_exists',
+                         address_table in tables, None,
+                         "parcel_address table does not exist")
+        if address_table in tables:
+            execute_explained(cursor, f"""
+                SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE p.id IS NULL),
+                       COUNT(*) FILTER (WHERE NOT EXISTS (
+                           SELECT 1 FROM {apn_table} papn
+                           WHERE papn.county = pa.county AND papn.parcel_id = pa.parcel_id)),
+                       COUNT(*) FILTER (WHERE trim(pa.address) = ''),
+                       COUNT(*) FILTER (WHERE p.id IS NOT NULL
+                                        AND NOT ST_DWithin(pa.geom::geography, p.geom::geography, %s))
+                FROM {address_table} pa
+                LEFT JOIN {parcel_table} p ON pa.county = p.county AND pa.parcel_id = p.id;
+            """, (buffer_meters,))
+            total, missing_parcels, missing_apns, incomplete_addresses, outside_buffer = cursor.fetchone()
+            validation_check(report, 'address_upload', 'parcel_address_records', total > 0, total,
+                             "No records found in the parcel_address table")
+            validation_check(report, 'address_upload', 'parcel_address_parcel_exists',
+                             missing_parcels == 0, missing_parcels,
+                             "parcel_address table contains parcel_id values that do not exist "
+                             "in the parcel table")
+            validation_check(report, 'address_upload', 'parcel_address_apn_exists',
+                             missing_apns == 0, missing_apns,
+                             "parcel_address table contains parcel_id values that do not have "
+                             "associated APNs in the parcel_apn table")
+            validation_check(report, 'general', 'address_complete',
+                             incomplete_addresses == 0, incomplete_addresses,
+                             "Incomplete addresses found")
+            validation_check(report, 'general', 'address_within_parcel',
+                             outside_buffer == 0, outside_buffer,
+                             f"Address geometries found outside of their associated parcels "
+                             f"(within a {buffer_meters} meter buffer)")
+
+            # Addresses on several parcels, and addresses repeated within one parcel, in one grouped pass
+            execute_explained(cursor, f"""
+                SELECT address,
+                       COUNT(DISTINCT parcel_id),
+                       COUNT(parcel_id) - COUNT(DISTINCT parcel_id)
+                FROM {address_table}
+                GROUP BY county, address
+                HAVING COUNT(DISTINCT parcel_id) > 1 OR COUNT(parcel_id) > COUNT(DISTINCT parcel_id);
+            """)
+            grouped = cursor.fetchall()
+            report['multi_parcel_addresses'] = [(address, parcel_count) for address, parcel_count, _ in grouped
+                                                if parcel_count > 1]
+            repeated = sum(1 for _, _, duplicate_rows in grouped if duplicate_rows > 0)
+            multi_parcel = len(report['multi_parcel_addresses'])
+            validation_check(report, 'address_upload', 'address_single_parcel', multi_parcel == 0, multi_parcel,
+                             "Addresses found associated with multiple parcels")
+            validation_check(report, 'address_upload', 'address_unique_in_parcel', repeated == 0, repeated,
+                             "Duplicate addresses found within the same parcel")
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+    report['passed'] = all(check['passed'] for check in report['checks'])
+    return report
+
+# Message printed when every check in a group passes
+VALIDATION_GROUP_MESSAGES = {
+    'parcel_upload': "Parcel upload test passed!",
+    'parcel_apn_relationships': "Parcel APN relationship test passed!",
+    'address_upload': "Address upload test passed!",
+    'general': "General tests passed!",
+}
+
+def print_validation_report(report):
+    """Print a validation report in the same form as the individual test functions did."""
+    if report['multi_parcel_addresses']:
+        print("Addresses associated with multiple parcels:")
+        for address, parcel_count in report['multi_parcel_addresses']:
+            print(f"Address: {address}, Parcel Count: {parcel_count}")
+
+    for group, passed_message in VALIDATION_GROUP_MESSAGES.items():
+        failures = [check for check in report['checks'] if check['group'] == group and not check['passed']]
+        for check in failures:
+            print(f"Test failed: {check['message']}")
+        if not failures:
+            print(passed_message)
 
 def database_integrity_check(db_connection_string):
-    conn = psycopg2.connect(db_connection_string)
+    conn = get_connection(db_connection_string)
     cursor = conn.cursor()
 
     # Verify parcel table integrity
-    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT apn) FROM parcel;")
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT county || '/' || apn) FROM parcel;")
     total, unique_apns = cursor.fetchone()
     print(f"Parcel Table: {total} records, {unique_apns} unique APNs.")
 
     # Verify address table integrity
-    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT address) FROM parcel_address;")
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT county || '/' || address) FROM parcel_address;")
     total, unique_addresses = cursor.fetchone()
     print(f"Address Table: {total} records, {unique_addresses} unique addresses.")
 
     # Spatial relationship check (sample)
     cursor.execute("""
         SELECT COUNT(*) FROM parcel_address pa
-        JOIN parcel p ON pa.parcel_id = p.id
+        JOIN parcel p ON pa.county = p.county AND pa.parcel_id = p.id
         WHERE ST_Contains(p.geom, pa.geom);
     """)
     valid_address_locations = cursor.fetchone()[0]
     print(f"Addresses correctly located within parcels: {valid_address_locations}")
 
     cursor.close()
-    conn.close()
+    release_connection(conn)
+
+def run_tests(db_connection_string, county=None):
+    """Validate the whole database, or only one county's partitions."""
+    report = validate_database(db_connection_string, table_suffix=county_partition('', county) if county else '')
+    print_validation_report(report)
+    return report
+
+# Checks a shadow load must pass before it replaces the live tables. The other checks
+# describe the source data rather than the load, so they are reported but don't block.
+SHADOW_BLOCKING_CHECKS = {
+    'parcel_table_exists', 'parcel_records', 'parcel_valid_geometries', 'apn_unique',
+    'parcel_apn_table_exists', 'parcel_apn_records', 'parcel_apn_parcel_exists', 'parcel_apn_matches_parcel',
+    'parcel_address_table_exists', 'parcel_address_parcel_exists', 'parcel_address_apn_exists',
+}
+SHADOW_LOAD_BATCH_SIZE = 1000  # Rows handed to a writer at a time
+
+# The swap waits at most this long for running queries to release the live tables,
+# then backs off and retries, so readers never queue behind it for long
+SHADOW_SWAP_LOCK_TIMEOUT = '2s'
+SHADOW_SWAP_ATTEMPTS = 5
+
+def shadow_table_suffix(county):
+    """Suffix of a county's shadow tables: the shadow copies of its partitions."""
+    return county_partition('', county) + SHADOW_TABLE_SUFFIX
+
+def create_shadow_tables(db_connection_string, county=DEFAULT_COUNTY):
+    """(Re)create empty shadow copies of a county's partitions, without keys or indexes.
+
+    The copies take their columns, defaults, generated columns and NOT NULL
+    constraints from the partitioned tables, so they follow every applied
+    migration. Each also gets a CHECK constraint matching its partition
+    bound, so attaching it later needs no scan to prove its rows belong.
+    """
+    table_suffix = shadow_table_suffix(county)
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
 
-def run_tests(db_connection_string):
-    test_parcel_upload(db_connection_string)
-    test_parcel_apn_relationships(db_connection_string)
-    test_address_upload(db_connection_string)
-    run_general_tests(db_connection_string)
+    cursor.execute(f"DROP TABLE IF EXISTS {', '.join(table + table_suffix for table in SHADOW_TABLES)};")
+    for table in SHADOW_TABLES:
+        shadow_table = table + table_suffix
+        cursor.execute(f"CREATE TABLE {shadow_table} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED);")
+        cursor.execute(f"ALTER TABLE {shadow_table} ADD CONSTRAINT {shadow_table}_county CHECK (county = %s);",
+                       (county,))
 
-def main():
-    # Create the output directory if it doesn't exist
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+    print(f"Created empty shadow tables for {county}.")
+
+def shard_of(key, shards):
+    """Stable shard for a key: the same key lands on the same shard in every process and run."""
+    return zlib.crc32((key or '').encode()) % shards
+
+def load_sharded(rows, shard_key, load_shard, db_connection_string, writers=LOAD_WRITERS,
+                 batch_size=SHADOW_LOAD_BATCH_SIZE):
+    """Load rows on several connections at once, sharded by a stable hash of shard_key(row).
+
+    Rows are dealt out in batches through bounded queues, so memory stays flat
+    however many rows there are. Each writer runs load_shard(cursor, shard, rows)
+    on its own pooled connection and commits on its own. Rows with the same key
+    always go to the same writer, so first-wins rules hold within a shard.
+    Returns each shard's result.
+    """
+    # Leave one pooled connection for the stages running alongside
+    writers = max(1, min(writers, DB_POOL_MAX_CONNECTIONS - 1))
+    queues = [queue.Queue(maxsize=4) for _ in range(writers)]
+    stage = pipeline_metrics.current_stage()
 
-    # Create the necessary tables
-    create_tables()
+    def write(shard):
+        conn = get_connection(db_connection_string)
+        try:
+            with pipeline_metrics.stage_thread(stage):
+                cursor = conn.cursor()
+                result = load_shard(cursor, shard, itertools.chain.from_iterable(iter(queues[shard].get, None)))
+                conn.commit()
+                cursor.close()
+            return result
+        finally:
+            release_connection(conn)
+
+    def put(shard, item):
+        # Give up on a writer that has stopped, so one failed writer cannot block the others
+        while not futures[shard].done():
+            try:
+                queues[shard].put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        futures = [executor.submit(write, shard) for shard in range(writers)]
+        try:
+            batches = [[] for _ in range(writers)]
+            for row in rows:
+                shard = shard_of(shard_key(row), writers)
+                batches[shard].append(row)
+                if len(batches[shard]) >= batch_size:
+                    if not put(shard, batches[shard]):
+                        break
+                    batches[shard] = []
+            else:
+                for shard, batch in enumerate(batches):
+                    if batch:
+                        put(shard, batch)
+        finally:
+            for shard in range(writers):
+                put(shard, None)
+        return [future.result() for future in futures]
+
+def insert_parcel_shard(cursor, shard, rows, county=DEFAULT_COUNTY, precision_grid=PRECISION_GRID_DEGREES):
+    """COPY one shard of (seq, apn, geometry JSON) rows into its own staging table and insert the winners."""
+    stage_table = f"parcel_stage_{shard}"
+    create_staging_table(cursor, stage_table, 'seq BIGINT, apn TEXT, geom TEXT')
+    copy_rows(cursor, stage_table, ('seq', 'apn', 'geom'), rows)
+
+    # Every feature for an APN is in this shard, so the first one here is the first one overall
+    cursor.execute(f"""
+        INSERT INTO parcel{shadow_table_suffix(county)} (county, geom, apn)
+        SELECT %s, {parcel_geometry_sql('s.geom', precision_grid)}, s.apn
+        FROM (
+            SELECT seq, apn, geom, row_number() OVER (PARTITION BY apn ORDER BY seq) AS rn
+            FROM {stage_table}
+        ) s
+        WHERE s.rn = 1 OR s.apn IS NULL
+        ORDER BY s.seq;
+    """, (county,))
+    inserted = cursor.rowcount
+    cursor.execute(f"TRUNCATE {stage_table};")
+    return inserted
+
+def insert_address_shard(cursor, shard, rows, county=DEFAULT_COUNTY):
+    """Stage one shard of address rows and associate the winners with the shadow parcels."""
+    stage_table = f"parcel_address_stage_{shard}"
+    stage_addresses(cursor, rows, stage_table)
+    return associate_staged_addresses(cursor, stage_table, shadow_table_suffix(county), county)
+
+def load_parcel_features_sharded(features, db_connection_string, writers=LOAD_WRITERS, repair_locally=False,
+                                 precision_grid=PRECISION_GRID_DEGREES, county=DEFAULT_COUNTY):
+    """Load parcel features into the shadow parcel table on several connections, sharded by APN."""
+    if repair_locally:
+        features = repair_parcel_features(features)
+    rows = ((seq, feature['properties'].get('PRCL_ID'), json.dumps(feature['geometry']))
+            for seq, feature in enumerate(features)
+            if feature.get('geometry'))
+    inserted = load_sharded(rows, lambda row: row[1],
+                            functools.partial(insert_parcel_shard, county=county, precision_grid=precision_grid),
+                            db_connection_string, writers)
+    print(f"Uploaded {sum(inserted)} parcels to the shadow tables on {len(inserted)} connections.")
+
+def load_address_features_sharded(features, db_connection_string, writers=LOAD_WRITERS, county=DEFAULT_COUNTY):
+    """Load address features into the shadow address table on several connections.
+
+    Addresses are sharded by the address itself rather than the APN, since the
+    first feature for an address wins whichever parcel it names.
+    """
+    inserted = load_sharded(address_rows(features), lambda row: row[1],
+                            functools.partial(insert_address_shard, county=county), db_connection_string, writers)
+    print(f"{sum(inserted)} addresses uploaded to the shadow tables and associated with parcels by APN.")
 
-    # Download and save ESRI layers as GeoJSON files
-    download_and_save_layer_as_geojson(PARCEL_LAYER_URL, PARCEL_GEOJSON_FILE)
-    download_and_save_layer_as_geojson(ADDRESS_LAYER_URL, ADDRESS_GEOJSON_FILE)
+def shadow_constraint_statements(cursor, table_suffix):
+    """The partitioned tables' primary key and unique constraints, rewritten for the shadow tables.
 
-    # Clean and standardize the parcel and address datasets
-    clean_address_dataset(ADDRESS_GEOJSON_FILE, CLEANED_ADDRESS_GEOJSON_FILE)
-    clean_apn_dataset(PARCEL_GEOJSON_FILE, STANDARDIZED_PARCEL_GEOJSON_FILE)
+    Foreign keys are left to the swap: attaching a partition adds the parent's.
+    """
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = ANY(%s::regclass[]) AND contype IN ('p', 'u')
+        ORDER BY conname;
+    """, (SHADOW_TABLES,))
+    return [f"ALTER TABLE {table}{table_suffix} ADD CONSTRAINT {name}{table_suffix} {definition};"
+            for table, name, definition in cursor.fetchall()]
+
+def shadow_index_statements(table_suffix):
+    """The post-load index migrations, rewritten to build the same indexes on the shadow tables.
+
+    Attaching a shadow table adopts these as its partitions of the parent indexes.
+    """
+    return [rewrite_index_statement(index, table, statement, f"{index}{table_suffix}", f"{table}{table_suffix}")
+            for index, table, statement in post_load_indexes()]
 
-    # Verify the cleaned datasets
-    verify_cleaned_data(CLEANED_ADDRESS_GEOJSON_FILE)
-    verify_cleaned_apns(STANDARDIZED_PARCEL_GEOJSON_FILE)
+def build_shadow_indexes(db_connection_string, writers=LOAD_WRITERS, county=DEFAULT_COUNTY):
+    """Add the partitioned tables' keys to a county's shadow tables, then build their indexes in parallel.
 
-    # Upload the parcel data to the database
-    upload_for_parcel(STANDARDIZED_PARCEL_GEOJSON_FILE, DB_CONNECTION_STRING)
+    Keys go first, one at a time, since adding one locks its table. Index
+    builds only take SHARE locks, so they run side by side, one per connection.
+    """
+    table_suffix = shadow_table_suffix(county)
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    for statement in shadow_constraint_statements(cursor, table_suffix):
+        cursor.execute(statement)
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
 
-    # Correct or drop invalid geometries in the parcel table
-    correct_or_drop_invalid_geometries(DB_CONNECTION_STRING)
+    stage = pipeline_metrics.current_stage()
 
-    # Check for geometry issues in the parcel table
-    check_geometry_issues(DB_CONNECTION_STRING)
+    def build(statement):
+        conn = get_connection(db_connection_string)
+        try:
+            with pipeline_metrics.stage_thread(stage):
+                cursor = conn.cursor()
+                cursor.execute(statement)
+                conn.commit()
+                cursor.close()
+        finally:
+            release_connection(conn)
+
+    statements = shadow_index_statements(table_suffix)
+    with ThreadPoolExecutor(max_workers=max(1, min(writers, DB_POOL_MAX_CONNECTIONS - 1))) as executor:
+        list(executor.map(build, statements))
+
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    for table in SHADOW_TABLES:
+        cursor.execute(f"ANALYZE {table}{table_suffix};")
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+    print(f"Built {len(statements)} indexes on the shadow tables for {county}.")
+
+def validate_shadow_tables(db_connection_string, buffer_meters=ADDRESS_PARCEL_BUFFER_METERS, county=DEFAULT_COUNTY):
+    """Validate a county's shadow tables, raising if a blocking check fails so a bad load is never swapped in."""
+    report = validate_database(db_connection_string, buffer_meters, shadow_table_suffix(county))
+    failures = [check for check in report['checks']
+                if check['name'] in SHADOW_BLOCKING_CHECKS and not check['passed']]
+    for check in failures:
+        print(f"Shadow validation failed: {check['message']}")
+    if failures:
+        raise RuntimeError(f"The shadow tables for {county} failed validation; "
+                           "the live tables were left unchanged.")
+    print(f"Shadow tables for {county} passed validation.")
+    return report
+
+def swap_shadow_tables(db_connection_string, county=DEFAULT_COUNTY,
+                       lock_timeout=SHADOW_SWAP_LOCK_TIMEOUT, attempts=SHADOW_SWAP_ATTEMPTS):
+    """Swap a county's shadow tables in for its partitions in one transaction, retrying on lock timeouts."""
+    table_suffix = shadow_table_suffix(county)
+    partitions = [county_partition(table, county) for table in SHADOW_TABLES]
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                cursor.execute("SET LOCAL lock_timeout = %s;", (lock_timeout,))
+                cursor.execute("DELETE FROM feature_hash WHERE split_part(layer, '/', 1) = %s;", (county,))
+                # Detaching needs the parents in ACCESS EXCLUSIVE mode; locking them first, in a fixed order,
+                # keeps concurrent swaps of other counties from deadlocking. The foreign key checks of the
+                # detach and the attaches below run under these locks.
+                cursor.execute(f"LOCK TABLE ONLY {', '.join(SHADOW_TABLES)} IN ACCESS EXCLUSIVE MODE;")
+                cursor.execute(f"LOCK TABLE {', '.join(partitions)} IN ACCESS EXCLUSIVE MODE;")
+
+                # Referencing partitions go first, so the parcels are never referenced when detached
+                for table, partition in reversed(list(zip(SHADOW_TABLES, partitions))):
+                    cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {partition};")
+                    cursor.execute(f"DROP TABLE {partition};")
+                for table, partition in zip(SHADOW_TABLES, partitions):
+                    cursor.execute(f"ALTER TABLE {table}{table_suffix} RENAME TO {partition};")
+                    cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES IN (%s);", (county,))
+                    # The partition bound now holds the rows to the county
+                    cursor.execute(f"ALTER TABLE {partition} DROP CONSTRAINT {table}{table_suffix}_county;")
+                break
+            except (psycopg2.errors.LockNotAvailable, psycopg2.errors.DeadlockDetected):
+                conn.rollback()
+                if attempt == attempts:
+                    raise
+                print(f"The live tables for {county} are busy; retrying the swap ({attempt}/{attempts}).")
+                time.sleep(attempt)
+
+        # Give the keys and indexes their live names back
+        cursor.execute("""
+            SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE conrelid = ANY(%s::regclass[]) AND right(conname, %s) = %s;
+        """, (partitions, len(SHADOW_TABLE_SUFFIX), SHADOW_TABLE_SUFFIX))
+        for table, name in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {name} TO {name[:-len(SHADOW_TABLE_SUFFIX)]};")
+        cursor.execute("""
+            SELECT relname FROM pg_class
+            WHERE right(relname, %s) = %s
+              AND oid IN (SELECT indexrelid FROM pg_index WHERE indrelid = ANY(%s::regclass[]));
+        """, (len(SHADOW_TABLE_SUFFIX), SHADOW_TABLE_SUFFIX, partitions))
+        for (name,) in cursor.fetchall():
+            cursor.execute(f"ALTER INDEX {name} RENAME TO {name[:-len(SHADOW_TABLE_SUFFIX)]};")
+        conn.commit()
+    finally:
+        cursor.close()
+        release_connection(conn)
+    print(f"Swapped the shadow tables in for the {county} partitions.")
+
+def run_stage_graph(stages, max_workers=None):
+    """Run pipeline stages as soon as their dependencies have finished.
+
+    stages maps each stage name to (function, names of the stages it depends
+    on). Independent stages run concurrently on threads, which suits the
+    I/O-bound download and load stages. Each stage is timed as a metrics
+    stage under its name. The first failure stops new stages from starting
+    and is re-raised once the running ones finish. Returns the stage results
+    by name.
+    """
+    for name, (_, dependencies) in stages.items():
+        unknown = [dependency for dependency in dependencies if dependency not in stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {', '.join(unknown)}")
+
+    def run_stage(name, func):
+        with pipeline_metrics.stage(name):
+            return func()
+
+    pending = dict(stages)
+    running = {}
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(stages) or 1) as executor:
+        while pending or running:
+            ready = [name for name, (_, dependencies) in pending.items()
+                     if all(dependency in results for dependency in dependencies)]
+            for name in ready:
+                func, _ = pending.pop(name)
+                running[executor.submit(run_stage, name, func)] = name
+            if not running:
+                raise ValueError(f"Stage dependencies form a cycle: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    pending.clear()
+                    logger.error(f"Stage '{name}' failed: {error}")
+                    raise error
+                results[name] = future.result()
+    return results
+
+# Settings that don't change what a stage produces, so they are left out of its cache key
+STAGE_CACHE_IGNORED_CONFIG = {
+    'db_password',
+    'output_dir',
+    'counties_file',
+    'counties',
+    'county_workers',
+    'download_workers',
+    'http_cache',
+    'http_cache_dir',
+    'http_cache_max_age_hours',
+    'clean_workers',
+    'load_writers',
+    'load_batch_size',
+    'metrics_file',
+    'metrics_format',
+    'explain_queries',
+    'write_debug_artifacts',
+    'artifact_format',
+    'stage_cache',
+    'stage_cache_max_age_days',
+    'stage_cache_max_mb',
+}
+
+_file_digests = {}  # (path, size, mtime) -> digest, so each input is hashed once per run
+
+def file_digest(path):
+    """sha256 of a file's contents."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _file_digests[memo_key] = digest.hexdigest()
+    return _file_digests[memo_key]
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Digest of this module's source, so any code change invalidates cached stages."""
+    return file_digest(os.path.abspath(__file__))
+
+def database_fingerprint(db_connection_string, county=DEFAULT_COUNTY):
+    """Row counts of a county's rows and the schema version, to notice changes made outside a run.
+
+    Only the county's rows are counted, so loading another county does not
+    invalidate its cached stages.
+    """
+    conn = get_connection(db_connection_string)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM parcel WHERE county = %(county)s),
+               (SELECT COUNT(*) FROM parcel_apn WHERE county = %(county)s),
+               (SELECT COUNT(*) FROM parcel_address WHERE county = %(county)s),
+               (SELECT COALESCE(MAX(version), 0) FROM schema_migrations);
+    """, {'county': county})
+    fingerprint = list(cursor.fetchone())
+    conn.commit()
+    cursor.close()
+    release_connection(conn)
+    return fingerprint
+
+class StageCache:
+    """Content-addressed record of completed stages, kept in the output directory.
+
+    A stage's key hashes its name, the code version, the settings that
+    affect it, the contents of its input files and the keys of the stages it
+    builds on. A stage whose key was recorded by an earlier run is skipped.
+    File outputs are copied into the cache and restored on a hit if they went
+    missing or changed. Stages that write to the database also record the
+    database fingerprint they left behind. They are only skipped while the
+    database still matches the fingerprint of the last recorded stage, so a
+    database changed or emptied by someone else is reloaded. Each county has
+    its own cache, which fingerprints only that county's rows.
+    """
 
-    # Populate the parcel_apn table
-    upload_for_parcel_apn(DB_CONNECTION_STRING)
+    def __init__(self, directory, county=DEFAULT_COUNTY):
+        self.directory = directory
+        self.county = county
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
 
-    # Upload the address data and associate with parcels by APN
-    upload_for_parcel_address(DB_CONNECTION_STRING, CLEANED_ADDRESS_GEOJSON_FILE)
+    def _path(self, name):
+        return os.path.join(self.directory, name)
 
-    # Run tests
-    run_tests(DB_CONNECTION_STRING)
+    def key(self, stage, config, inputs=(), upstream_keys=()):
+        settings = {name: value for name, value in config.items() if name not in STAGE_CACHE_IGNORED_CONFIG}
+        return content_hash(stage, code_version(), settings, [file_digest(path) for path in inputs], list(upstream_keys))
+
+    def _database_state(self):
+        try:
+            with open(self._path('database_state.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def hit(self, key, artifacts=(), db_connection_string=None):
+        """True if the stage with this key completed before and its outputs are still in place."""
+        try:
+            with open(self._path(f"{key}.json"), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if db_connection_string is not None:
+            state = self._database_state()
+            if state is None or state['fingerprint'] != database_fingerprint(db_connection_string, self.county):
+                return False
+
+        for path, artifact in zip(artifacts, entry['artifacts']):
+            if os.path.exists(path) and file_digest(path) == artifact['digest']:
+                continue
+            if not os.path.exists(self._path(artifact['file'])):
+                return False
+            shutil.copyfile(self._path(artifact['file']), path)
+        return True
+
+    def store(self, key, stage, artifacts=(), db_connection_string=None):
+        """Record a completed stage, its file outputs and (for database stages) the database it left."""
+        cached_artifacts = []
+        for path in artifacts:
+            cached_file = f"{key}-{os.path.basename(path)}"
+            shutil.copyfile(path, self._path(cached_file))
+            cached_artifacts.append({'file': cached_file, 'digest': file_digest(path)})
+
+        with self._lock:
+            if db_connection_string is not None:
+                with open(self._path('database_state.json'), 'w') as f:
+                    json.dump({'stage': stage, 'key': key,
+                               'fingerprint': database_fingerprint(db_connection_string, self.county)}, f)
+            with open(self._path(f"{key}.json"), 'w') as f:
+                json.dump({'stage': stage, 'key': key, 'created_at': time.time(), 'artifacts': cached_artifacts}, f)
+
+    def evict(self, max_age_seconds, max_bytes):
+        """Drop entries older than max_age_seconds, then the oldest until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name == 'database_state.json':
+                continue
+            try:
+                with open(self._path(name), 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            files = [name] + [artifact['file'] for artifact in entry['artifacts']
+                              if os.path.exists(self._path(artifact['file']))]
+            size = sum(os.path.getsize(self._path(file_name)) for file_name in files)
+            entries.append((entry['created_at'], size, files))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        evicted = 0
+        for created_at, size, files in entries:
+            if now - created_at <= max_age_seconds and total <= max_bytes:
+                break
+            for file_name in files:
+                os.remove(self._path(file_name))
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} stage cache entries ({total / 2**20:.1f} MB left).")
+
+def pipeline_stages(config, db_connection_string, county=COUNTIES[0], stage_cache=None):
+    """One county's pipeline as a stage graph for run_stage_graph.
+
+    The parcel branch (download, clean, load, repair) and the address branch
+    (download, clean and deduplicate into a spool file) run side by side. They
+    join at the address load, which needs the loaded parcels (and the parcel
+    index, for spatial assignment) as well as the cleaned addresses. With a
+    stage_cache, every stage after the downloads is skipped when its inputs
+    are unchanged since a previous run. In shadow mode the loads go to shadow
+    tables, which are indexed, validated and then swapped in for the county's
+    partitions; those stages always run, since the swap replaces what an
+    earlier run left. The county's files go in a directory of its own.
+    """
+    county_name = county['name']
+    output_dir = os.path.join(config['output_dir'], county_name)
+    parcel_geojson_file = os.path.join(output_dir, PARCEL_GEOJSON_FILENAME)
+    address_geojson_file = os.path.join(output_dir, ADDRESS_GEOJSON_FILENAME)
+    address_spool_file = os.path.join(output_dir, CLEANED_ADDRESS_SPOOL_FILENAME)
+    debug_artifacts = config['write_debug_artifacts']
+    binary_artifacts = config['artifact_format'] == 'binary'
+    repair_locally = config['repair_geometries_locally']
+    incremental = config['sync_mode'] == 'incremental'
+    shadow = config['sync_mode'] == 'shadow'
+    table_suffix = shadow_table_suffix(county_name) if shadow else ''
+    writers = config['load_writers']
+    precision_grid = config['precision_grid_degrees']
+    cache_settings = {name: value for name, value in config.items() if name not in STAGE_CACHE_IGNORED_CONFIG}
+    http_cache = None
+    if config['http_cache'] != 'off':
+        http_cache = EsriHttpCache(config['http_cache_dir'] or os.path.join(config['output_dir'], HTTP_CACHE_DIRNAME),
+                                   config['http_cache'], config['http_cache_max_age_hours'])
+    parcel_index = ParcelIndex() if config['assign_addresses_spatially'] else None
+    parcel_index_ready = threading.Event()
+    stage_keys = {}
+    skipped_stages = set()
+
+    def cached(name, func, inputs=(), upstream=(), artifacts=(), database=True):
+        """Wrap a stage so it is skipped when its cache key was recorded by an earlier run.
+
+        A stage is only skipped if the stages it builds on were skipped too: once
+        one of them has run again, the database no longer holds what this stage
+        left behind last time.
+        """
+        if stage_cache is None or (shadow and database):
+            return func
+
+        def run():
+            key = stage_cache.key(name, dict(config, county=county), inputs, [stage_keys[stage] for stage in upstream])
+            stage_keys[name] = key
+            database_dsn = db_connection_string if database else None
+            if all(stage in skipped_stages for stage in upstream) and stage_cache.hit(key, artifacts, database_dsn):
+                print(f"Stage '{name}' is unchanged since an earlier run; skipping it.")
+                skipped_stages.add(name)
+                return None
+            result = func()
+            stage_cache.store(key, name, artifacts, database_dsn)
+            return result
+        return run
+
+    def download_parcels():
+        download_layer_sharded(county['parcel_layer_url'], parcel_geojson_file, max_workers=config['download_workers'],
+                               http_cache=http_cache)
+
+    def download_addresses():
+        download_layer_sharded(county['address_layer_url'], address_geojson_file, max_workers=config['download_workers'],
+                               http_cache=http_cache)
+
+    def parcel_layer():
+        return county_features(iter_features(parcel_geojson_file), county, 'parcel')
+
+    def cleaned_parcels():
+        # Cleaning is lazy, so it is timed as part of the stage that loads the parcels
+        parcel_features = clean_apn_features(parcel_layer(), config['clean_workers'])
+        if parcel_index is not None:
+            parcel_features = index_parcel_features(parcel_features, parcel_index)
+        if debug_artifacts and binary_artifacts:
+            parcel_features = tee_artifact(parcel_features, os.path.join(output_dir, STANDARDIZED_PARCEL_ARTIFACT_FILENAME),
+                                           PARCEL_ARTIFACT_COLUMNS)
+        elif debug_artifacts:
+            parcel_features = tee_geojson(parcel_features, os.path.join(output_dir, STANDARDIZED_PARCEL_GEOJSON_FILENAME))
+        return pipeline_metrics.counted(parcel_features)
+
+    def load_parcels():
+        if incremental:
+            sync_parcels_incremental(cleaned_parcels(), db_connection_string, repair_locally, precision_grid, county_name)
+        elif shadow:
+            load_parcel_features_sharded(cleaned_parcels(), db_connection_string, writers, repair_locally,
+                                         precision_grid, county_name)
+        else:
+            load_parcel_features(cleaned_parcels(), db_connection_string, repair_locally, precision_grid, county_name,
+                                 config['load_batch_size'], parcel_geojson_file,
+                                 load_source_digest([parcel_geojson_file], cache_settings, county))
+        parcel_index_ready.set()
+
+    def clean_addresses():
+        # Orphans are kept for spatial assignment, which has to wait for the parcel index
+        address_features = clean_address_features(county_features(iter_features(address_geojson_file), county, 'address'),
+                                                  config['clean_workers'], keep_orphans=parcel_index is not None)
+        write_ndjson(pipeline_metrics.counted(address_features), address_spool_file)
+
+    def cleaned_addresses():
+        address_features = iter_features(address_spool_file)
+        if parcel_index is not None:
+            if not parcel_index_ready.is_set():
+                # The parcel load was skipped as unchanged, so index the parcels from the layer file
+                for _ in index_parcel_features(clean_apn_features(parcel_layer(), config['clean_workers']),
+                                               parcel_index):
+                    pass
+                parcel_index_ready.set()
+            address_features = assign_address_parcels(address_features, parcel_index)
+        if debug_artifacts and binary_artifacts:
+            address_features = tee_artifact(address_features, os.path.join(output_dir, CLEANED_ADDRESS_ARTIFACT_FILENAME),
+                                            ADDRESS_ARTIFACT_COLUMNS)
+        elif debug_artifacts:
+            address_features = tee_geojson(address_features, os.path.join(output_dir, CLEANED_ADDRESS_GEOJSON_FILENAME))
+        return pipeline_metrics.counted(address_features)
+
+    def load_addresses():
+        if incremental:
+            sync_addresses_incremental(cleaned_addresses(), db_connection_string, county_name)
+        elif shadow:
+            load_address_features_sharded(cleaned_addresses(), db_connection_string, writers, county_name)
+        else:
+            # Spatial assignment reads the parcel layer too
+            load_address_features(cleaned_addresses(), db_connection_string, county_name, config['load_batch_size'],
+                                  address_spool_file,
+                                  load_source_digest([address_spool_file, parcel_geojson_file], cache_settings, county))
+
+    def repair_geometries():
+        # Correct or drop invalid geometries in the parcel table, then check for remaining issues
+        correct_or_drop_invalid_geometries(db_connection_string, table_suffix, county_name)
+        check_geometry_issues(db_connection_string, table_suffix, county_name)
+        if incremental:
+            forget_dropped_parcel_hashes(db_connection_string, county_name)
+
+    # In incremental mode only what changed since the previous run is applied
+    parcel_stage = 'sync_parcels' if incremental else 'load_parcels'
+    address_stage = 'sync_addresses' if incremental else 'load_addresses'
+    stages = {
+        'create_tables': (lambda: create_tables(db_connection_string, county_name), ()),
+        'download_parcels': (download_parcels, ()),
+        'download_addresses': (download_addresses, ()),
+        'clean_addresses': (cached('clean_addresses', clean_addresses, inputs=[address_geojson_file],
+                                   artifacts=[address_spool_file], database=False), ('download_addresses',)),
+        parcel_stage: (cached(parcel_stage, load_parcels, inputs=[parcel_geojson_file]),
+                       ('create_shadow_tables' if shadow else 'create_tables', 'download_parcels')),
+        'repair_geometries': (cached('repair_geometries', repair_geometries, upstream=[parcel_stage]), (parcel_stage,)),
+    }
+    if shadow:
+        stages['create_shadow_tables'] = (lambda: create_shadow_tables(db_connection_string, county_name),
+                                          ('create_tables',))
+    parcels_ready = 'repair_geometries'
+    if not incremental:
+        stages['load_parcel_apns'] = (cached('load_parcel_apns',
+                                             lambda: upload_for_parcel_apn(db_connection_string, table_suffix, county_name),
+                                             upstream=['repair_geometries']), ('repair_geometries',))
+        parcels_ready = 'load_parcel_apns'
+
+    stages.update({
+        # Upload the address data and associate with parcels by APN
+        address_stage: (cached(address_stage, load_addresses, upstream=[parcels_ready, 'clean_addresses']),
+                        (parcels_ready, 'clean_addresses')),
+    })
+    tables_ready = address_stage
+    if shadow:
+        # Index and validate the shadow tables, then swap them in for the live ones
+        stages.update({
+            'build_shadow_indexes': (lambda: build_shadow_indexes(db_connection_string, writers, county_name),
+                                     (address_stage,)),
+            'validate_shadow': (lambda: validate_shadow_tables(db_connection_string, county=county_name),
+                                ('build_shadow_indexes',)),
+            'swap_tables': (lambda: swap_shadow_tables(db_connection_string, county_name), ('validate_shadow',)),
+        })
+        tables_ready = 'swap_tables'
+
+    stages.update({
+        # Build indexes now that the data is loaded, and refresh statistics
+        'create_indexes': (cached('create_indexes', lambda: create_indexes(db_connection_string, county_name),
+                                  upstream=[tables_ready]), (tables_ready,)),
+        'validate': (cached('validate', lambda: run_tests(db_connection_string, county_name),
+                            upstream=['create_indexes']), ('create_indexes',)),
+        # Tell lookup caches (parcel_lookup.py) that the tables may have changed
+        'notify_load_finished': (lambda: notify_load_finished(db_connection_string, f"{county_name}:{config['sync_mode']}"),
+                                 ('create_indexes',)),
+    })
+    return stages
+
+def run_county(config, county):
+    """Run the pipeline for one county."""
+    db_connection_string = connection_string(config)
+    output_dir = os.path.join(config['output_dir'], county['name'])
+    os.makedirs(output_dir, exist_ok=True)
+
+    stage_cache = StageCache(os.path.join(output_dir, STAGE_CACHE_DIRNAME), county['name']) if config['stage_cache'] else None
+    try:
+        run_stage_graph(pipeline_stages(config, db_connection_string, county, stage_cache))
+    finally:
+        if stage_cache is not None:
+            stage_cache.evict(config['stage_cache_max_age_days'] * 86400, config['stage_cache_max_mb'] * 2**20)
+
+def run_county_process(config, county):
+    """Run one county in a worker process and return its stage metrics, named '<county>/<stage>'."""
+    logging.basicConfig(level=logging.INFO)
+    pipeline_metrics.configure(enabled=bool(config['metrics_file']), explain=config['explain_queries'])
+    try:
+        run_county(config, county)
+    finally:
+        close_connection_pools()
+    return [dict(record, stage=f"{county['name']}/{record['stage']}") for record in pipeline_metrics.stages]
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    config = load_config(argv)
+    counties = load_counties(config)
+    pipeline_metrics.configure(enabled=bool(config['metrics_file']), explain=config['explain_queries'])
+
+    # Create the output directory and the database if they don't exist
+    os.makedirs(config['output_dir'], exist_ok=True)
+    ensure_database(config)
+
+    db_connection_string = connection_string(config)
+    try:
+        if len(counties) == 1:
+            run_county(config, counties[0])
+            analyze_tables(db_connection_string)
+        else:
+            # Every county's partitions, and the (unbuilt) indexes on the partitioned tables, exist before
+            # any county starts, so each county indexes only its own partitions once it has loaded them
+            for county in counties:
+                create_tables(db_connection_string, county['name'])
+            create_parent_indexes(db_connection_string)
+
+            # Each county runs its own stage graph in its own process and loads its own partitions
+            workers = min(config['county_workers'] or os.cpu_count() or 1, len(counties))
+            failed = []
+            with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_PROCESS_CONTEXT) as executor:
+                futures = {executor.submit(run_county_process, config, county): county['name'] for county in counties}
+                for future in as_completed(futures):
+                    try:
+                        pipeline_metrics.stages.extend(future.result())
+                        print(f"County {futures[future]} finished.")
+                    except Exception as error:
+                        logger.error(f"County {futures[future]} failed: {error}")
+                        failed.append(futures[future])
+            analyze_tables(db_connection_string)
+            if failed:
+                raise RuntimeError(f"The pipeline failed for {', '.join(sorted(failed))}; the other counties finished.")
+    finally:
+        close_connection_pools()
+        if config['metrics_file']:
+            pipeline_metrics.write(config['metrics_file'], config['metrics_format'])
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
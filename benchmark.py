@@ -0,0 +1,365 @@
+"""Benchmark the SymbiumTakeHome pipeline on a deterministic synthetic county.
+
+Generates parcel and address FeatureCollections shaped like the El Dorado
+layers (APN formats, address components, duplicates, broken polygons and
+orphan addresses), times each pipeline stage, and writes the timings as JSON
+so runs can be compared between commits. Stages that need a database run
+against a local PostGIS instance configured with the same flags and
+SYMBIUM_* variables as the pipeline; pass --no-db to time only the file stages.
+After the load, concurrent parcel_lookup queries are timed and their p50/p99
+latencies recorded. With --throughput, address cleaning is also timed at
+each given worker count, as features per second and speedup over the first.
+
+    python benchmark.py --parcels 100000 --db-name symbium_benchmark
+    python benchmark.py --parcels 100000 --compare benchmark_results/<commit>-100000.json
+    python benchmark.py --parcels 100000 --no-db --throughput 1,2,4
+"""
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import SymbiumTakeHome as pipeline
+import parcel_lookup
+
+# Centre of the synthetic county and the size of one parcel cell, in degrees (about 80 m)
+ORIGIN_LON = -120.8
+ORIGIN_LAT = 38.7
+PARCEL_CELL_DEGREES = 0.0009
+
+# Share of parcels and addresses given each defect the pipeline has to handle
+DUPLICATE_PARCEL_RATE = 0.005
+BROKEN_POLYGON_RATE = 0.01
+NULL_GEOMETRY_RATE = 0.002
+ADDRESSES_PER_PARCEL = 1.1
+DUPLICATE_ADDRESS_RATE = 0.02
+ORPHAN_ADDRESS_RATE = 0.01
+INCOMPLETE_ADDRESS_RATE = 0.005
+
+APN_FORMATS = ['{book:03d}-{page:03d}-{parcel:02d}', '{book:03d}{page:03d}{parcel:02d}',
+               '{book:03d} {page:03d} {parcel:02d}', '{book:03d}-{page:03d}-{parcel:02d}-000']
+STREET_NAMES = ['Green Valley', 'Pleasant Valley', 'Missouri Flat', 'Cameron Park', 'Mother Lode', 'Bass Lake',
+                'Sly Park', 'Pony Express', 'Gold Hill', 'Salmon Falls', 'Silva Valley', 'Mosquito',
+                'Deer Valley', 'Latrobe', 'Bucks Bar', 'Newtown', 'Cold Springs', 'Ponderosa']
+STREET_SUFFIXES = ['Rd', 'RD', 'Road', 'Dr', 'Ln', 'Ct', 'Way', 'Cir', 'St', 'Trl']
+PREFIXES = ['', '', '', '', 'N', 'S', 'E', 'W']
+
+# Uncached lookups timed after the load, spread over this many threads
+LOOKUP_COUNT = 4000
+LOOKUP_THREADS = 8
+
+DEFAULT_RESULTS_DIR = 'benchmark_results'
+
+def parcel_apn(index):
+    """APN of parcel index, in one of the layer's formats (the same one in both layers)."""
+    apn_format = APN_FORMATS[(index * 7919) % len(APN_FORMATS)]
+    return apn_format.format(book=1 + index // 10000, page=(index // 100) % 100, parcel=index % 100)
+
+def parcel_origin(index, width):
+    """South-west corner of the grid cell of parcel index."""
+    return (ORIGIN_LON + (index % width) * PARCEL_CELL_DEGREES,
+            ORIGIN_LAT + (index // width) * PARCEL_CELL_DEGREES)
+
+def parcel_geometry(rng, lon, lat):
+    """A slightly irregular quadrilateral filling most of its grid cell."""
+    size = PARCEL_CELL_DEGREES
+    ring = [[lon + rng.uniform(0, 0.05) * size, lat + rng.uniform(0, 0.05) * size],
+            [lon + rng.uniform(0.95, 1.0) * size, lat + rng.uniform(0, 0.05) * size],
+            [lon + rng.uniform(0.95, 1.0) * size, lat + rng.uniform(0.95, 1.0) * size],
+            [lon + rng.uniform(0, 0.05) * size, lat + rng.uniform(0.95, 1.0) * size]]
+    return {'type': 'Polygon', 'coordinates': [ring + [ring[0]]]}
+
+def broken_geometry(lon, lat):
+    """A self-intersecting bowtie, invalid until repaired."""
+    size = PARCEL_CELL_DEGREES
+    ring = [[lon, lat], [lon + size, lat + size], [lon + size, lat], [lon, lat + size], [lon, lat]]
+    return {'type': 'Polygon', 'coordinates': [ring]}
+
+def generate_parcels(count, seed=0):
+    """Yield count synthetic parcel features (plus a few duplicates), deterministically for a seed."""
+    rng = random.Random(seed)
+    width = math.ceil(math.sqrt(count))
+    for index in range(count):
+        lon, lat = parcel_origin(index, width)
+        apn = parcel_apn(index)
+        draw = rng.random()
+        if draw < NULL_GEOMETRY_RATE:
+            geometry = None
+        elif draw < NULL_GEOMETRY_RATE + BROKEN_POLYGON_RATE:
+            geometry = broken_geometry(lon, lat)
+        else:
+            geometry = parcel_geometry(rng, lon, lat)
+
+        feature = {'type': 'Feature', 'properties': {'OBJECTID': index + 1, 'PRCL_ID': apn}, 'geometry': geometry}
+        yield feature
+        if rng.random() < DUPLICATE_PARCEL_RATE:
+            yield feature
+
+def address_properties(rng, apn):
+    return {
+        'PRCL_ID': apn,
+        'ADDR_NBR': str(rng.randint(1, 9999)),
+        'ADDR_STR_NBR': None,
+        'PREFIX': rng.choice(PREFIXES),
+        'NAME_ROOT': rng.choice(STREET_NAMES),
+        'SUFFIX': rng.choice(STREET_SUFFIXES),
+        'ADDR_UNIT_TYPE': None,
+        'ADDR_UNIT_NBR': str(rng.randint(1, 20)) if rng.random() < 0.05 else None,
+        'ADDR_FLOOR': None,
+    }
+
+def generate_addresses(parcel_count, seed=0):
+    """Yield synthetic address points for the parcels of generate_parcels(parcel_count, seed).
+
+    Most points fall inside their parcel. Some repeat the previous address
+    with float noise in the coordinates, some are orphans (no APN or an
+    unknown one), and some lack a street name.
+    """
+    rng = random.Random(seed + 1)
+    width = math.ceil(math.sqrt(parcel_count))
+    object_id = 0
+    previous = None
+    for _ in range(int(parcel_count * ADDRESSES_PER_PARCEL)):
+        index = rng.randrange(parcel_count)
+        lon, lat = parcel_origin(index, width)
+        point = [lon + rng.uniform(0.2, 0.8) * PARCEL_CELL_DEGREES, lat + rng.uniform(0.2, 0.8) * PARCEL_CELL_DEGREES]
+        properties = address_properties(rng, parcel_apn(index))
+
+        draw = rng.random()
+        if previous is not None and draw < DUPLICATE_ADDRESS_RATE:
+            properties = dict(previous['properties'])
+            point = [c + rng.uniform(-1e-9, 1e-9) for c in previous['geometry']['coordinates']]
+        elif draw < DUPLICATE_ADDRESS_RATE + ORPHAN_ADDRESS_RATE:
+            properties['PRCL_ID'] = rng.choice(['', None, '999-999-99'])
+        elif draw < DUPLICATE_ADDRESS_RATE + ORPHAN_ADDRESS_RATE + INCOMPLETE_ADDRESS_RATE:
+            properties['NAME_ROOT'] = ''
+
+        object_id += 1
+        properties['OBJECTID'] = object_id
+        previous = {'type': 'Feature', 'properties': properties, 'geometry': {'type': 'Point', 'coordinates': point}}
+        yield previous
+
+def generate_dataset(output_dir, parcel_count, seed=0):
+    """Write the synthetic parcel and address layers as GeoJSON FeatureCollections and return their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    parcel_path = os.path.join(output_dir, f'synthetic_parcels_{parcel_count}_{seed}.geojson')
+    address_path = os.path.join(output_dir, f'synthetic_addresses_{parcel_count}_{seed}.geojson')
+    if not os.path.exists(parcel_path):
+        pipeline.write_geojson(generate_parcels(parcel_count, seed), parcel_path)
+    if not os.path.exists(address_path):
+        pipeline.write_geojson(generate_addresses(parcel_count, seed), address_path)
+    return parcel_path, address_path
+
+def reset_database(db_connection_string):
+    """Drop the pipeline's tables so every benchmark run starts from an empty database."""
+    conn = pipeline.get_connection(db_connection_string)
+    cursor = conn.cursor()
+    cursor.execute("""
+        DROP TABLE IF EXISTS parcel_address, parcel_apn, parcel, feature_hash, load_journal, schema_migrations,
+                             parcel_stage, parcel_address_stage CASCADE;
+    """)
+    conn.commit()
+    cursor.close()
+    pipeline.release_connection(conn)
+
+def time_stage(results, name, func, *args, verbose=False):
+    """Run one stage, record its wall time, and keep its console output out of the way unless verbose."""
+    print(f"Running {name}...", file=sys.stderr)
+    start = time.perf_counter()
+    if verbose:
+        func(*args)
+    else:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            func(*args)
+    seconds = time.perf_counter() - start
+    results.append({'stage': name, 'seconds': round(seconds, 4)})
+    print(f"  {name}: {seconds:.2f} s", file=sys.stderr)
+
+def time_cleaning_throughput(address_path, work_dir, worker_counts, verbose=False):
+    """Time address cleaning at each worker count; return features per second and speedup over the first count."""
+    feature_count = sum(1 for _ in pipeline.iter_features(address_path))
+    output_path = os.path.join(work_dir, 'throughput_addresses.geojson')
+    runs = []
+    for workers in worker_counts:
+        stages = []
+        time_stage(stages, f'clean_address_dataset ({workers} workers)', pipeline.clean_address_dataset,
+                   address_path, output_path, workers, verbose=verbose)
+        seconds = stages[0]['seconds']
+        runs.append({'workers': workers, 'seconds': seconds,
+                     'features_per_second': round(feature_count / seconds),
+                     'speedup': round(runs[0]['seconds'] / seconds, 2) if runs else 1.0})
+        print(f"  {runs[-1]['features_per_second']} features/s, {runs[-1]['speedup']:.2f}x", file=sys.stderr)
+    os.remove(output_path)
+    return runs
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def time_lookups(db_connection_string, parcel_count, seed=0, count=LOOKUP_COUNT, threads=LOOKUP_THREADS):
+    """Time APN and point lookups from several threads at once and return latency percentiles in ms.
+
+    The result cache is disabled, so every lookup is a database round trip.
+    """
+    print("Running lookups...", file=sys.stderr)
+    rng = random.Random(seed + 2)
+    width = math.ceil(math.sqrt(parcel_count))
+    requests = []
+    for _ in range(count):
+        index = rng.randrange(parcel_count)
+        if rng.random() < 0.5:
+            requests.append(('apn', parcel_apn(index)))
+        else:
+            lon, lat = parcel_origin(index, width)
+            requests.append(('point', (lon + 0.5 * PARCEL_CELL_DEGREES, lat + 0.5 * PARCEL_CELL_DEGREES)))
+
+    latencies = {'apn': [], 'point': []}
+    with parcel_lookup.ParcelLookup(db_connection_string, cache_size=0, listen=False) as lookup:
+        lookup.parcel_by_apn(parcel_apn(0))  # Prepare the statements outside the timings
+
+        def worker(share):
+            for kind, key in share:
+                start = time.perf_counter()
+                if kind == 'apn':
+                    lookup.parcel_by_apn(key)
+                else:
+                    lookup.parcels_at_point(*key)
+                latencies[kind].append((time.perf_counter() - start) * 1000)
+
+        workers = [threading.Thread(target=worker, args=(requests[i::threads],)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    results = {}
+    for kind, values in latencies.items():
+        values.sort()
+        if values:
+            results[kind] = {'count': len(values), 'p50_ms': round(percentile(values, 0.5), 3),
+                             'p99_ms': round(percentile(values, 0.99), 3)}
+            print(f"  {kind} lookups: p50 {results[kind]['p50_ms']:.2f} ms, p99 {results[kind]['p99_ms']:.2f} ms",
+                  file=sys.stderr)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(parcel_count, seed, work_dir, db_connection_string=None, workers=1, verbose=False,
+                  throughput_workers=()):
+    """Generate the dataset, time every stage, and return the results document."""
+    stages = []
+    lookups = None
+    generation_start = time.perf_counter()
+    parcel_path, address_path = generate_dataset(work_dir, parcel_count, seed)
+    generation_seconds = time.perf_counter() - generation_start
+
+    cleaned_parcels = os.path.join(work_dir, 'cleaned_parcels.geojson')
+    cleaned_addresses = os.path.join(work_dir, 'cleaned_addresses.geojson')
+    time_stage(stages, 'clean_apn_dataset', pipeline.clean_apn_dataset, parcel_path, cleaned_parcels, workers,
+               verbose=verbose)
+    time_stage(stages, 'clean_address_dataset', pipeline.clean_address_dataset, address_path, cleaned_addresses, workers,
+               verbose=verbose)
+    time_stage(stages, 'verify_cleaned_apns', pipeline.verify_cleaned_apns, cleaned_parcels, verbose=verbose)
+    time_stage(stages, 'verify_cleaned_data', pipeline.verify_cleaned_data, cleaned_addresses, verbose=verbose)
+    throughput = None
+    if throughput_workers:
+        throughput = time_cleaning_throughput(address_path, work_dir, throughput_workers, verbose)
+
+    if db_connection_string:
+        reset_database(db_connection_string)
+        time_stage(stages, 'create_tables', pipeline.create_tables, db_connection_string, verbose=verbose)
+        time_stage(stages, 'upload_for_parcel', pipeline.upload_for_parcel, cleaned_parcels, db_connection_string,
+                   verbose=verbose)
+        time_stage(stages, 'correct_or_drop_invalid_geometries', pipeline.correct_or_drop_invalid_geometries,
+                   db_connection_string, verbose=verbose)
+        time_stage(stages, 'check_geometry_issues', pipeline.check_geometry_issues, db_connection_string,
+                   verbose=verbose)
+        time_stage(stages, 'upload_for_parcel_apn', pipeline.upload_for_parcel_apn, db_connection_string,
+                   verbose=verbose)
+        time_stage(stages, 'upload_for_parcel_address', pipeline.upload_for_parcel_address, db_connection_string,
+                   cleaned_addresses, verbose=verbose)
+        time_stage(stages, 'create_indexes', pipeline.create_indexes, db_connection_string, verbose=verbose)
+        time_stage(stages, 'run_tests', pipeline.run_tests, db_connection_string, verbose=verbose)
+        lookups = time_lookups(db_connection_string, parcel_count, seed)
+
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parcels': parcel_count,
+        'seed': seed,
+        'workers': workers,
+        'database': bool(db_connection_string),
+        'generation_seconds': round(generation_seconds, 4),
+        'stages': stages,
+        'lookups': lookups,
+        'clean_throughput': throughput,
+        'total_seconds': round(sum(stage['seconds'] for stage in stages), 4),
+    }
+
+def compare_results(baseline, current):
+    """Print the per-stage change from a baseline results document."""
+    baseline_seconds = {stage['stage']: stage['seconds'] for stage in baseline['stages']}
+    print(f"{'stage':40} {'baseline':>10} {'current':>10} {'change':>8}")
+    for stage in current['stages']:
+        before = baseline_seconds.get(stage['stage'])
+        if before is None:
+            print(f"{stage['stage']:40} {'-':>10} {stage['seconds']:>10.2f} {'':>8}")
+            continue
+        change = (stage['seconds'] - before) / before * 100 if before else 0.0
+        print(f"{stage['stage']:40} {before:>10.2f} {stage['seconds']:>10.2f} {change:>+7.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     epilog="Other flags (--db-host, --db-name, ...) configure the database "
+                                            "as for SymbiumTakeHome.py.")
+    parser.add_argument('--parcels', type=int, default=10000, help="number of synthetic parcels (default: 10000)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=os.path.join(DEFAULT_RESULTS_DIR, 'data'),
+                        help="where the synthetic layers and cleaned files are written")
+    parser.add_argument('--results', help="results file (default: benchmark_results/<commit>-<parcels>.json)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    parser.add_argument('--workers', type=int, default=1, help="cleaning workers")
+    parser.add_argument('--throughput', type=lambda value: [int(count) for count in value.split(',')],
+                        default=(), metavar='WORKERS,...',
+                        help="also time address cleaning at each of these worker counts, such as 1,2,4")
+    parser.add_argument('--no-db', action='store_true', help="skip the stages that need PostGIS")
+    parser.add_argument('--verbose', action='store_true', help="show each stage's own output")
+    args, pipeline_args = parser.parse_known_args(argv)
+
+    db_connection_string = None
+    if not args.no_db:
+        config = pipeline.load_config(pipeline_args)
+        pipeline.ensure_database(config)
+        db_connection_string = pipeline.connection_string(config)
+
+    try:
+        results = run_benchmark(args.parcels, args.seed, args.work_dir, db_connection_string, args.workers, args.verbose,
+                                args.throughput)
+    finally:
+        pipeline.close_connection_pools()
+
+    results_path = args.results or os.path.join(DEFAULT_RESULTS_DIR, f"{results['commit'] or 'unknown'}-{args.parcels}.json")
+    os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {results_path} (total {results['total_seconds']:.2f} s)")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare_results(json.load(f), results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""A local stand-in for the county ArcGIS servers that serves recorded responses.
+
+Record the layers once with the pipeline's HTTP cache, then serve them,
+mapping each host the pipeline will call to the server it was recorded from:
+
+    python SymbiumTakeHome.py --http-cache record
+    python esri_replay_server.py --cache-dir output/.http_cache --port 8765 \\
+        --host-map localhost:8765=see-eldorado.edcgov.us
+
+Requests are matched by method, host, path and arguments (esri_request_key).
+The host a request names (its Host header) is looked up in the host map and
+replaced by the recorded host, so a county pointed at http://localhost:8765
+with the same layer paths gets back exactly what was recorded, for example
+in a counties_file:
+
+    {"name": "el_dorado",
+     "parcel_layer_url": "http://localhost:8765/arcgis/rest/services/Symbium/SymbiumServices/MapServer/1",
+     "address_layer_url": "http://localhost:8765/arcgis/rest/services/Symbium/SymbiumServices/MapServer/0"}
+
+Counties recorded from different servers need different local hosts, such
+as one port per county. A request for an unmapped host, or one that was
+never recorded, gets an ESRI-style error, which the pipeline reports as a
+failed download.
+"""
+import argparse
+import json
+import logging
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import SymbiumTakeHome as pipeline
+
+DEFAULT_PORT = 8765
+
+logger = logging.getLogger(__name__)
+
+def parse_host_map(entries):
+    """Turn LOCAL=UPSTREAM entries into {local host: recorded host}, both lowercased."""
+    host_map = {}
+    for entry in entries:
+        local, separator, upstream = entry.partition('=')
+        if not separator or not local.strip() or not upstream.strip():
+            raise ValueError(f"Host mapping {entry!r} is not of the form LOCAL=UPSTREAM")
+        host_map[local.strip().lower()] = upstream.strip().lower()
+    return host_map
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answer GET and POST requests from the HTTP cache and host map given to the server."""
+
+    def do_GET(self):
+        self._replay(parse_qsl(urlsplit(self.path).query, keep_blank_values=True))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        self._replay(parse_qsl(urlsplit(self.path).query, keep_blank_values=True)
+                     + parse_qsl(body, keep_blank_values=True))
+
+    def _replay(self, args):
+        path = urlsplit(self.path).path
+        host = (self.headers.get('Host') or '').lower()
+        upstream = self.server.host_map.get(host)
+        entry = None
+        if upstream is None:
+            logger.warning(f"No host mapping for {host!r}: {self.command} {path}")
+            message = f"Host {host} is not mapped to a recorded server"
+        else:
+            key = pipeline.esri_request_key(self.command, f"//{upstream}{path}", dict(args))
+            entry = self.server.http_cache.lookup(key)
+            if entry is None:
+                logger.warning(f"Not recorded: {self.command} {upstream}{path} {dict(args)}")
+                message = "Request not recorded"
+        if entry is None:
+            body = json.dumps({'error': {'code': 404, 'message': message, 'details': [path]}})
+            content_type = 'application/json'
+        else:
+            body = entry['body']
+            content_type = entry['headers'].get('content-type', 'application/json')
+        encoded = body.encode('utf-8')
+        # ArcGIS reports errors in the body with a 200 status, so the replay does the same
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def make_server(cache_dir, host_map, host='localhost', port=DEFAULT_PORT):
+    """A replay server for cache_dir, mapping request hosts to recorded hosts through host_map."""
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.http_cache = pipeline.EsriHttpCache(cache_dir, mode='offline')
+    server.host_map = host_map
+    return server
+
+def serve(cache_dir, host_map, host='localhost', port=DEFAULT_PORT):
+    server = make_server(cache_dir, host_map, host, port)
+    for local, upstream in host_map.items():
+        logger.info(f"Replaying {upstream} from {cache_dir} as http://{local}")
+    logger.info(f"Listening on {host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serve recorded ESRI layer responses from the pipeline's HTTP cache.")
+    parser.add_argument('--cache-dir', default=os.path.join('output', pipeline.HTTP_CACHE_DIRNAME),
+                        help="HTTP cache directory (default: output/.http_cache)")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--host-map', action='append', required=True, metavar='LOCAL=UPSTREAM',
+                        help="serve the host UPSTREAM was recorded from to requests for LOCAL, "
+                             "as in localhost:8765=see-eldorado.edcgov.us (repeatable)")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.cache_dir):
+        parser.error(f"{args.cache_dir} is not a directory")
+    try:
+        host_map = parse_host_map(args.host_map)
+    except ValueError as error:
+        parser.error(str(error))
+    serve(args.cache_dir, host_map, args.host, args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""Low-latency lookups against the tables the SymbiumTakeHome pipeline loads.
+
+Three operations, each with a batch variant that answers many keys in one
+round trip:
+
+    lookup = ParcelLookup(db_connection_string)
+    lookup.parcel_by_apn('001-010-01')        # the APN is normalized with clean_apn; APNs are per county
+    lookup.parcels_at_point(-120.8, 38.7)     # parcels of any county containing the point, with their addresses
+    lookup.addresses_for_parcel(parcel_id)
+
+Queries run as server-side prepared statements on connections borrowed from
+the pipeline's connection pool. Results are kept in an LRU cache, which is
+cleared whenever a pipeline run finishes loading: the pipeline sends a NOTIFY
+on LOAD_NOTIFY_CHANNEL and a background listener picks it up. Returned
+dictionaries are shared with the cache, so treat them as read-only.
+
+    python parcel_lookup.py --apn 001-010-01 --point -120.8 38.7 [--county el_dorado]
+"""
+import argparse
+import collections
+import contextlib
+import json
+import logging
+import select
+import threading
+import uuid
+import weakref
+
+import psycopg2
+
+import SymbiumTakeHome as pipeline
+
+CACHE_SIZE = 100000  # Cached results (one per APN, point or parcel) per ParcelLookup
+GEOJSON_DECIMALS = 7  # Matches the default precision grid of 1e-7 degrees
+LISTEN_RECONNECT_SECONDS = 5
+
+# Server-side prepared statements as name: (parameter types, query). Each takes
+# arrays, so a single lookup and a batch lookup are the same round trip.
+PREPARED_STATEMENTS = {
+    'lookup_parcels_by_apn': ('text, text[]', f"""
+        SELECT p.apn, p.id::text, ST_AsGeoJSON(p.geom, {GEOJSON_DECIMALS})
+        FROM parcel p
+        WHERE p.county = $1 AND p.apn = ANY($2)
+    """),
+    'lookup_parcels_at_points': ('float8[], float8[]', f"""
+        SELECT q.i, p.county, p.id::text, p.apn, ST_AsGeoJSON(p.geom, {GEOJSON_DECIMALS}),
+               COALESCE((SELECT json_agg(json_build_object(
+                                     'id', pa.id, 'address', pa.address,
+                                     'geometry', ST_AsGeoJSON(pa.geom, {GEOJSON_DECIMALS})::json) ORDER BY pa.id)
+                         FROM parcel_address pa
+                         WHERE pa.county = p.county AND pa.parcel_id = p.id), '[]'::json)
+        FROM unnest($1, $2) WITH ORDINALITY AS q(lon, lat, i)
+        JOIN parcel p ON ST_Intersects(p.geom, ST_SetSRID(ST_MakePoint(q.lon, q.lat), 4326))
+        ORDER BY q.i, p.apn
+    """),
+    'lookup_addresses_for_parcels': ('uuid[]', f"""
+        SELECT pa.parcel_id::text, pa.id, pa.address, ST_AsGeoJSON(pa.geom, {GEOJSON_DECIMALS})
+        FROM parcel_address pa
+        WHERE pa.parcel_id = ANY($1)
+        ORDER BY pa.parcel_id, pa.id
+    """),
+}
+
+logger = logging.getLogger(__name__)
+
+# Pooled connections that already hold the prepared statements; they outlive any one ParcelLookup
+_prepared_connections = weakref.WeakSet()
+_prepared_connections_lock = threading.Lock()
+
+class LookupCache:
+    """A thread-safe LRU cache of lookup results.
+
+    Every clear() starts a new generation. A result fetched before a clear
+    is not stored after it, so a lookup racing a reload cannot cache stale rows.
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """Return {key: result} for the keys that are cached."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, results, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            for key, result in results.items():
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+def parcel_row(county, parcel_id, apn, geometry):
+    return {'county': county, 'id': parcel_id, 'apn': apn, 'geometry': json.loads(geometry) if geometry else None}
+
+def address_row(address_id, address, geometry):
+    return {'id': address_id, 'address': address, 'geometry': json.loads(geometry) if geometry else None}
+
+class ParcelLookup:
+    """Parcel and address lookups with prepared statements and a result cache.
+
+    Safe to share between threads. At most DB_POOL_MAX_CONNECTIONS lookups are
+    in flight at once; further callers wait for a connection instead of failing.
+    APN lookups are within county; point and parcel id lookups cover every county.
+    """
+
+    def __init__(self, db_connection_string, cache_size=CACHE_SIZE, listen=True, county=pipeline.DEFAULT_COUNTY):
+        self.db_connection_string = db_connection_string
+        self.county = county
+        self.cache = LookupCache(cache_size)
+        self._slots = threading.BoundedSemaphore(pipeline.DB_POOL_MAX_CONNECTIONS)
+        self._closed = threading.Event()
+        self._listener = None
+        if listen:
+            self._listener = threading.Thread(target=self._listen, name='parcel-lookup-listener', daemon=True)
+            self._listener.start()
+
+    def close(self):
+        """Stop listening for load notifications."""
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def parcel_by_apn(self, apn):
+        """The parcel with this APN as {'county', 'id', 'apn', 'geometry'}, or None."""
+        return self.parcels_by_apn([apn])[0]
+
+    def parcels_by_apn(self, apns):
+        """The parcel for each APN (or None), in the order given."""
+        keys = [('apn', self.county, pipeline.clean_apn(apn)) for apn in apns]
+
+        def fetch(cursor, missing):
+            cursor.execute("EXECUTE lookup_parcels_by_apn (%s, %s::text[]);", (self.county, [key[2] for key in missing]))
+            found = {('apn', self.county, apn): parcel_row(self.county, parcel_id, apn, geometry)
+                     for apn, parcel_id, geometry in cursor.fetchall()}
+            return {key: found.get(key) for key in missing}
+        return self._cached(keys, fetch)
+
+    def parcels_at_point(self, lon, lat):
+        """The parcels containing a point, each with its 'addresses'."""
+        return self.parcels_at_points([(lon, lat)])[0]
+
+    def parcels_at_points(self, points):
+        """The parcels containing each (lon, lat) point, in the order given."""
+        keys = [('point', float(lon), float(lat)) for lon, lat in points]
+
+        def fetch(cursor, missing):
+            cursor.execute("EXECUTE lookup_parcels_at_points (%s::float8[], %s::float8[]);",
+                           ([lon for _, lon, _ in missing], [lat for _, _, lat in missing]))
+            results = {key: [] for key in missing}
+            for index, county, parcel_id, apn, geometry, addresses in cursor.fetchall():
+                parcel = parcel_row(county, parcel_id, apn, geometry)
+                parcel['addresses'] = addresses
+                results[missing[index - 1]].append(parcel)
+            return results
+        return self._cached(keys, fetch)
+
+    def addresses_for_parcel(self, parcel_id):
+        """The addresses of a parcel as [{'id', 'address', 'geometry'}]."""
+        return self.addresses_for_parcels([parcel_id])[0]
+
+    def addresses_for_parcels(self, parcel_ids):
+        """The addresses of each parcel, in the order given.
+
+        Ids may be UUIDs or any string form of one (upper case, braced); they
+        are keyed in the canonical form the database returns.
+        """
+        keys = [('parcel_addresses', str(uuid.UUID(str(parcel_id)))) for parcel_id in parcel_ids]
+
+        def fetch(cursor, missing):
+            cursor.execute("EXECUTE lookup_addresses_for_parcels (%s::uuid[]);", ([key[1] for key in missing],))
+            results = {key: [] for key in missing}
+            for parcel_id, address_id, address, geometry in cursor.fetchall():
+                results[('parcel_addresses', parcel_id)].append(address_row(address_id, address, geometry))
+            return results
+        return self._cached(keys, fetch)
+
+    def _cached(self, keys, fetch):
+        """Answer keys from the cache, fetching all the misses in one round trip."""
+        results = self.cache.get_many(keys)
+        missing = list(dict.fromkeys(key for key in keys if key not in results))
+        if missing:
+            generation = self.cache.generation
+            with self._cursor() as cursor:
+                fetched = fetch(cursor, missing)
+            self.cache.put_many(fetched, generation)
+            results.update(fetched)
+        return [results[key] for key in keys]
+
+    @contextlib.contextmanager
+    def _cursor(self):
+        """A cursor on a pooled autocommit connection that holds the prepared statements.
+
+        Autocommit keeps each lookup to a single round trip, with no BEGIN or
+        ROLLBACK around it.
+        """
+        with self._slots:
+            conn = pipeline.get_connection(self.db_connection_string)
+            try:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                with _prepared_connections_lock:
+                    prepared = conn in _prepared_connections
+                if not prepared:
+                    for name, (parameter_types, query) in PREPARED_STATEMENTS.items():
+                        cursor.execute(f"PREPARE {name} ({parameter_types}) AS {query};")
+                    with _prepared_connections_lock:
+                        _prepared_connections.add(conn)
+                yield cursor
+                cursor.close()
+            finally:
+                pipeline.release_connection(conn)
+
+    def _listen(self):
+        """Clear the cache whenever a pipeline run announces that it finished loading."""
+        while not self._closed.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.db_connection_string)
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {pipeline.LOAD_NOTIFY_CHANNEL};")
+                # A load may have finished while we were not listening
+                self.cache.clear()
+                while not self._closed.is_set():
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        if conn.notifies:
+                            logger.info(f"Load finished ({conn.notifies[-1].payload}); clearing the lookup cache.")
+                            conn.notifies.clear()
+                            self.cache.clear()
+            except psycopg2.Error as error:
+                logger.warning(f"Lookup cache listener disconnected: {error}")
+                self._closed.wait(LISTEN_RECONNECT_SECONDS)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up parcels and addresses in the loaded database.",
+                                     epilog="Database settings are read as for SymbiumTakeHome.py.")
+    parser.add_argument('--apn', action='append', default=[], help="parcel APN (repeatable)")
+    parser.add_argument('--point', nargs=2, type=float, action='append', default=[], metavar=('LON', 'LAT'),
+                        help="point to find the parcels of (repeatable)")
+    parser.add_argument('--parcel-id', action='append', default=[], help="parcel id to list the addresses of (repeatable)")
+    parser.add_argument('--county', default=pipeline.DEFAULT_COUNTY, help="county the --apn values belong to")
+    args, pipeline_args = parser.parse_known_args(argv)
+
+    config = pipeline.load_config(pipeline_args)
+    try:
+        with ParcelLookup(pipeline.connection_string(config), listen=False, county=args.county) as lookup:
+            results = {
+                'parcels_by_apn': dict(zip(args.apn, lookup.parcels_by_apn(args.apn))),
+                'parcels_at_points': [{'point': point, 'parcels': parcels}
+                                      for point, parcels in zip(args.point, lookup.parcels_at_points(args.point))],
+                'addresses_for_parcels': dict(zip(args.parcel_id, lookup.addresses_for_parcels(args.parcel_id))),
+            }
+    finally:
+        pipeline.close_connection_pools()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+
+import psycopg2
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import SymbiumTakeHome as pipeline  # noqa: E402
+
+# Tests that need PostGIS run only when this points at a scratch database
+TEST_DSN_VARIABLE = 'SYMBIUM_TEST_DSN'
+
+@pytest.fixture
+def test_dsn():
+    dsn = os.environ.get(TEST_DSN_VARIABLE)
+    if not dsn:
+        pytest.skip(f"{TEST_DSN_VARIABLE} is not set")
+    return dsn
+
+class FakeInfo:
+    transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = -1
+
+    def execute(self, query, params=None):
+        self.conn.statements.append(query)
+        self.conn.params.append(params)
+        self.rows = next((list(rows) for fragment, rows in self.conn.results if fragment in query), [])
+        self.rowcount = len(self.rows)
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection, recording the statements sent on it.
+
+    results holds (query fragment, rows) pairs; a query containing the
+    fragment returns the rows.
+    """
+
+    def __init__(self, results=()):
+        self.closed = 0
+        self.autocommit = False
+        self.info = FakeInfo()
+        self.statements = []
+        self.params = []
+        self.results = list(results)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+class FakeConnections(list):
+    """The FakeConnections opened so far; results are given to each new one."""
+
+    def __init__(self):
+        super().__init__()
+        self.results = []
+
+@pytest.fixture
+def fake_connections(monkeypatch):
+    """Make psycopg2.connect hand out FakeConnections; yields the list of those opened."""
+    opened = FakeConnections()
+
+    def connect(*args, **kwargs):
+        opened.append(FakeConnection(opened.results))
+        return opened[-1]
+
+    monkeypatch.setattr(psycopg2, 'connect', connect)
+    yield opened
+    pipeline.close_connection_pools()
@@ -0,0 +1,116 @@
+import json
+
+import SymbiumTakeHome as pipeline
+
+def square(x, y, size=1.0):
+    return {'type': 'Polygon', 'coordinates': [[[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]]}
+
+def address(apn, number, street, point):
+    geometry = {'type': 'Point', 'coordinates': list(point)} if point else None
+    return {'type': 'Feature', 'geometry': geometry,
+            'properties': {'PRCL_ID': apn, 'ADDR_NBR': number, 'NAME_ROOT': street, 'SUFFIX': 'ST'}}
+
+PARCELS = {'A1': square(0, 0), 'B2': square(2, 0), 'C3': square(4, 0)}
+
+ADDRESSES = [
+    address('A1', '1', 'MAIN', (0.5, 0.5)),
+    address('A1', '1', 'MAIN', (0.5, 0.5)),      # Exact duplicate
+    address('B2', '1', 'MAIN', (2.5, 0.5)),      # Same address, another known APN: the first row wins
+    address('ZZ', '2', 'OAK', (9.0, 9.0)),       # Unknown APN outside any parcel
+    address('C3', '2', 'OAK', (4.5, 0.5)),       # Not blocked by the unknown-APN row before it
+    address('B2', '3', 'PINE', (2.5, 0.5)),
+    address('C3', '3', 'PINE', (4.5, 0.5)),      # Tie on address between two known parcels
+    address('', '4', 'ELM', (2.5, 0.5)),         # No APN
+    address('ZZ', '5', 'ASH', (7.0, 7.0)),       # Unknown APN, never associated
+    address('C3', '6', 'FIR', None),             # No point
+    address('A1', '7', 'BIRCH', (0.5, 0.5)),     # Already loaded
+]
+
+EXISTING = {'7 Birch Street'}
+
+def baseline_association(features, parcel_ids, existing):
+    """The original loader: per row, skip loaded addresses, otherwise insert joined to parcel_apn by APN."""
+    loaded = dict.fromkeys(existing)
+    inserted = []
+    for seq, feature in enumerate(features):
+        if not feature['geometry']:
+            continue
+        address = pipeline.canonical_address(feature['properties'])
+        apn = feature['properties'].get('PRCL_ID')
+        if not apn or not address or address in loaded:
+            continue
+        if apn in parcel_ids:
+            loaded[address] = parcel_ids[apn]
+            inserted.append((seq, address, apn, json.dumps(feature['geometry'])))
+    return inserted
+
+def test_first_wins_matches_per_row_baseline():
+    expected = baseline_association(ADDRESSES, {apn: i for i, apn in enumerate(PARCELS)}, EXISTING)
+    actual = list(pipeline.first_wins_addresses(pipeline.address_rows(ADDRESSES), set(PARCELS), EXISTING))
+
+    assert actual == expected
+    assert [address for _, address, _, _ in actual] == ['1 Main Street', '2 Oak Street', '3 Pine Street']
+    assert [apn for _, _, apn, _ in actual] == ['A1', 'C3', 'B2']
+
+def test_first_wins_after_spatial_assignment():
+    parcel_index = pipeline.ParcelIndex()
+    for apn, geometry in PARCELS.items():
+        parcel_index.add(apn, geometry)
+    features = [json.loads(json.dumps(feature)) for feature in ADDRESSES]
+    assigned = list(pipeline.assign_address_parcels(features, parcel_index))
+
+    actual = list(pipeline.first_wins_addresses(pipeline.address_rows(assigned), set(PARCELS)))
+
+    assert actual == baseline_association(assigned, {apn: i for i, apn in enumerate(PARCELS)}, set())
+    # The orphan is recovered by location; points outside every parcel keep their unknown APN and are skipped
+    assert ('4 Elm Street', 'B2') in [(address, apn) for _, address, apn, _ in actual]
+    assert '5 Ash Street' not in [address for _, address, _, _ in actual]
+
+def test_assignment_outcomes():
+    parcel_index = pipeline.ParcelIndex()
+    for apn, geometry in PARCELS.items():
+        parcel_index.add(apn, geometry)
+    features = [json.loads(json.dumps(feature)) for feature in ADDRESSES]
+    features.append(address('A1', '8', 'CEDAR', (9.0, 9.0)))  # Known APN, point outside every parcel
+
+    outcomes = [pipeline.assign_address_parcel(feature, parcel_index) for feature in features]
+
+    assert outcomes == ['matched', 'matched', 'matched', 'unlocated', 'matched', 'matched', 'matched',
+                        'recovered', 'unlocated', 'unlocated', 'matched', 'outside']
+    assert features[-1]['properties']['PRCL_ID'] == 'A1'
+
+def test_associate_staged_addresses_matches_first_wins(test_dsn):
+    county = 'assoc_test'
+    pipeline.create_tables(test_dsn, county)
+    conn = pipeline.get_connection(test_dsn)
+    try:
+        cursor = conn.cursor()
+        for table in reversed(pipeline.SHADOW_TABLES):
+            cursor.execute(f"DELETE FROM {table} WHERE county = %s;", (county,))
+        for apn, geometry in PARCELS.items():
+            cursor.execute("INSERT INTO parcel (county, apn, geom) "
+                           "VALUES (%s, %s, ST_Multi(ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326))) RETURNING id;",
+                           (county, apn, json.dumps(geometry)))
+            cursor.execute("INSERT INTO parcel_apn (county, parcel_id, apn) VALUES (%s, %s, %s);",
+                           (county, cursor.fetchone()[0], apn))
+        existing = list(pipeline.address_rows([ADDRESSES[-1]]))[0]
+        cursor.execute("INSERT INTO parcel_address (county, parcel_id, address, geom) "
+                       "SELECT county, parcel_id, %s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326) "
+                       "FROM parcel_apn WHERE county = %s AND apn = %s;",
+                       (existing[1], existing[3], county, existing[2]))
+
+        rows = list(pipeline.address_rows(ADDRESSES))
+        pipeline.stage_addresses(cursor, rows)
+        inserted = pipeline.associate_staged_addresses(cursor, county=county)
+        cursor.execute("SELECT pa.address, papn.apn FROM parcel_address pa "
+                       "JOIN parcel_apn papn ON papn.county = pa.county AND papn.parcel_id = pa.parcel_id "
+                       "WHERE pa.county = %s AND pa.address <> %s ORDER BY pa.address;", (county, existing[1]))
+        associated = cursor.fetchall()
+    finally:
+        conn.rollback()
+        pipeline.release_connection(conn)
+
+    expected = sorted((address, apn) for _, address, apn, _ in
+                      pipeline.first_wins_addresses(rows, set(PARCELS), {existing[1]}))
+    assert inserted == len(expected)
+    assert associated == expected
@@ -0,0 +1,68 @@
+import tracemalloc
+
+import benchmark
+import SymbiumTakeHome as pipeline
+
+METER = 1 / pipeline.METERS_PER_DEGREE  # Degrees of latitude in a meter
+
+def cleaned_points(parcel_count):
+    results = (pipeline.clean_address_feature(feature) for feature in benchmark.generate_addresses(parcel_count))
+    return [(address, pipeline.point_coordinates(feature['geometry'])) for feature, address in filter(None, results)]
+
+def string_key(address, coordinates):
+    """The dedup key of the original loader: the upper-cased address and the coordinate text."""
+    return f"{address.upper()}_{list(coordinates)}"
+
+def test_points_within_tolerance_are_duplicates():
+    index = pipeline.AddressDedupIndex(tolerance_meters=0.5)
+
+    assert index.add('1 Main Street', (-120.8, 38.7))
+    assert not index.add('1 Main Street', (-120.8, 38.7 + 0.4 * METER))
+    assert index.add('1 Main Street', (-120.8, 38.7 + 0.6 * METER))
+    assert index.add('2 Main Street', (-120.8, 38.7))
+    assert index.add('1 Main Street', None)
+    assert not index.add('1 Main Street', None)
+    assert len(index) == 4
+
+def test_finds_duplicates_across_cell_edges():
+    index = pipeline.AddressDedupIndex(tolerance_meters=0.5)
+    cell_meters = pipeline.DEDUP_CELL_TOLERANCES * 0.5
+    edge = round(38.7 / (cell_meters * METER)) * cell_meters * METER  # A latitude on a cell edge
+
+    assert index.add('1 Main Street', (-120.8, edge - 0.2 * METER))
+    assert not index.add('1 Main Street', (-120.8, edge + 0.2 * METER))
+    assert index.add('1 Main Street', (-120.8, edge + 0.6 * METER))
+
+def test_matches_pairwise_comparison():
+    points = cleaned_points(3000)
+    points += [(address, (lon + 0.3 * METER, lat - 0.3 * METER)) for address, (lon, lat) in points[::7]]
+    points += [(address, (lon, lat + 0.8 * METER)) for address, (lon, lat) in points[::11]]
+
+    index = pipeline.AddressDedupIndex()
+    kept = {}
+    for address, coordinates in points:
+        x, y = index._grid_position(coordinates)
+        duplicate = any((x - kept_x) ** 2 + (y - kept_y) ** 2 <= 1.0 for kept_x, kept_y in kept.get(address, ()))
+        assert index.add(address, coordinates) is not duplicate
+        if not duplicate:
+            kept.setdefault(address, []).append((x, y))
+    assert len(index) < len(points)
+
+def test_uses_less_memory_than_string_keys():
+    points = cleaned_points(5000)
+
+    tracemalloc.start()
+    index = pipeline.AddressDedupIndex()
+    for address, coordinates in points:
+        index.add(address, coordinates)
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    keys = {string_key(address, coordinates) for address, coordinates in points}
+    key_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    assert len(keys) >= len(index)
+    assert index_bytes / len(index) < 40
+    assert index_bytes * 3 < key_bytes
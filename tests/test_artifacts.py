@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import SymbiumTakeHome as pipeline
+
+GEOMETRIES = [
+    {'type': 'Point', 'coordinates': [-120.8, 38.7]},
+    {'type': 'Point', 'coordinates': [-120.8, 38.7, 512.5]},
+    {'type': 'LineString', 'coordinates': [[0.0, 0.0], [1.5, 2.25]]},
+    {'type': 'Polygon', 'coordinates': [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]]},
+    {'type': 'MultiPolygon', 'coordinates': [[[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]],
+                                             [[[2.0, 2.0], [3.0, 2.0], [3.0, 3.0], [2.0, 2.0]],
+                                              [[2.2, 2.2], [2.8, 2.2], [2.8, 2.8], [2.2, 2.2]]]]},
+]
+
+@pytest.mark.parametrize('geometry', GEOMETRIES, ids=lambda geometry: geometry['type'])
+def test_wkb_round_trip(geometry):
+    assert pipeline.wkb_to_geometry(pipeline.geometry_to_wkb(geometry)) == geometry
+
+def test_empty_geometry_round_trip():
+    assert pipeline.geometry_to_wkb(None) == b''
+    assert pipeline.wkb_to_geometry(b'') is None
+
+def parcel(apn, geometry, **extra):
+    return {'type': 'Feature', 'properties': dict({'PRCL_ID': apn}, **extra), 'geometry': geometry}
+
+FEATURES = [
+    parcel('003010', GEOMETRIES[3], OBJECTID=1),
+    parcel('001020', GEOMETRIES[4], OBJECTID=2, NOTE=None),
+    parcel('003010', GEOMETRIES[0], OBJECTID=3),
+    parcel(None, None, OBJECTID=4),
+]
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = str(tmp_path / 'parcels.geobin')
+    for _ in pipeline.tee_artifact(iter(FEATURES), path, pipeline.PARCEL_ARTIFACT_COLUMNS):
+        pass
+    return path
+
+def test_artifact_round_trip(artifact):
+    with pipeline.ArtifactReader(artifact) as reader:
+        assert len(reader) == len(FEATURES)
+        assert list(reader) == FEATURES
+        assert reader.feature(1) == FEATURES[1]
+
+def test_find_by_apn(artifact):
+    with pipeline.ArtifactReader(artifact) as reader:
+        assert reader.find_by_apn('003010') == [FEATURES[0], FEATURES[2]]
+        assert reader.find_by_apn('001020') == [FEATURES[1]]
+        assert reader.find_by_apn('999999') == []
+
+def test_export_artifact_geojson(artifact, tmp_path):
+    geojson_path = str(tmp_path / 'parcels.geojson')
+    pipeline.export_artifact_geojson(artifact, geojson_path)
+
+    with open(geojson_path) as f:
+        assert json.load(f)['features'] == FEATURES
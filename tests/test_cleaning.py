@@ -0,0 +1,23 @@
+import copy
+
+import benchmark
+import SymbiumTakeHome as pipeline
+
+PARCEL_COUNT = 1500
+
+def cleaned(clean, features, workers):
+    return list(clean(copy.deepcopy(features), workers=workers, batch_size=100))
+
+def test_parallel_address_cleaning_matches_serial():
+    features = list(benchmark.generate_addresses(PARCEL_COUNT))
+
+    serial = cleaned(pipeline.clean_address_features, features, workers=1)
+    parallel = cleaned(pipeline.clean_address_features, features, workers=2)
+
+    assert parallel == serial
+    assert 0 < len(serial) < len(features)
+
+def test_parallel_apn_cleaning_matches_serial():
+    features = list(benchmark.generate_parcels(PARCEL_COUNT))
+
+    assert cleaned(pipeline.clean_apn_features, features, 2) == cleaned(pipeline.clean_apn_features, features, 1)
@@ -0,0 +1,23 @@
+import SymbiumTakeHome as pipeline
+
+def test_released_connection_is_reused(fake_connections):
+    first = pipeline.get_connection('dbname=pool_test')
+    pipeline.release_connection(first)
+    second = pipeline.get_connection('dbname=pool_test')
+    pipeline.release_connection(second)
+
+    assert second is first
+    assert not first.closed
+    assert len(fake_connections) == 1
+
+def test_pool_keeps_concurrent_connections(fake_connections):
+    borrowed = [pipeline.get_connection('dbname=pool_test') for _ in range(pipeline.DB_POOL_MAX_CONNECTIONS)]
+    for conn in borrowed:
+        pipeline.release_connection(conn)
+    again = [pipeline.get_connection('dbname=pool_test') for _ in range(pipeline.DB_POOL_MAX_CONNECTIONS)]
+    for conn in again:
+        pipeline.release_connection(conn)
+
+    assert {id(conn) for conn in again} == {id(conn) for conn in borrowed}
+    assert len(fake_connections) == pipeline.DB_POOL_MAX_CONNECTIONS
+    assert not any(conn.closed for conn in borrowed)
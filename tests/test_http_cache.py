@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+import requests
+
+import esri_replay_server
+import SymbiumTakeHome as pipeline
+
+LAYER_PATH = '/arcgis/rest/services/Symbium/SymbiumServices/MapServer/1'
+
+def test_request_key_ignores_scheme_and_argument_order():
+    key = pipeline.esri_request_key('get', f'https://gis.example.gov{LAYER_PATH}/', {'f': 'json', 'where': '1=1'})
+
+    assert key == pipeline.esri_request_key('GET', f'http://GIS.example.gov{LAYER_PATH}', {'where': '1=1', 'f': 'json'})
+
+def test_request_key_differs_by_host():
+    args = {'f': 'json'}
+
+    assert (pipeline.esri_request_key('GET', f'https://one.example.gov{LAYER_PATH}', args)
+            != pipeline.esri_request_key('GET', f'https://two.example.gov{LAYER_PATH}', args))
+
+def test_parse_host_map():
+    assert esri_replay_server.parse_host_map(['localhost:8765=GIS.example.gov']) == {
+        'localhost:8765': 'gis.example.gov'}
+    with pytest.raises(ValueError):
+        esri_replay_server.parse_host_map(['localhost:8765'])
+
+def test_replay_server_answers_mapped_hosts_only(tmp_path):
+    cache = pipeline.EsriHttpCache(str(tmp_path), mode='record')
+    for host, name in (('one.example.gov', 'Parcels one'), ('two.example.gov', 'Parcels two')):
+        key = pipeline.esri_request_key('GET', f'https://{host}{LAYER_PATH}', {'f': 'json'})
+        cache._record(key, {'headers': {'content-type': 'application/json'}, 'body': f'{{"name": "{name}"}}',
+                            'fetched_at': 0})
+
+    server = esri_replay_server.make_server(str(tmp_path), {}, port=0)
+    port = server.server_port
+    server.host_map = {f'localhost:{port}': 'two.example.gov'}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        mapped = requests.get(f'http://localhost:{port}{LAYER_PATH}', params={'f': 'json'}, timeout=5).json()
+        unmapped = requests.get(f'http://127.0.0.1:{port}{LAYER_PATH}', params={'f': 'json'}, timeout=5).json()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert mapped == {'name': 'Parcels two'}
+    assert 'error' in unmapped
+
+def test_offline_miss_fails_without_retrying(tmp_path, monkeypatch):
+    def no_sleep(seconds):
+        raise AssertionError(f"slept {seconds}s before retrying an offline download")
+
+    monkeypatch.setattr(pipeline.time, 'sleep', no_sleep)
+    cache = pipeline.EsriHttpCache(str(tmp_path / 'cache'), mode='offline')
+    url = f'https://gis.example.gov{LAYER_PATH}'
+
+    with pytest.raises(RuntimeError, match="after 1 attempts"):
+        pipeline.stream_layer_as_ndjson(url, str(tmp_path / 'layer.geojsonl'), http_cache=cache)
+    with pytest.raises(RuntimeError, match="after 1 attempts"):
+        pipeline.download_and_save_layer_as_geojson(url, str(tmp_path / 'layer.geojson'), http_cache=cache)
+    with pytest.raises(pipeline.EsriDownloadError):
+        pipeline.download_oid_shard(url, 'OBJECTID', (1, 100), str(tmp_path / 'shard.geojsonl'), http_cache=cache)
+    assert cache.fetches == 0
@@ -0,0 +1,40 @@
+import SymbiumTakeHome as pipeline
+
+def parcel(apn, x):
+    return {'type': 'Feature', 'properties': {'PRCL_ID': apn},
+            'geometry': {'type': 'Polygon', 'coordinates': [[[x, 0], [x + 1, 0], [x + 1, 1], [x, 0]]]}}
+
+def test_diff_feature_hashes():
+    inserted, changed, deleted = pipeline.diff_feature_hashes({'a': '1', 'b': '2', 'c': '3'},
+                                                              {'a': '1', 'b': '9', 'd': '4'})
+
+    assert (inserted, changed, deleted) == ({'d'}, {'b'}, {'c'})
+
+def test_diff_of_identical_runs_is_empty():
+    hashes = {'a': '1', 'b': '2'}
+
+    assert pipeline.diff_feature_hashes(hashes, dict(hashes)) == (set(), set(), set())
+
+def test_parcel_sync_applies_only_changes(fake_connections, monkeypatch):
+    grid = pipeline.PRECISION_GRID_DEGREES
+    unchanged, moved, gone = parcel('A1', 0), parcel('B2', 2), parcel('C3', 4)
+    previous = [(feature['properties']['PRCL_ID'], pipeline.content_hash(feature['properties']['PRCL_ID'],
+                                                                         feature['geometry'], grid))
+                for feature in (unchanged, moved, gone)]
+    fake_connections.results.append(('FROM feature_hash WHERE layer', previous))
+    batches = []
+    monkeypatch.setattr(pipeline, 'execute_values', lambda cursor, query, rows, **kwargs: batches.append(list(rows)))
+
+    pipeline.sync_parcels_incremental([unchanged, parcel('B2', 3), parcel('D4', 6), unchanged],
+                                      'dbname=sync_test', county='el_dorado')
+
+    conn = fake_connections[0]
+    deletes = [params for statement, params in zip(conn.statements, conn.params)
+               if statement.startswith('DELETE FROM parcel ')]
+    assert deletes == [('el_dorado', ['C3'])]
+    parcel_upserts, hash_upserts = batches
+    assert sorted(apn for _, _, apn in parcel_upserts) == ['B2', 'D4']
+    assert sorted(key for _, key, _ in hash_upserts) == ['B2', 'D4']
+    hash_deletes = [params for statement, params in zip(conn.statements, conn.params)
+                    if statement.startswith('DELETE FROM feature_hash')]
+    assert hash_deletes == [('el_dorado/parcel', ['C3'])]
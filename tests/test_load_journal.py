@@ -0,0 +1,92 @@
+import functools
+
+import pytest
+
+import SymbiumTakeHome as pipeline
+
+class JournalCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def execute(self, query, params=None):
+        if 'SELECT source_digest' in query:
+            self.row = self.conn.journal
+        elif 'INSERT INTO load_journal' in query:
+            self.conn.pending_journal = (params[3], params[4], params[5])
+        elif 'DELETE FROM load_journal' in query:
+            self.conn.pending_journal = 'deleted'
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+class JournalConnection:
+    """A connection whose load_journal row and loaded rows only change on commit."""
+
+    def __init__(self):
+        self.journal = None
+        self.pending_journal = None
+        self.loaded = []
+        self.staged = []
+
+    def cursor(self):
+        return JournalCursor(self)
+
+    def commit(self):
+        if self.pending_journal == 'deleted':
+            self.journal = None
+        elif self.pending_journal is not None:
+            self.journal = self.pending_journal
+        self.loaded += self.staged
+        self.staged, self.pending_journal = [], None
+
+    def rollback(self):
+        self.staged, self.pending_journal = [], None
+
+class InterruptedLoad(Exception):
+    pass
+
+def load_batch(conn, cursor, rows, fail_at=None):
+    count = 0
+    for seq, _ in rows:
+        if seq == fail_at:
+            raise InterruptedLoad
+        conn.staged.append(seq)
+        count += 1
+    return count
+
+ROWS = [(seq, f"row {seq}") for seq in range(25) if seq % 4]
+
+def interrupted_load(conn, digest='digest-1'):
+    with pytest.raises(InterruptedLoad):
+        pipeline.load_in_batches(conn, iter(ROWS), functools.partial(load_batch, conn, fail_at=17),
+                                 'placer', 'parcels', 'parcels.geojsonl', digest, batch_size=5)
+    conn.rollback()
+
+def test_resume_carries_on_after_the_last_committed_batch():
+    conn = JournalConnection()
+    interrupted_load(conn)
+    assert conn.loaded == [1, 2, 3, 5, 6, 7, 9, 10, 11, 13]
+    assert conn.journal == ('digest-1', 13, 2)
+
+    loaded = pipeline.load_in_batches(conn, iter(ROWS), functools.partial(load_batch, conn),
+                                      'placer', 'parcels', 'parcels.geojsonl', 'digest-1', batch_size=5)
+
+    assert loaded == len(ROWS) - 10
+    assert conn.loaded == [seq for seq, _ in ROWS]
+    assert conn.journal is None
+
+def test_changed_digest_starts_over():
+    conn = JournalConnection()
+    interrupted_load(conn)
+    conn.loaded = []  # Stand-in for the first-wins rules treating reloaded rows as new
+
+    loaded = pipeline.load_in_batches(conn, iter(ROWS), functools.partial(load_batch, conn),
+                                      'placer', 'parcels', 'parcels.geojsonl', 'digest-2', batch_size=5)
+
+    assert loaded == len(ROWS)
+    assert conn.loaded == [seq for seq, _ in ROWS]
+    assert conn.journal is None
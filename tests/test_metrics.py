@@ -0,0 +1,26 @@
+import threading
+
+import SymbiumTakeHome as pipeline
+
+def test_worker_round_trips_count_toward_their_stage():
+    metrics = pipeline.PipelineMetrics(enabled=True)
+
+    def worker(stage):
+        with metrics.stage_thread(stage):
+            for _ in range(3):
+                pipeline.CountingCursor._count()
+
+    with metrics.stage('load'):
+        pipeline.CountingCursor._count()
+        stage = metrics.current_stage()
+        threads = [threading.Thread(target=worker, args=(stage,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    worker(None)
+
+    [record] = metrics.stages
+    assert record['sql_round_trips'] == 7
+    assert 'worker_sql_round_trips' not in record
+    assert record['running_peak_rss_bytes'] > 0
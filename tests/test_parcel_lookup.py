@@ -0,0 +1,35 @@
+import uuid
+
+import parcel_lookup
+
+def test_second_lookup_skips_prepare(fake_connections):
+    lookup = parcel_lookup.ParcelLookup('dbname=lookup_test', listen=False)
+    lookup.parcels_by_apn(['001-010-01'])
+    lookup.parcels_by_apn(['001-010-02'])
+
+    assert len(fake_connections) == 1
+    statements = fake_connections[0].statements
+    assert sum(statement.startswith('PREPARE ') for statement in statements) == len(parcel_lookup.PREPARED_STATEMENTS)
+    assert sum(statement.startswith('EXECUTE lookup_parcels_by_apn') for statement in statements) == 2
+
+def test_cached_lookup_sends_nothing(fake_connections):
+    lookup = parcel_lookup.ParcelLookup('dbname=lookup_test', listen=False)
+    assert lookup.parcels_by_apn(['001-010-01']) == [None]
+    sent = len(fake_connections[0].statements)
+
+    assert lookup.parcels_by_apn(['001-010-01']) == [None]
+    assert len(fake_connections[0].statements) == sent
+    assert lookup.cache.hits == 1
+
+def test_parcel_ids_in_any_form_share_a_key(fake_connections):
+    parcel_id = '6f1c2a4e-8b3d-4f5a-9c7e-0d1b2a3c4d5e'
+    fake_connections.results = [('EXECUTE lookup_addresses_for_parcels',
+                                 [(parcel_id, 1, '1 Main Street', '{"type":"Point","coordinates":[0,0]}')])]
+    lookup = parcel_lookup.ParcelLookup('dbname=lookup_test', listen=False)
+
+    forms = [parcel_id.upper(), '{' + parcel_id + '}', uuid.UUID(parcel_id), parcel_id]
+    results = lookup.addresses_for_parcels(forms)
+
+    assert all(addresses and addresses == results[0] for addresses in results)
+    assert results[0][0]['address'] == '1 Main Street'
+    assert sum(statement.startswith('EXECUTE') for statement in fake_connections[0].statements) == 1
@@ -0,0 +1,33 @@
+import SymbiumTakeHome as pipeline
+
+DSN = 'dbname=index_test'
+
+def test_county_indexes_are_built_on_its_partitions_and_attached(fake_connections):
+    fake_connections.results = [('to_regclass', [(None,)])]
+
+    pipeline.create_indexes(DSN, 'placer')
+
+    statements = [' '.join(statement.split()) for statement in fake_connections[0].statements]
+    indexes = pipeline.post_load_indexes()
+    assert len(indexes) == 7
+    for index, table, _ in indexes:
+        parent = statements.index(next(s for s in statements
+                                       if s.startswith(f"CREATE INDEX IF NOT EXISTS {index} ON ONLY {table} ")))
+        build = statements.index(next(s for s in statements
+                                      if s.startswith(f"CREATE INDEX IF NOT EXISTS {index}_in_placer ON {table}_in_placer ")))
+        attach = statements.index(f"ALTER INDEX {index} ATTACH PARTITION {index}_in_placer;")
+        assert parent < build < attach
+    # The migrations' own statements only run once every parent index exists, so they build nothing
+    last_parent = max(i for i, s in enumerate(statements) if ' ON ONLY ' in s)
+    migration_statements = [i for i, s in enumerate(statements) if s in [st for _, _, st in indexes]]
+    assert migration_statements and min(migration_statements) > last_parent
+    assert statements[-1] == "ANALYZE parcel_in_placer, parcel_apn_in_placer, parcel_address_in_placer;"
+
+def test_indexed_partitions_and_existing_parent_indexes_are_skipped(fake_connections):
+    fake_connections.results = [('to_regclass', [('parcel_geom_gist',)]), ('pg_inherits', [(1,)]),
+                                ('SELECT version FROM schema_migrations', [(3,), (5,), (7,)])]
+
+    pipeline.create_indexes(DSN, 'placer')
+
+    assert not [statement for statement in fake_connections[0].statements
+                if statement.startswith(('CREATE INDEX', 'ALTER INDEX'))]
@@ -0,0 +1,76 @@
+import json
+import os
+
+import SymbiumTakeHome as pipeline
+
+CONFIG = {'sync_mode': 'full', 'output_dir': 'output'}
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+def test_hit_after_store_and_miss_on_changed_input(tmp_path):
+    cache = pipeline.StageCache(str(tmp_path / 'cache'))
+    source = str(tmp_path / 'addresses.geojsonl')
+    write(source, '{"a": 1}\n')
+
+    key = cache.key('clean_addresses', CONFIG, [source])
+    assert not cache.hit(key)
+    cache.store(key, 'clean_addresses')
+    assert cache.hit(key)
+
+    write(source, '{"a": 2}\n')
+    assert cache.key('clean_addresses', CONFIG, [source]) != key
+    assert cache.key('clean_addresses', dict(CONFIG, sync_mode='incremental'), []) != \
+        cache.key('clean_addresses', CONFIG, [])
+    assert cache.key('clean_addresses', dict(CONFIG, output_dir='elsewhere'), []) == \
+        cache.key('clean_addresses', CONFIG, [])
+
+def test_hit_restores_a_changed_artifact(tmp_path):
+    cache = pipeline.StageCache(str(tmp_path / 'cache'))
+    artifact = str(tmp_path / 'cleaned.geojsonl')
+    write(artifact, 'cleaned\n')
+    cache.store('k1', 'clean_addresses', [artifact])
+
+    write(artifact, 'truncated')
+    assert cache.hit('k1', [artifact])
+    assert read(artifact) == 'cleaned\n'
+
+    os.remove(artifact)
+    assert cache.hit('k1', [artifact])
+    assert read(artifact) == 'cleaned\n'
+
+def test_database_stage_misses_when_the_database_changed(tmp_path, monkeypatch):
+    fingerprint = [[10, 20, 30, 8]]
+    monkeypatch.setattr(pipeline, 'database_fingerprint', lambda dsn, county: fingerprint[0])
+    cache = pipeline.StageCache(str(tmp_path / 'cache'))
+
+    cache.store('k1', 'load_parcels', db_connection_string='dsn')
+    assert cache.hit('k1', db_connection_string='dsn')
+
+    fingerprint[0] = [0, 0, 0, 8]
+    assert not cache.hit('k1', db_connection_string='dsn')
+
+def test_evict_drops_old_entries_then_the_oldest_over_budget(tmp_path):
+    cache = pipeline.StageCache(str(tmp_path / 'cache'))
+    artifact = str(tmp_path / 'cleaned.geojsonl')
+    write(artifact, 'x' * 1000)
+    for key in ('k1', 'k2', 'k3'):
+        cache.store(key, key, [artifact])
+    for age, key in ((300, 'k1'), (200, 'k2'), (100, 'k3')):
+        entry_path = os.path.join(cache.directory, f"{key}.json")
+        with open(entry_path) as f:
+            entry = json.load(f)
+        entry['created_at'] -= age
+        write(entry_path, json.dumps(entry))
+
+    cache.evict(max_age_seconds=250, max_bytes=10**6)
+    assert not cache.hit('k1') and cache.hit('k2') and cache.hit('k3')
+
+    cache.evict(max_age_seconds=10**6, max_bytes=1500)
+    assert not cache.hit('k2') and cache.hit('k3')
+    assert sorted(os.listdir(cache.directory)) == ['k3-cleaned.geojsonl', 'k3.json']
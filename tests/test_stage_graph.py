@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+import SymbiumTakeHome as pipeline
+
+def recording_stage(name, log, release=None):
+    def run():
+        log.append(('start', name))
+        if release is not None:
+            assert release.wait(5)
+        log.append(('end', name))
+        return name.upper()
+    return run
+
+def test_stages_run_after_their_dependencies():
+    log = []
+    stages = {
+        'download': (recording_stage('download', log), ()),
+        'clean': (recording_stage('clean', log), ('download',)),
+        'schema': (recording_stage('schema', log), ()),
+        'load': (recording_stage('load', log), ('clean', 'schema')),
+    }
+
+    results = pipeline.run_stage_graph(stages)
+
+    assert results == {'download': 'DOWNLOAD', 'clean': 'CLEAN', 'schema': 'SCHEMA', 'load': 'LOAD'}
+    for name, (_, dependencies) in stages.items():
+        for dependency in dependencies:
+            assert log.index(('end', dependency)) < log.index(('start', name))
+
+def test_independent_stages_run_concurrently():
+    log = []
+    both_started = threading.Barrier(2)
+
+    def stage(name):
+        def run():
+            both_started.wait(5)
+            log.append(name)
+        return run
+
+    pipeline.run_stage_graph({'parcels': (stage('parcels'), ()), 'addresses': (stage('addresses'), ())})
+
+    assert sorted(log) == ['addresses', 'parcels']
+
+def test_failure_is_raised_and_stops_dependents():
+    log = []
+    release = threading.Event()
+
+    def fail():
+        release.set()
+        raise RuntimeError("download failed")
+
+    stages = {
+        'download': (fail, ()),
+        'clean': (recording_stage('clean', log), ('download',)),
+        'schema': (recording_stage('schema', log, release), ()),
+    }
+
+    with pytest.raises(RuntimeError, match="download failed"):
+        pipeline.run_stage_graph(stages)
+
+    assert ('start', 'clean') not in log
+    assert log == [('start', 'schema'), ('end', 'schema')]
+
+def test_unknown_dependency_and_cycle_are_rejected():
+    with pytest.raises(ValueError, match="unknown stages: missing"):
+        pipeline.run_stage_graph({'load': (lambda: None, ('missing',))})
+    with pytest.raises(ValueError, match="cycle"):
+        pipeline.run_stage_graph({'a': (lambda: None, ('b',)), 'b': (lambda: None, ('a',))})
@@ -0,0 +1,45 @@
+import SymbiumTakeHome as pipeline
+
+DSN = 'dbname=validation_test'
+
+def check_values(report):
+    return {check['name']: (check['group'], check['passed'], check['value']) for check in report['checks']}
+
+def test_report_shape(fake_connections):
+    fake_connections.results = [
+        ('information_schema.tables', [('parcel',), ('parcel_apn',), ('parcel_address',)]),
+        ('GROUP BY county, address', [('1 Main Street', 2, 0), ('2 Oak Street', 1, 1)]),
+        ('FROM parcel_address pa', [(12, 0, 0, 0, 0)]),
+        ('FROM parcel_apn pa', [(10, 0, 0)]),
+        ('FROM parcel;', [(10, 0, 1, 0)]),
+    ]
+
+    report = pipeline.validate_database(DSN)
+
+    assert set(report) == {'checks', 'multi_parcel_addresses', 'passed'}
+    assert all(set(check) == {'group', 'name', 'passed', 'value', 'message'} for check in report['checks'])
+    assert {check['group'] for check in report['checks']} == set(pipeline.VALIDATION_GROUP_MESSAGES)
+    checks = check_values(report)
+    assert checks['parcel_records'] == ('parcel_upload', True, 10)
+    assert checks['apn_format'] == ('general', False, 1)
+    assert checks['parcel_apn_records'] == ('parcel_apn_relationships', True, 10)
+    assert checks['address_within_parcel'] == ('general', True, 0)
+    assert checks['address_single_parcel'] == ('address_upload', False, 1)
+    assert checks['address_unique_in_parcel'] == ('address_upload', False, 1)
+    assert report['multi_parcel_addresses'] == [('1 Main Street', 2)]
+    assert [check['message'] for check in report['checks'] if check['name'] == 'apn_format'] == \
+        ["APNs with invalid format found"]
+    assert report['passed'] is False
+
+def test_missing_tables_skip_their_checks(fake_connections):
+    fake_connections.results = [('information_schema.tables', [])]
+
+    report = pipeline.validate_database(DSN, table_suffix='_in_placer')
+
+    assert check_values(report) == {
+        'parcel_table_exists': ('parcel_upload', False, None),
+        'parcel_apn_table_exists': ('parcel_apn_relationships', False, None),
+        'parcel_address_table_exists': ('address_upload', False, None),
+    }
+    assert fake_connections[0].params[0] == (['parcel_in_placer', 'parcel_apn_in_placer', 'parcel_address_in_placer'],)
+    assert report['passed'] is False